@@ -1,439 +1,286 @@
-from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_file, send_from_directory
+from flask import Flask, render_template, request, jsonify, Response, send_file, send_from_directory, abort
+from werkzeug.security import safe_join
 import threading
 import time
 import os
 import json
-import concurrent.futures
-import random
+import hashlib
+import gzip
+import base64
 from datetime import datetime, timedelta
-from wechat_scraper.auth import WeChatAuth
-from wechat_scraper.crawler import WeChatCrawler
-from wechat_scraper.downloader import WeChatDownloader
-from wechat_scraper.database import Database
 from wechat_scraper.logger import logger
-from wechat_scraper.exceptions import RateLimitError, AccountNotFoundError, NetworkError
+from wechat_scraper.rate_limiter import get_limiter
+from wechat_scraper.metrics import REGISTRY
+from wechat_scraper.concurrency import get_all_controllers
+from wechat_scraper.circuit_breaker import get_all_breakers
+from wechat_scraper.egress import get_pool
+from wechat_scraper.exporter import (
+    EXPORT_FORMATS, ExportCounter, iter_csv, iter_jsonl, write_xlsx, write_parquet, iter_file_and_remove
+)
+from wechat_scraper.compression import SUFFIXES, available_siblings, negotiate, read_decompressed
+from wechat_scraper.profiling import cprofile_summary
+from wechat_scraper.utils import find_match_snippets, static_url, static_version, STATIC_DIR
+from wechat_scraper.tasks import (
+    db, auth, task_writer, job_queue, set_crawler, schedule_batch_accounts, profile_mode, FINISHED_STATUSES,
+    resume_waiting_tasks, probe_session, start_session_probe
+)
 
-app = Flask(__name__)
+# 静态资源由 serve_static 按是否带版本号设置缓存策略
+app = Flask(__name__, static_folder=None)
 
-# Global instances
-auth = WeChatAuth()
-crawler = None
-db = Database()
+# 任务执行逻辑与全局实例（数据库、登录状态、任务队列）在 tasks 模块中，命令行工作进程共用
 
-def get_crawler():
-    global crawler
-    if crawler:
-        return crawler
-    
-    if auth.load_cookies():
-        token, cookies = auth.token, auth.cookies
-        crawler = WeChatCrawler(token, cookies)
-        return crawler
-    return None
+@app.route('/static/<path:filename>')
+def serve_static(filename):
+    # 版本号与当前内容一致时允许浏览器长期缓存；不带版本号或版本号已过期（如旧文章页中的地址）时每次通过 ETag 协商
+    response = send_from_directory(STATIC_DIR, filename)
+    if request.args.get('v') == static_version(filename):
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = 0
+        response.cache_control.no_cache = True
+    return response
 
 @app.route('/output/<path:filename>')
 def serve_output(filename):
-    highlight = request.args.get('highlight')
-    if not highlight or not filename.endswith('.html'):
+    """
+    文章文件按静态文件返回（支持 ETag/If-None-Match）
+    ?highlight= 关键词高亮由文章页中引用的 /static/highlight.js 在浏览器端完成，
+    只有不含该引用的旧文章才在返回时补一个 script 标签
+    """
+    if not filename.endswith('.html'):
         return send_from_directory('output', filename)
     
-    try:
-        file_path = os.path.join('output', filename)
-        if not os.path.exists(file_path):
-            return "File not found", 404
-            
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # 注入增强的高亮和搜索导航脚本
-        script = f"""
-        <style>
-            .search-highlight {{
-                background-color: yellow;
-                color: black;
-                font-weight: bold;
-                position: relative;
-            }}
-            .search-highlight.active {{
-                background-color: orange;
-                outline: 2px solid red;
-            }}
-            #searchNavPanel {{
-                position: fixed;
-                top: 20px;
-                right: 20px;
-                width: 320px;
-                min-width: 250px;
-                max-width: 600px;
-                max-height: 500px;
-                min-height: 200px;
-                background: white;
-                border: 2px solid #07c160;
-                border-radius: 8px;
-                box-shadow: 0 4px 20px rgba(0,0,0,0.3);
-                z-index: 10000;
-                font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, sans-serif;
-                resize: both;
-                overflow: hidden;
-            }}
-            #searchNavHeader {{
-                background: #07c160;
-                color: white;
-                padding: 12px 15px;
-                font-weight: bold;
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                border-radius: 6px 6px 0 0;
-                cursor: move;
-                user-select: none;
-            }}
-            #searchNavClose {{
-                cursor: pointer;
-                font-size: 20px;
-                line-height: 1;
-                padding: 0 5px;
-            }}
-            #searchNavContent {{
-                padding: 15px;
-                height: calc(100% - 50px);
-                overflow-y: auto;
-            }}
-            .search-result-item {{
-                padding: 10px;
-                margin: 5px 0;
-                background: #f5f5f5;
-                border-left: 3px solid #07c160;
-                cursor: pointer;
-                border-radius: 4px;
-                transition: all 0.2s;
-            }}
-            .search-result-item:hover {{
-                background: #e0e0e0;
-                transform: translateX(5px);
-            }}
-            .search-result-item.active {{
-                background: #ffd700;
-                border-left-color: #ff6600;
-            }}
-            .search-result-preview {{
-                font-size: 13px;
-                color: #333;
-                line-height: 1.4;
-                margin-top: 5px;
-            }}
-            .search-result-index {{
-                display: inline-block;
-                background: #07c160;
-                color: white;
-                padding: 2px 8px;
-                border-radius: 10px;
-                font-size: 12px;
-                margin-right: 8px;
-            }}
-            .resize-handle {{
-                position: absolute;
-                width: 15px;
-                height: 15px;
-                background: #07c160;
-                border-radius: 0 0 0 8px;
-                bottom: 0;
-                right: 0;
-                cursor: nwse-resize;
-                opacity: 0.7;
-            }}
-            .resize-handle:hover {{
-                opacity: 1;
-            }}
-            .resize-handle::before {{
-                content: '';
-                position: absolute;
-                bottom: 2px;
-                right: 2px;
-                width: 10px;
-                height: 10px;
-                border-right: 2px solid white;
-                border-bottom: 2px solid white;
-            }}
-        </style>
-        <script>
-            document.addEventListener("DOMContentLoaded", function() {{
-                var keyword = "{highlight}";
-                if (!keyword) return;
-                
-                var matches = [];
-                var currentIndex = 0;
-                
-                // 高亮所有匹配项并收集信息
-                var body = document.body;
-                var walker = document.createTreeWalker(body, NodeFilter.SHOW_TEXT, null, false);
-                var node;
-                var nodes = [];
-                while(node = walker.nextNode()) {{
-                    nodes.push(node);
-                }}
-                
-                nodes.forEach(function(node) {{
-                    if (node.parentNode.nodeName !== "SCRIPT" && 
-                        node.parentNode.nodeName !== "STYLE" && 
-                        node.nodeValue.toLowerCase().includes(keyword.toLowerCase())) {{
-                        
-                        var parent = node.parentNode;
-                        var regex = new RegExp("(" + keyword.replace(/[.*+?^${{}}()|[\\\\]\\\\\\\\]/g, '\\\\\\\\$&') + ")", "gi");
-                        var parts = node.nodeValue.split(regex);
-                        
-                        var fragment = document.createDocumentFragment();
-                        parts.forEach(function(part, i) {{
-                            if (i % 2 === 1) {{
-                                var span = document.createElement("span");
-                                span.className = "search-highlight";
-                                span.textContent = part;
-                                span.setAttribute("data-match-index", matches.length);
-                                fragment.appendChild(span);
-                                
-                                // 收集上下文
-                                var context = node.nodeValue.substring(
-                                    Math.max(0, node.nodeValue.toLowerCase().indexOf(part.toLowerCase()) - 30),
-                                    Math.min(node.nodeValue.length, node.nodeValue.toLowerCase().indexOf(part.toLowerCase()) + part.length + 30)
-                                );
-                                matches.push({{
-                                    element: span,
-                                    context: context,
-                                    text: part
-                                }});
-                            }} else {{
-                                fragment.appendChild(document.createTextNode(part));
-                            }}
-                        }});
-                        parent.replaceChild(fragment, node);
-                    }}
-                }});
-                
-                if (matches.length === 0) return;
-                
-                // 创建搜索导航面板
-                var panel = document.createElement("div");
-                panel.id = "searchNavPanel";
-                panel.innerHTML = `
-                    <div id="searchNavHeader">
-                        <span>找到 ${{matches.length}} 个匹配项</span>
-                        <span id="searchNavClose">×</span>
-                    </div>
-                    <div id="searchNavContent"></div>
-                    <div class="resize-handle"></div>
-                `;
-                document.body.appendChild(panel);
-                
-                // 填充搜索结果列表
-                var content = document.getElementById("searchNavContent");
-                matches.forEach(function(match, index) {{
-                    var item = document.createElement("div");
-                    item.className = "search-result-item";
-                    item.innerHTML = `
-                        <div>
-                            <span class="search-result-index">${{index + 1}}</span>
-                            <strong>${{match.text}}</strong>
-                        </div>
-                        <div class="search-result-preview">${{match.context}}</div>
-                    `;
-                    item.onclick = function() {{
-                        jumpToMatch(index);
-                    }};
-                    content.appendChild(item);
-                }});
-                
-                // 跳转到指定匹配项
-                function jumpToMatch(index) {{
-                    if (index < 0 || index >= matches.length) return;
-                    
-                    // 移除之前的高亮
-                    matches.forEach(function(m) {{
-                        m.element.classList.remove("active");
-                    }});
-                    document.querySelectorAll(".search-result-item").forEach(function(item) {{
-                        item.classList.remove("active");
-                    }});
-                    
-                    // 高亮当前项
-                    currentIndex = index;
-                    matches[index].element.classList.add("active");
-                    document.querySelectorAll(".search-result-item")[index].classList.add("active");
-                    
-                    // 滚动到视图
-                    matches[index].element.scrollIntoView({{
-                        behavior: "auto",
-                        block: "center"
-                    }});
-                }}
-                
-                // 关闭按钮
-                document.getElementById("searchNavClose").onclick = function() {{
-                    panel.style.display = "none";
-                }};
-                
-                // 拖拽移动面板
-                var header = document.getElementById("searchNavHeader");
-                var isDragging = false;
-                var currentX, currentY, initialX, initialY;
-                
-                header.addEventListener("mousedown", function(e) {{
-                    if (e.target.id === "searchNavClose") return;
-                    isDragging = true;
-                    initialX = e.clientX - panel.offsetLeft;
-                    initialY = e.clientY - panel.offsetTop;
-                }});
-                
-                document.addEventListener("mousemove", function(e) {{
-                    if (isDragging) {{
-                        e.preventDefault();
-                        currentX = e.clientX - initialX;
-                        currentY = e.clientY - initialY;
-                        panel.style.left = currentX + "px";
-                        panel.style.top = currentY + "px";
-                        panel.style.right = "auto";
-                    }}
-                }});
-                
-                document.addEventListener("mouseup", function() {{
-                    isDragging = false;
-                }});
-                
-                // 调整尺寸
-                var resizeHandle = panel.querySelector(".resize-handle");
-                var isResizing = false;
-                var startWidth, startHeight, startX, startY;
-                
-                resizeHandle.addEventListener("mousedown", function(e) {{
-                    isResizing = true;
-                    startWidth = panel.offsetWidth;
-                    startHeight = panel.offsetHeight;
-                    startX = e.clientX;
-                    startY = e.clientY;
-                    e.preventDefault();
-                }});
-                
-                document.addEventListener("mousemove", function(e) {{
-                    if (isResizing) {{
-                        var newWidth = startWidth + (e.clientX - startX);
-                        var newHeight = startHeight + (e.clientY - startY);
-                        
-                        if (newWidth >= 250 && newWidth <= 600) {{
-                            panel.style.width = newWidth + "px";
-                        }}
-                        if (newHeight >= 200 && newHeight <= 800) {{
-                            panel.style.height = newHeight + "px";
-                            panel.style.maxHeight = newHeight + "px";
-                        }}
-                    }}
-                }});
-                
-                document.addEventListener("mouseup", function() {{
-                    isResizing = false;
-                }});
-                
-                // 自动跳转到第一个匹配项
-                if (matches.length > 0) {{
-                    jumpToMatch(0);
-                }}
-            }});
-        </script>
-        </body>
-        """
-        content = content.replace('</body>', script)
-        return content
-    except Exception as e:
-        logger.error(f"Error serving highlighted file: {{e}}")
+    # 直接读取文件（旧文章补脚本、查找预压缩文件）前先确认路径位于 output 目录内
+    file_path = safe_join('output', filename)
+    if file_path is None:
+        abort(404)
+    
+    if request.args.get('highlight'):
+        try:
+            response = serve_legacy_highlight(file_path)
+            if response is not None:
+                return response
+        except Exception as e:
+            logger.error("Error serving highlighted file: %s", e)
+    
+    # 存在预压缩文件时按 Accept-Encoding 直接返回，不在请求时压缩
+    siblings = available_siblings(file_path)
+    if not siblings:
         return send_from_directory('output', filename)
+    
+    encoding = negotiate(request.headers.get('Accept-Encoding'), siblings)
+    if encoding:
+        response = send_from_directory('output', filename + SUFFIXES[encoding], mimetype='text/html')
+        response.headers['Content-Encoding'] = encoding
+    elif os.path.isfile(file_path):
+        response = send_from_directory('output', filename)
+    else:
+        # 只存储了压缩文件且客户端不支持对应编码时，解压后返回（ETag/Last-Modified 取自压缩文件）
+        encoding = next(iter(siblings))
+        stat = os.stat(siblings[encoding])
+        response = app.make_response(read_decompressed(siblings[encoding], encoding))
+        response.mimetype = 'text/html'
+        response.set_etag(f"{int(stat.st_mtime)}-{stat.st_size}-{encoding}-identity")
+        response.last_modified = stat.st_mtime
+        response.vary.add('Accept-Encoding')
+        return response.make_conditional(request)
+    response.vary.add('Accept-Encoding')
+    return response
+
+def serve_legacy_highlight(file_path):
+    """旧版文章页补充高亮脚本引用（file_path 已确认位于 output 目录内），已包含引用的文章返回 None"""
+    if not os.path.isfile(file_path):
+        return None
+    
+    # 脚本引用位于文件末尾，只读取结尾部分判断
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        if b'highlight.js' in f.read():
+            return None
+    
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    article_id = db.get_article_id_by_path(file_path) or ''
+    script_url = static_url('highlight.js')
+    tag = f'<script src="{script_url}" data-article-id="{article_id}" defer></script>'
+    if '</body>' in content:
+        content = content.replace('</body>', tag + '</body>', 1)
+    else:
+        content += tag
+    
+    stat = os.stat(file_path)
+    response = app.make_response(content)
+    response.set_etag(f"{int(stat.st_mtime)}-{stat.st_size}-{script_url.rsplit('=', 1)[-1]}")
+    return response.make_conditional(request)
+
+@app.route('/api/articles/<int:article_id>/matches')
+def article_matches(article_id):
+    """返回关键词在文章标题和正文中的位置及上下文片段（供文章页高亮面板使用）"""
+    keyword = request.args.get('q', '').strip()
+    article = db.get_article_text(article_id)
+    if not article:
+        return jsonify({"error": "文章不存在"}), 404
+    
+    title, content = article
+    matches = []
+    for field, text in (("title", title), ("content", content)):
+        for match in find_match_snippets(text, keyword):
+            matches.append({"field": field, **match})
+    return jsonify({"article_id": article_id, "query": keyword, "count": len(matches), "matches": matches})
 
 
 @app.route('/api/export')
-def export_excel():
+def export_articles():
+    """
+    流式导出文章
+    参数: format=xlsx|csv|jsonl|parquet, account_id, date_from, date_to,
+          since=last（仅导出相同格式和筛选条件的上次导出之后新增或修改的文章）, content=1|0（是否包含正文）
+    """
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"不支持的导出格式: {export_format}"}), 400
+    include_content = request.args.get('content', '1') not in ('0', 'false')
+    filters = {
+        "account_id": request.args.get('account_id', type=int),
+        "date_from": request.args.get('date_from') or None,
+        "date_to": request.args.get('date_to') or None,
+        "since_last": request.args.get('since') == 'last',
+    }
+    
+    # 增量基线按格式和筛选条件分别记录，筛选导出不影响其他条件的增量导出
+    filter_key = json.dumps({
+        "format": export_format,
+        "account_id": filters['account_id'],
+        "date_from": filters['date_from'],
+        "date_to": filters['date_to'],
+        "content": include_content,
+    }, sort_keys=True)
+    
     try:
-        import pandas as pd
-        import io
+        # 以导出开始时间为界，导出期间新增或修改的文章留给下一次增量导出
+        watermark = time.time()
+        updated_after = db.get_export_watermark(filter_key) if filters['since_last'] else None
+        rows = ExportCounter(db.iter_export_articles(
+            account_id=filters['account_id'],
+            date_from=filters['date_from'],
+            date_to=filters['date_to'],
+            updated_after=updated_after,
+            updated_up_to=watermark,
+            include_content=include_content,
+        ))
         
-        results = db.get_all_articles_with_account()
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"wechat_articles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
         
-        # 转换为DataFrame
-        data = []
-        for r in results:
-            # r: id, account_name, title, publish_date, status, link, local_path, content
-            data.append({
-                "ID": r[0],
-                "公众号": r[1],
-                "标题": r[2],
-                "发布日期": r[3],
-                "状态": "✅ 已下载" if r[4] == 'completed' or r[4] == 'success' else "❌ 失败" if r[4] == 'failed' else "⏳ 等待中",
-                "正文内容": r[7] if len(r) > 7 and r[7] else "",
-                "原文链接": r[5],
-                "本地路径": r[6] if r[6] else ""
-            })
-            
-        df = pd.DataFrame(data)
+        if export_format in ('csv', 'jsonl'):
+            # 文本格式边查询边输出
+            writer = iter_csv if export_format == 'csv' else iter_jsonl
+            body = writer(rows, include_content)
+        else:
+            # XLSX/Parquet 需要完整文件结构，先逐行写入临时文件再分块发送
+            if export_format == 'xlsx':
+                path = write_xlsx(rows, include_content)
+            else:
+                path = write_parquet(rows, include_content)
+            body = iter_file_and_remove(path)
         
-        # 创建Excel文件
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='文章列表')
-            
-        output.seek(0)
-        filename = f"wechat_articles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        def generate():
+            yield from body
+            db.add_export_record(export_format, filters, filter_key, watermark, rows.count)
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return Response(generate(), mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        })
+    except ImportError as e:
+        logger.error("导出失败，缺少依赖: %s", e)
+        return jsonify({"error": f"导出 {export_format} 需要安装依赖: {e.name}"}), 400
     except Exception as e:
-        logger.error(f"导出Excel失败: {e}")
+        logger.error("导出失败: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+# 超过该大小的 JSON 响应在客户端支持时使用 gzip 压缩
+GZIP_MIN_SIZE = 1024
+
+def cached_json(stamp, build):
+    """
+    以 stamp（相关表的变更版本号及请求参数）生成 ETag，
+    客户端缓存仍有效时直接返回 304，不再查询数据库和序列化；
+    否则调用 build() 生成 JSON，较大的响应体使用 gzip 压缩
+    """
+    etag = hashlib.md5(json.dumps(stamp, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+        if response.content_length and response.content_length > GZIP_MIN_SIZE and 'gzip' in request.accept_encodings:
+            response.set_data(gzip.compress(response.get_data(), compresslevel=5))
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+_rate_limit_cache = {"version": None, "limit": None}
+
+def get_latest_rate_limit_cached():
+    """最近一次频率限制记录，只在 rate_limits 表变化后重新查询"""
+    version = db.get_change_versions(['rate_limits'])[0]
+    if _rate_limit_cache['version'] != version:
+        _rate_limit_cache['limit'] = db.get_latest_rate_limit()
+        _rate_limit_cache['version'] = version
+    return _rate_limit_cache['limit']
+
 @app.route('/api/status')
 def status():
-    is_logged_in = auth.load_cookies()
+    # 凭证缓存在内存中，cookie 文件未变化时不读取文件
+    session = auth.session_status()
     
     # 检查是否处于频率限制中
-    rate_limited = db.is_rate_limited()
     rate_limit_info = None
-    
-    if rate_limited:
-        limit = db.get_latest_rate_limit()
-        if limit:
-            reset_time = datetime.fromisoformat(limit[4])
-            remaining_seconds = (reset_time - datetime.now()).total_seconds()
+    limit = get_latest_rate_limit_cached()
+    # limit: (id, account_name, triggered_at, reset_time)
+    if limit and limit[3]:
+        reset_time = datetime.fromisoformat(limit[3])
+        remaining_seconds = (reset_time - datetime.now()).total_seconds()
+        if remaining_seconds > 0:
             rate_limit_info = {
                 "limited": True,
-                "reset_time": limit[4],
-                "remaining_seconds": max(0, int(remaining_seconds))
+                "reset_time": limit[3],
+                "remaining_seconds": int(remaining_seconds)
             }
     
-    return jsonify({
-        "logged_in": is_logged_in,
+    payload = {
+        "logged_in": session["logged_in"],
+        "session": session,
         "rate_limit": rate_limit_info or {"limited": False}
-    })
+    }
+    return cached_json(payload, lambda: payload)
 
 @app.route('/api/accounts')
 def get_accounts():
     """获取已抓取的公众号列表（从数据库）"""
     try:
-        accounts = db.get_all_accounts()
-        account_list = []
+        def build():
+            account_list = []
+            for acc in db.get_all_accounts():
+                account_list.append({
+                    "id": acc[0],
+                    "name": acc[1],
+                    "nickname": acc[3],
+                    "total_articles": acc[6],
+                    "last_scraped": acc[5]
+                })
+            return {"accounts": account_list}
         
-        for acc in accounts:
-            account_list.append({
-                "id": acc[0],
-                "name": acc[1],
-                "nickname": acc[3],
-                "total_articles": acc[6],
-                "last_scraped": acc[5]
-            })
-        
-        return jsonify({"accounts": account_list})
+        return cached_json(db.get_change_versions(['accounts']), build)
     except Exception as e:
         logger.error(f"获取公众号列表失败: {e}", exc_info=True)
         return jsonify({"accounts": [], "error": str(e)})
@@ -442,34 +289,34 @@ def get_accounts():
 def get_articles(account_id):
     """获取公众号的文章列表"""
     try:
-        articles = db.get_articles_by_account(account_id)
-        article_list = []
-        
-        for art in articles:
-            article_list.append({
-                "id": art[0],
-                "title": art[2],
-                "link": art[3],
-                "publish_date": art[5],
-                "downloaded": bool(art[7]),
-                "filepath": art[9],
-                "status": art[11]
-            })
+        def build():
+            article_list = []
+            for art in db.get_articles_by_account(account_id):
+                article_list.append({
+                    "id": art[0],
+                    "title": art[2],
+                    "link": art[3],
+                    "publish_date": art[5],
+                    "downloaded": bool(art[7]),
+                    "filepath": art[8],
+                    "status": art[11]
+                })
+            return {"articles": article_list}
         
-        return jsonify({"articles": article_list})
+        stamp = [account_id] + db.get_change_versions([f'account:{account_id}'])
+        return cached_json(stamp, build)
     except Exception as e:
         logger.error(f"获取文章列表失败: {e}", exc_info=True)
         return jsonify({"articles": [], "error": str(e)})
 
 @app.route('/api/login', methods=['POST'])
 def login():
-    global crawler
     try:
         token, cookies = auth.login()
         if token and cookies:
-            crawler = WeChatCrawler(token, cookies)
+            set_crawler(token, cookies)
             logger.info("登录成功")
-            return jsonify({"success": True})
+            return jsonify({"success": True, "resumed_tasks": resume_waiting_tasks()})
         return jsonify({"success": False, "error": "登录失败"}), 401
     except Exception as e:
         logger.error(f"登录失败: {e}", exc_info=True)
@@ -477,168 +324,298 @@ def login():
 
 @app.route('/api/relogin', methods=['POST'])
 def relogin():
-    global crawler
     try:
         if os.path.exists("wechat_cookies.json"):
             os.remove("wechat_cookies.json")
         
         token, cookies = auth.login()
         if token and cookies:
-            crawler = WeChatCrawler(token, cookies)
+            set_crawler(token, cookies)
             logger.info("重新登录成功")
-            return jsonify({"success": True})
+            return jsonify({"success": True, "resumed_tasks": resume_waiting_tasks()})
         return jsonify({"success": False, "error": "重新登录失败"}), 401
     except Exception as e:
         logger.error(f"重新登录失败: {e}", exc_info=True)
         return jsonify({"success": False, "error": str(e)}), 500
 
-def download_article_wrapper(downloader, article, index, total):
-    """下载单篇文章的包装函数"""
-    time.sleep(random.uniform(1, 3))
-    
-    title = article.get('title', 'Untitled')
-    link = article.get('link')
-    date = time.strftime("%Y-%m-%d", time.localtime(article.get('update_time')))
-    
-    success, article_id, img_count, error = downloader.download_article(link, title, date)
-    
-    if success:
-        return f"[{index}/{total}] ✓ 完成: {title}"
-    else:
-        return f"[{index}/{total}] ✗ 失败: {title} ({error})"
+@app.route('/api/session/check', methods=['POST'])
+def check_session():
+    """立即检查一次登录会话（列表通道额度被占用时跳过），会话有效时恢复等待登录的任务"""
+    probe_session()
+    return jsonify(auth.session_status())
 
-def process_account(account_name, pages):
-    """处理单个公众号的抓取任务"""
-    crawler_instance = get_crawler()
-    if not crawler_instance:
-        yield "错误: 未登录或 Cookies 已过期\n"
-        return
+@app.before_request
+def start_job_queue():
+    # 延迟到首个请求时启动，避免 debug 重载器的父进程也启动工作线程
+    job_queue.start()
+    start_session_probe()
 
-    # 创建任务记录
-    task_id = db.create_task(account_name, 'single', pages)
-    
-    try:
-        yield f"正在搜索: {account_name}...\n"
-        
-        # 搜索公众号
-        try:
-            fakeid, nickname, alias = crawler_instance.search_account(account_name)
-        except RateLimitError as e:
-            # 记录频率限制
-            db.record_rate_limit(account_name)
-            db.complete_task(task_id, 'failed', str(e))
-            yield f"⚠️ 触发频率限制！请等待30分钟后再试。\n"
-            return
-        except AccountNotFoundError as e:
-            db.complete_task(task_id, 'failed', str(e))
-            yield f"错误: {e}\n"
-            return
-        
-        # 添加/更新公众号记录
-        account_id = db.add_account(account_name, fakeid, nickname, alias)
-        
-        yield f"正在抓取文章列表 (前 {pages} 页)...\n"
-        
-        # 获取文章列表
-        try:
-            articles, is_rate_limited = crawler_instance.fetch_all_articles(fakeid, max_pages=int(pages))
-            
-            if is_rate_limited:
-                db.record_rate_limit(account_name)
-                yield f"⚠️ 触发频率限制！已暂停抓取，将处理已获取的 {len(articles)} 篇文章。\n"
-                yield f"注意：请等待30分钟后再尝试抓取剩余文章。\n"
-                
-        except Exception as e:
-            # 其他错误仍然抛出
-            db.complete_task(task_id, 'failed', str(e))
-            yield f"错误: {e}\n"
-            return
-        
-        yield f"找到 {len(articles)} 篇文章\n"
-        
-        if not articles:
-            db.complete_task(task_id, 'completed')
-            return
+# 队列深度、并发和节流状态在导出指标时读取
+REGISTRY.gauge(
+    "wechat_task_queue_depth", "各状态的任务数", ("status",),
+    collect=lambda: [({"status": status}, count) for status, count in db.count_tasks_by_status().items()]
+)
+REGISTRY.gauge(
+    "wechat_progress_writer_backlog", "等待写入数据库的任务进度事件数",
+    collect=lambda: [({}, task_writer.queue.qsize())]
+)
+REGISTRY.gauge(
+    "wechat_download_concurrency", "下载并发上限和进行中的请求数", ("controller", "kind"),
+    collect=lambda: [
+        ({"controller": snap["name"], "kind": kind}, snap[kind])
+        for snap in (c.snapshot() for c in get_all_controllers())
+        for kind in ("limit", "in_flight")
+    ]
+)
+REGISTRY.gauge(
+    "wechat_circuit_breaker_state", "熔断器状态（0 关闭，1 半开，2 打开）", ("breaker",),
+    collect=lambda: [
+        ({"breaker": snap["name"]}, {"closed": 0, "half_open": 1, "open": 2}[snap["state"]])
+        for snap in (b.snapshot() for b in get_all_breakers())
+    ]
+)
+REGISTRY.gauge(
+    "wechat_egress_state", "出口池各出口的健康分、进行中的请求数和剩余冷却秒数", ("egress", "kind"),
+    collect=lambda: [
+        ({"egress": snap["name"], "kind": kind}, snap[kind])
+        for snap in (get_pool().snapshot() if get_pool() else [])
+        for kind in ("score", "in_flight", "cooldown_remaining")
+    ]
+)
+REGISTRY.gauge(
+    "wechat_session_valid", "登录会话状态（1 有效，0 已失效，-1 未检查或未登录）",
+    collect=lambda: [({}, {True: 1, False: 0}.get(auth.session_valid, -1))]
+)
+REGISTRY.gauge(
+    "wechat_rate_limiter_wait_seconds", "全局节流器距离下一次可用请求额度的秒数", ("channel",),
+    collect=lambda: [({"channel": name}, get_limiter(name).blocked_for()) for name in ("list", "article")]
+)
 
-        # 更新公众号统计
-        db.update_account_stats(account_id, len(articles))
-        
-        # 下载文章
-        yield "开始下载文章...\n"
-        downloader = WeChatDownloader(
-            output_dir=f"output/{account_name}",
-            cookies=auth.cookies,
-            account_id=account_id
-        )
-        
-        downloaded_count = 0
-        failed_count = 0
-        
-        max_workers = 2
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = []
-            for i, article in enumerate(articles):
-                future = executor.submit(download_article_wrapper, downloader, article, i + 1, len(articles))
-                futures.append(future)
-            
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    result = future.result()
-                    yield f"{result}\n"
-                    
-                    if "✓" in result:
-                        downloaded_count += 1
-                    else:
-                        failed_count += 1
-                    
-                    # 更新任务进度
-                    db.update_task_progress(task_id, len(articles), downloaded_count, failed_count)
-                    
-                except Exception as e:
-                    logger.error(f"下载任务出错: {e}", exc_info=True)
-                    yield f"下载出错: {e}\n"
-                    failed_count += 1
-
-        # 完成任务
-        db.complete_task(task_id, 'completed')
-        
-        yield f"\n公众号 {account_name} 处理完成!\n"
-        yield f"成功: {downloaded_count} 篇, 失败: {failed_count} 篇\n"
-        yield "-" * 30 + "\n"
-        
-    except Exception as e:
-        logger.error(f"处理公众号时发生错误: {e}", exc_info=True)
-        db.complete_task(task_id, 'failed', str(e))
-        yield f"发生错误: {e}\n"
+@app.route('/metrics')
+def metrics():
+    """Prometheus 文本格式的运行指标"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def serialize_task(task):
+    return {
+        "id": task[0],
+        "account_name": task[1],
+        "type": task[2],
+        "pages": task[3],
+        "status": task[4],
+        "total_articles": task[5],
+        "downloaded_count": task[6],
+        "failed_count": task[7],
+        "create_time": task[8],
+        "end_time": task[9],
+        "error_message": task[10],
+        "priority": task[11],
+        "has_profile": bool(task[14]) if len(task) > 14 else False,
+    }
 
 @app.route('/api/scrape', methods=['POST'])
 def scrape():
+    """把抓取任务加入后台队列，立即返回任务ID"""
     data = request.json
     task_type = data.get('type')
     pages = int(data.get('pages', 1))
+    metadata_only = bool(data.get('metadata_only', False))
+    priority = int(data.get('priority', 0))
+    job_type = 'metadata' if metadata_only else 'single'
+    profile = profile_mode(data)
+    base_params = {"profile": profile} if profile else {}
+    
+    task_ids = []
+    if task_type == 'single':
+        task_ids.append(job_queue.enqueue(data.get('name'), job_type, pages, dict(base_params), priority))
+    elif task_type == 'batch':
+        accounts = schedule_batch_accounts(data.get('accounts', []), pages)
+        for i, name in enumerate(accounts):
+            params = {"batch_index": i, "batch_size": len(accounts), **base_params}
+            task_ids.append(job_queue.enqueue(name, job_type, pages, params, priority))
+    else:
+        return jsonify({"success": False, "error": f"未知任务类型: {task_type}"}), 400
+    
+    return jsonify({"success": True, "task_ids": task_ids})
+
+@app.route('/api/articles/download', methods=['POST'])
+def download_articles_api():
+    """把选中文章的下载任务加入后台队列"""
+    data = request.json
+    article_ids = data.get('ids', [])
+    priority = int(data.get('priority', 0))
+    params = {"ids": article_ids}
+    profile = profile_mode(data)
+    if profile:
+        params["profile"] = profile
+    task_id = job_queue.enqueue(None, 'download', 0, params, priority)
+    return jsonify({"success": True, "task_ids": [task_id]})
+
+@app.route('/api/concurrency')
+def concurrency_api():
+    """查看文章/图片下载的自适应并发上限、当前并发数、各会话/域名的熔断状态和出口池状态"""
+    pool = get_pool()
+    return jsonify({
+        "controllers": [c.snapshot() for c in get_all_controllers()],
+        "breakers": [b.snapshot() for b in get_all_breakers()],
+        "egress": pool.snapshot() if pool else [],
+    })
+
+@app.route('/api/profiles/slowest')
+def slowest_profiles_api():
+    """
+    下载耗时报表：最慢的文章与平均耗时最高的公众号
+    参数: limit（默认20，最大200）、days（只统计最近N天，默认全部）、min_articles（公众号最少下载次数）
+    """
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    days = request.args.get('days', type=int)
+    min_articles = max(1, request.args.get('min_articles', 1, type=int))
+
+    articles = [{
+        "article_id": r[0],
+        "title": r[1],
+        "account": r[2],
+        "extraction": r[3],
+        "success": bool(r[4]),
+        "retries": r[5],
+        "total_seconds": r[6],
+        "phases": {"fetch": r[7], "render": r[8], "parse": r[9], "images": r[10], "write": r[11]},
+        "html_bytes": r[12],
+        "image_bytes": r[13],
+        "image_count": r[14],
+        "images_failed": r[15],
+        "error": r[16],
+        "created_at": r[17],
+    } for r in db.get_slowest_articles(limit, days)]
+
+    accounts = [{
+        "account_id": r[0],
+        "account": r[1],
+        "downloads": r[2],
+        "avg_seconds": r[3],
+        "max_seconds": r[4],
+        "avg_phases": {"fetch": r[5], "render": r[6], "parse": r[7], "images": r[8], "write": r[9]},
+        "selenium_count": r[10],
+        "retries": r[11],
+        "failed": r[12],
+        "total_bytes": r[13],
+    } for r in db.get_slowest_accounts(limit, days, min_articles)]
+
+    return jsonify({"articles": articles, "accounts": accounts})
+
+@app.route('/api/tasks')
+def list_tasks_api():
+    """获取最近的任务（可按状态过滤）"""
+    status = request.args.get('status')
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({"tasks": [serialize_task(t) for t in db.get_tasks(status, limit)]})
+
+@app.route('/api/tasks/<int:task_id>/cancel', methods=['POST'])
+def cancel_task_api(task_id):
+    """取消任务：排队/暂停中的直接取消，运行中的在下一个检查点停止"""
+    if db.update_task_status(task_id, 'cancelled', ('queued', 'paused')):
+        return jsonify({"success": True, "status": "cancelled"})
+    control = job_queue.get_control(task_id)
+    if control:
+        control.cancel()
+        return jsonify({"success": True, "status": "cancelling"})
+    return jsonify({"success": False, "error": "任务不在可取消状态"}), 409
+
+@app.route('/api/tasks/<int:task_id>/pause', methods=['POST'])
+def pause_task_api(task_id):
+    """暂停任务：未下载的文章保留在任务参数中，恢复后继续"""
+    if db.update_task_status(task_id, 'paused', ('queued',)):
+        return jsonify({"success": True, "status": "paused"})
+    control = job_queue.get_control(task_id)
+    if control:
+        control.pause()
+        return jsonify({"success": True, "status": "pausing"})
+    return jsonify({"success": False, "error": "任务不在可暂停状态"}), 409
+
+@app.route('/api/tasks/<int:task_id>/resume', methods=['POST'])
+def resume_task_api(task_id):
+    """恢复已暂停的任务（重新排队）"""
+    task_writer.flush()
+    if job_queue.resume(task_id):
+        return jsonify({"success": True, "status": "queued"})
+    return jsonify({"success": False, "error": "任务不在暂停状态"}), 409
+
+@app.route('/api/tasks/<int:task_id>')
+def get_task_api(task_id):
+    """获取任务状态及 since（事件ID）之后的进度事件"""
+    task = db.get_task_stats(task_id)
+    if not task:
+        return jsonify({"error": "任务不存在"}), 404
+    
+    since = request.args.get('since', 0, type=int)
+    events, finished = job_queue.get_events(task_id, since)
+    task_info = serialize_task(task)
+    return jsonify({
+        "task": task_info,
+        "events": events,
+        "finished": finished if finished is not None else task_info["status"] in FINISHED_STATUSES,
+    })
+
+@app.route('/api/tasks/<int:task_id>/profile')
+def task_profile_api(task_id):
+    """
+    下载任务的性能剖析结果（cProfile 为 .prof，采样为 .folded）
+    format=text 时把 cProfile 结果渲染为文本，sort 为 pstats 排序字段（默认 cumulative）
+    """
+    task = db.get_task_stats(task_id)
+    if not task:
+        return jsonify({"error": "任务不存在"}), 404
+    path = task[14]
+    if not path or not os.path.isfile(path):
+        return jsonify({"error": "该任务没有剖析结果"}), 404
+    
+    if request.args.get('format') == 'text' and path.endswith('.prof'):
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'ncalls', 'filename'):
+            sort = 'cumulative'
+        limit = max(1, min(request.args.get('limit', 40, type=int), 500))
+        return Response(cprofile_summary(path, sort, limit), mimetype='text/plain; charset=utf-8')
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path))
+
+@app.route('/api/tasks/<int:task_id>/events')
+def task_events_api(task_id):
+    """
+    以 Server-Sent Events 推送任务进度事件
+    断线重连时浏览器会带上 Last-Event-ID，从该事件之后继续推送
+    """
+    if not db.get_task_stats(task_id):
+        return jsonify({"error": "任务不存在"}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get('last_event_id', 0, type=int)
     
     def generate():
-        try:
-            if task_type == 'single':
-                name = data.get('name')
-                yield from process_account(name, pages)
-            elif task_type == 'batch':
-                accounts = data.get('accounts', [])
-                for i, name in enumerate(accounts):
-                    yield f"\n=== 开始处理第 {i+1}/{len(accounts)} 个公众号: {name} ===\n"
-                    yield from process_account(name, pages)
-                    
-                    if i < len(accounts) - 1:
-                        delay = random.randint(30, 60)
-                        yield f"\n等待 {delay} 秒后继续下一个公众号...\n"
-                        time.sleep(delay)
+        after = last_event_id
+        while True:
+            events, finished = job_queue.wait_events(task_id, after, timeout=15)
+            for event in events:
+                after = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if event['type'] == 'end':
+                    return
+            if events:
+                continue
             
-            yield "\n所有任务执行完毕。\n"
-        except Exception as e:
-            logger.error(f"抓取任务出错: {e}", exc_info=True)
-            yield f"\n发生严重错误: {e}\n"
-
-    return Response(stream_with_context(generate()), mimetype='text/plain')
+            if finished is None:
+                # 任务尚未开始，或在本进程启动前已执行完毕
+                task = db.get_task_stats(task_id)
+                finished = not task or task[4] in FINISHED_STATUSES
+            if finished:
+                yield "event: end\ndata: {}\n\n"
+                return
+            # 保持连接
+            yield ": keepalive\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
 
 @app.route('/api/search')
 def search_articles():
@@ -646,7 +623,85 @@ def search_articles():
     if not query:
         return jsonify([])
     
-    results = db.search_articles(query)
+    def build():
+        results = db.search_articles(query)
+        tags = db.get_tags_for_articles([r[0] for r in results])
+        articles = []
+        for r in results:
+            articles.append({
+                "id": r[0],
+                "title": r[1],
+                "link": r[2],
+                "publish_date": r[3],
+                "downloaded": bool(r[4]),
+                "local_path": r[5],
+                "account_name": r[6],
+                "is_favorite": bool(r[7]),
+                "is_read": bool(r[8]),
+                "tags": tags.get(r[0], [])
+            })
+        return articles
+    
+    stamp = [query] + db.get_change_versions(['articles', 'accounts', 'tags', 'article_tags'])
+    return cached_json(stamp, build)
+
+# 高级搜索每页最大条数
+ADVANCED_SEARCH_MAX_PAGE_SIZE = 200
+
+def encode_search_cursor(sort_by, order, sort_value, article_id):
+    """把最后一条记录的排序值编码为不透明的分页游标"""
+    raw = json.dumps([sort_by, order, sort_value, article_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_search_cursor(cursor, sort_by, order):
+    """解析分页游标，返回 (sort_value, article_id)；游标无效或排序方式不一致时抛出 ValueError"""
+    try:
+        cursor_sort, cursor_order, sort_value, article_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if cursor_sort != sort_by or cursor_order != order:
+        raise ValueError("分页游标与排序方式不一致")
+    return sort_value, article_id
+
+@app.route('/api/search/advanced', methods=['POST'])
+def advanced_search_api():
+    """
+    高级搜索（分页）
+    首页可用 offset 跳页，之后使用上一页返回的 next_cursor 继续翻页；
+    total 和标签分面 tag_facets（按相同筛选条件统计的各标签文章数）只在首页（或 with_total 为真时）计算
+    """
+    data = request.json or {}
+    sort_by = data.get('sort_by') or 'date'
+    if sort_by not in db.ADVANCED_SORT_COLUMNS:
+        sort_by = 'date'
+    order = 'asc' if str(data.get('order')).lower() == 'asc' else 'desc'
+    
+    try:
+        page_size = max(1, min(int(data.get('limit') or 50), ADVANCED_SEARCH_MAX_PAGE_SIZE))
+        offset = max(0, int(data.get('offset') or 0))
+        after = decode_search_cursor(data['cursor'], sort_by, order) if data.get('cursor') else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    filters = {
+        "query": (data.get('query') or '').strip(),
+        "account_id": data.get('account_id') or None,
+        "date_from": data.get('date_from') or None,
+        "date_to": data.get('date_to') or None,
+        "is_favorite": data.get('is_favorite'),
+        "is_read": data.get('is_read'),
+        "tags": data.get('tags'),
+        "tag_match": data.get('tag_match', 'any'),
+    }
+    
+    # 多取一条用于判断是否还有下一页
+    results = db.search_articles_advanced(
+        sort_by=sort_by, order=order, limit=page_size + 1, offset=0 if after else offset, after=after, **filters
+    )
+    has_more = len(results) > page_size
+    results = results[:page_size]
+    
+    tags = db.get_tags_for_articles([r[0] for r in results])
     articles = []
     for r in results:
         articles.append({
@@ -657,11 +712,38 @@ def search_articles():
             "downloaded": bool(r[4]),
             "local_path": r[5],
             "account_name": r[6],
-            "is_favorite": bool(r[7]) if len(r) > 7 else False,
-            "is_read": bool(r[8]) if len(r) > 8 else False,
-            "tags": r[9].split(',') if len(r) > 9 and r[9] else []
+            "is_favorite": bool(r[7]),
+            "is_read": bool(r[8]),
+            "snippet": r[9] or "",
+            "tags": tags.get(r[0], [])
         })
-    return jsonify(articles)
+    
+    total = None
+    tag_facets = None
+    if not after or data.get('with_total'):
+        total = db.count_articles_advanced(**filters)
+        tag_facets = [{"name": name, "count": count} for name, count in db.get_tag_counts(**filters)]
+    
+    next_cursor = None
+    if has_more:
+        last = results[-1]
+        next_cursor = encode_search_cursor(sort_by, order, last[10], last[0])
+    
+    return jsonify({
+        "articles": articles,
+        "total": total,
+        "tag_facets": tag_facets,
+        "page_size": page_size,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+    })
+
+@app.route('/api/tags')
+def get_tags_api():
+    """获取标签及对应文章数（可按公众号过滤）"""
+    account_id = request.args.get('account_id', type=int)
+    counts = db.get_tag_counts(account_id=account_id)
+    return jsonify({"tags": [{"name": name, "count": count} for name, count in counts]})
 
 @app.route('/api/articles/<int:article_id>/favorite', methods=['POST'])
 def toggle_favorite_api(article_id):
@@ -680,6 +762,19 @@ def update_tags_api(article_id):
     db.update_tags(article_id, tags)
     return jsonify({"success": True})
 
+@app.route('/api/articles/batch/tags', methods=['POST'])
+def batch_tags_api():
+    data = request.json
+    article_ids = data.get('ids', [])
+    tags = data.get('tags', [])
+    action = data.get('action', 'add')
+    if article_ids:
+        if action == 'remove':
+            db.batch_remove_tags(article_ids, tags)
+        else:
+            db.batch_add_tags(article_ids, tags)
+    return jsonify({"success": True, "updated": len(article_ids)})
+
 @app.route('/api/articles/batch/delete', methods=['POST'])
 def batch_delete_api():
     data = request.json
@@ -0,0 +1,330 @@
+"""
+Flask API 压测
+
+在进程内启动 Web 服务（多线程模式）和模拟公众平台，提交一个批量抓取任务，
+同时用多个客户端线程按权重请求只读接口，统计各接口的延迟分位数和错误率：
+
+    python -m benchmarks.loadtest                                   # 默认 16 个客户端，30 秒
+    python -m benchmarks.loadtest --clients 64 --duration 60 --rows 100000 --output load.json
+    python -m benchmarks.loadtest --target http://10.0.0.5:5001 --duration 60  # 只压测已部署的服务，不提交抓取
+
+客户端会记住每个地址的 ETag 并带上 If-None-Match（与前端轮询一致），304 计为成功。
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+from benchmarks.run import REPO_ROOT, SEARCH_QUERIES, _git_commit, seed_database
+from benchmarks.stub_wechat import StubWeChat
+
+# 任务结束的状态（与 wechat_scraper.tasks.FINISHED_STATUSES 一致）
+FINISHED_STATUSES = ("completed", "failed", "cancelled", "paused")
+# 接口权重（相对值）
+DEFAULT_MIX = {
+    "accounts": 25,
+    "articles": 25,
+    "search": 20,
+    "output": 20,
+    "export": 10,
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Endpoints:
+    """根据服务中已有的数据生成各类请求地址"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.account_ids = []
+        self.output_paths = []
+
+    def discover(self):
+        accounts = _get_json(self.base_url + "/api/accounts")["accounts"]
+        self.account_ids = [account["id"] for account in accounts]
+        for account_id in self.account_ids[:20]:
+            for article in _get_json(f"{self.base_url}/api/articles/{account_id}")["articles"]:
+                if article["downloaded"] and article["filepath"]:
+                    self.output_paths.append(article["filepath"].replace(os.sep, "/"))
+
+    def url(self, kind):
+        if kind == "accounts":
+            return "/api/accounts"
+        if kind == "articles":
+            return f"/api/articles/{random.choice(self.account_ids)}" if self.account_ids else None
+        if kind == "search":
+            return "/api/search?q=" + urllib.parse.quote(random.choice(SEARCH_QUERIES))
+        if kind == "output":
+            if not self.output_paths:
+                return None
+            path = urllib.parse.quote(random.choice(self.output_paths))
+            return f"/{path}?highlight=" + urllib.parse.quote(random.choice(SEARCH_QUERIES))
+        if kind == "export":
+            return "/api/export?format=csv&content=0"
+        raise ValueError(kind)
+
+    def missing(self, mix):
+        """权重大于 0 但没有可请求地址的接口"""
+        return [kind for kind, weight in mix.items() if weight and self.url(kind) is None]
+
+
+def _get_json(url, data=None):
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+class LoadStats:
+    """按接口记录延迟和状态码（线程安全）"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.bytes = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, latency, status, size=0):
+        with self._lock:
+            self.latencies[kind].append(latency)
+            self.statuses[kind][status] += 1
+            self.bytes[kind] += size
+
+    def summary(self, duration):
+        results = []
+        for kind in sorted(self.latencies):
+            latencies = sorted(self.latencies[kind])
+            statuses = self.statuses[kind]
+            total = len(latencies)
+            errors = sum(count for status, count in statuses.items() if status not in (200, 304))
+            metrics = {
+                "requests": total,
+                "requests_per_sec": round(total / duration, 3),
+                "error_rate": round(errors / total, 6) if total else 0.0,
+                "not_modified": statuses.get(304, 0),
+                "mean_ms": round(sum(latencies) / total * 1000, 3) if total else None,
+                "max_ms": round(latencies[-1] * 1000, 3) if total else None,
+                "mb": round(self.bytes[kind] / 1024 / 1024, 3),
+            }
+            for p in PERCENTILES:
+                metrics[f"p{p}_ms"] = round(_percentile(latencies, p) * 1000, 3) if total else None
+            results.append({"name": f"load.{kind}", "params": {}, "metrics": metrics,
+                            "statuses": {str(status): count for status, count in statuses.items()}})
+        return results
+
+
+def _percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def client_loop(endpoints, mix, stats, deadline):
+    """单个客户端：按权重随机选择接口，带 If-None-Match 重复请求直到截止时间"""
+    kinds = [kind for kind in mix if mix[kind]]
+    etags = {}
+    while kinds and time.monotonic() < deadline:
+        kind = random.choices(kinds, [mix[kind] for kind in kinds])[0]
+        path = endpoints.url(kind)
+        if not path:
+            # 没有可请求的地址，不再选择该接口（避免空转）
+            kinds.remove(kind)
+            continue
+        headers = {"Accept-Encoding": "gzip"}
+        if path in etags:
+            headers["If-None-Match"] = etags[path]
+        request = urllib.request.Request(endpoints.base_url + path, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                size = 0
+                while True:
+                    chunk = response.read(64 * 1024)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                status = response.status
+                if response.headers.get("ETag"):
+                    etags[path] = response.headers["ETag"]
+        except urllib.error.HTTPError as e:
+            status, size = e.code, 0
+        except Exception as e:
+            status, size = type(e).__name__, 0
+        stats.record(kind, time.perf_counter() - started, status, size)
+
+
+def wait_tasks_finished(base_url, task_ids, timeout=60.0):
+    """等待抓取任务响应取消并结束，避免关闭服务后任务线程仍在运行"""
+    deadline = time.monotonic() + timeout
+    pending = list(task_ids)
+    while pending:
+        pending = [task_id for task_id in pending
+                   if _get_json(f"{base_url}/api/tasks/{task_id}")["task"]["status"] not in FINISHED_STATUSES]
+        if not pending:
+            return
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"任务在 {timeout} 秒内未结束: {pending}")
+        time.sleep(0.2)
+
+
+def start_local_server(args, stub, workdir):
+    """在临时目录中启动 Web 服务，抓取器指向模拟公众平台，返回 (base_url, server)"""
+    from werkzeug.serving import make_server
+
+    import app as web
+    from wechat_scraper import tasks
+    from wechat_scraper.crawler import WeChatCrawler
+    from wechat_scraper.rate_limiter import get_limiter
+
+    # /output 的文件按应用根目录查找，指向临时目录
+    web.app.root_path = workdir
+    for name, interval in (("list", args.list_interval), ("article", args.article_interval)):
+        limiter = get_limiter(name)
+        limiter.interval, limiter.jitter = interval, 0.0
+    tasks.crawler = WeChatCrawler("loadtest-token", {})
+    tasks.crawler.base_url = stub.base_url
+
+    if args.rows:
+        print(f"准备数据: {args.rows} 篇文章", file=sys.stderr)
+        seed_database(web.db, args.rows)
+        seed_output_files(web.db, stub, args.output_files)
+
+    server = make_server("127.0.0.1", 0, web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def seed_output_files(db, stub, count):
+    """为前 count 篇已下载的文章写入文章页面，供 /output 请求使用"""
+    conn = db.get_connection()
+    ids = [row[0] for row in conn.execute("SELECT id FROM articles WHERE downloaded = 1 ORDER BY id LIMIT ?", (count,))]
+    os.makedirs(os.path.join("output", "seed"), exist_ok=True)
+    updates = []
+    for i, article_id in enumerate(ids):
+        path = os.path.join("output", "seed", f"{article_id}.html")
+        with open(path, "wb") as f:
+            f.write(stub.article_pages[i % len(stub.article_pages)][1])
+        updates.append((path, article_id))
+    with conn:
+        conn.executemany("UPDATE articles SET local_path = ? WHERE id = ?", updates)
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flask API 压测")
+    parser.add_argument("--target", help="压测已运行的服务（不启动本地服务，不提交抓取任务）")
+    parser.add_argument("--clients", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--duration", type=float, default=30.0, help="压测时长（秒）")
+    parser.add_argument("--mix", help="接口权重，如 accounts=25,articles=25,search=20,output=20,export=10")
+    parser.add_argument("--rows", type=int, default=10000, help="本地服务预先写入的文章数")
+    parser.add_argument("--output-files", type=int, default=200, help="预先写入的文章页面数")
+    parser.add_argument("--scrape-accounts", type=int, default=3, help="压测期间批量抓取的公众号数（0 表示不抓取）")
+    parser.add_argument("--scrape-pages", type=int, default=10, help="每个公众号抓取的列表页数")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="模拟公众平台每个请求的延迟（秒）")
+    parser.add_argument("--list-interval", type=float, default=0.2, help="列表请求节流间隔（秒）")
+    parser.add_argument("--article-interval", type=float, default=0.05, help="文章请求节流间隔（秒）")
+    parser.add_argument("--output", help="结果写入该文件（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix = {key: float(value) for key, value in (item.split("=") for item in args.mix.split(","))}
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            parser.error(f"未知接口: {', '.join(sorted(unknown))}")
+
+    report = {
+        "commit": _git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": {key: value for key, value in vars(args).items() if key != "output"},
+        "mix": mix,
+    }
+
+    sys.path.insert(0, REPO_ROOT)
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="wechat_load_", ignore_cleanup_errors=True) as workdir:
+        os.chdir(workdir)
+        stub = server = None
+        try:
+            if args.target:
+                base_url = args.target.rstrip("/")
+            else:
+                logging.getLogger("WeChatScraper").setLevel(logging.WARNING)
+                stub = StubWeChat(latency=args.stub_latency).start()
+                base_url, server = start_local_server(args, stub, workdir)
+
+            endpoints = Endpoints(base_url)
+            endpoints.discover()
+            missing = endpoints.missing(mix)
+            if missing:
+                raise RuntimeError(f"以下接口没有可请求的地址（服务中缺少对应数据）: {', '.join(missing)}")
+
+            task_ids = []
+            if not args.target and args.scrape_accounts:
+                accounts = [f"压测公众号{i}" for i in range(args.scrape_accounts)]
+                task_ids = _get_json(base_url + "/api/scrape", {
+                    "type": "batch", "accounts": accounts, "pages": args.scrape_pages,
+                })["task_ids"]
+
+            print(f"压测 {base_url}: {args.clients} 个客户端, {args.duration} 秒", file=sys.stderr)
+            stats = LoadStats()
+            started = time.monotonic()
+            deadline = started + args.duration
+            clients = [threading.Thread(target=client_loop, args=(endpoints, mix, stats, deadline), daemon=True)
+                       for _ in range(args.clients)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = time.monotonic() - started
+
+            report["duration"] = round(elapsed, 3)
+            report["results"] = stats.summary(elapsed)
+
+            if task_ids:
+                tasks = [_get_json(f"{base_url}/api/tasks/{task_id}")["task"] for task_id in task_ids]
+                downloaded = sum(task["downloaded_count"] or 0 for task in tasks)
+                report["scrape"] = {
+                    "tasks": [{"id": t["id"], "status": t["status"], "downloaded": t["downloaded_count"],
+                               "failed": t["failed_count"], "total": t["total_articles"]} for t in tasks],
+                    "articles_per_sec": round(downloaded / elapsed, 3),
+                    "stub_requests": dict(stub.requests),
+                }
+                for task_id in task_ids:
+                    try:
+                        _get_json(f"{base_url}/api/tasks/{task_id}/cancel", {})
+                    except urllib.error.HTTPError:
+                        pass  # 已结束的任务
+                wait_tasks_finished(base_url, task_ids)
+        finally:
+            if server:
+                server.shutdown()
+            if stub:
+                stub.stop()
+            os.chdir(original_cwd)
+
+    for result in report.get("results", []):
+        m = result["metrics"]
+        print(f"{result['name']:<16} {m['requests']:>7} 次  {m['requests_per_sec']:>8} rps  "
+              f"p50 {m['p50_ms']} ms  p95 {m['p95_ms']} ms  p99 {m['p99_ms']} ms  错误率 {m['error_rate']:.2%}",
+              file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
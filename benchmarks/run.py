@@ -0,0 +1,391 @@
+"""
+离线基准测试
+
+在临时目录中运行，不访问外网，结果以 JSON 输出，便于在不同提交之间比较：
+
+    python -m benchmarks.run                                  # 全部基准，默认规模
+    python -m benchmarks.run --only database --sizes 10000,100000,1000000
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline main.json --threshold 0.15   # 与基线比较，退化超过阈值时退出码为 1
+
+每条结果为 {"name", "params", "metrics"}；指标名以 _per_sec 结尾的越大越好，其余（耗时、内存）越小越好。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stub_wechat import FAKEID, StubWeChat
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = (10000, 100000)
+
+_WORDS = ("人工智能 数据 模型 训练 推理 产品 用户 增长 市场 研究 技术 架构 系统 性能 优化 服务 平台 开源 社区 生态 "
+          "公众号 文章 阅读 作者 观点 行业 趋势 创新 投资 管理 团队 组织 学习 教育 健康 城市 生活 文化 历史 科学").split()
+SEARCH_QUERIES = ("开源社区", "性能优化", "城市生活", "不存在的关键词")
+
+
+def _result(name, params, **metrics):
+    return {"name": name, "params": params, "metrics": {k: round(v, 6) if isinstance(v, float) else v
+                                                         for k, v in metrics.items()}}
+
+
+def _timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    value = func(*args, **kwargs)
+    return value, time.perf_counter() - started
+
+
+# ---------- download_article ----------
+
+def bench_download(stub, args):
+    """通过模拟服务下载文章，按页面类型统计吞吐量和解析/改写各阶段耗时"""
+    from wechat_scraper.downloader import WeChatDownloader
+
+    downloader = WeChatDownloader(output_dir=os.path.join(os.getcwd(), "output"), max_retries=0)
+    variants = len(stub.article_pages)
+    results = []
+    for v, (name, page) in enumerate(stub.article_pages):
+        phases = {"parse": 0.0, "images": 0.0, "write": 0.0}
+        failed = 0
+        started = time.perf_counter()
+        for i in range(args.articles):
+            n = v + i * variants
+            stats = {}
+            success, _, _, _ = downloader.download_article(stub.article_link(n), f"基准文章 {n}", "2024-01-01", stats=stats)
+            failed += 0 if success else 1
+            for phase in phases:
+                phases[phase] += stats.get("phases", {}).get(phase, 0.0)
+        elapsed = time.perf_counter() - started
+        results.append(_result(
+            "download_article", {"page": name, "articles": args.articles},
+            seconds=elapsed,
+            articles_per_sec=args.articles / elapsed,
+            parse_ms=phases["parse"] / args.articles * 1000,
+            images_ms=phases["images"] / args.articles * 1000,
+            write_ms=phases["write"] / args.articles * 1000,
+            html_kb=len(page) / 1024,
+            failed=failed,
+        ))
+    return results
+
+
+# ---------- Database ----------
+
+def _listing_rows(start, count):
+    return [{
+        "aid": f"{start + i}_1",
+        "itemidx": 1,
+        "link": f"https://mp.weixin.qq.com/s?__biz={FAKEID}&mid={start + i}&idx=1",
+        "title": f"基准文章 {start + i} " + "".join(random.choice(_WORDS) for _ in range(4)),
+        "digest": "".join(random.choice(_WORDS) for _ in range(10)),
+        "update_time": 1704067200 - (start + i) * 600,
+    } for i in range(count)]
+
+
+def seed_database(db, rows, batch_size=1000):
+    """写入 rows 篇文章（含正文，约 1/3 标记为已下载），返回插入耗时（秒）"""
+    random.seed(rows)
+    account_id = db.add_account("基准测试公众号", fakeid=FAKEID)
+    insert_seconds = 0.0
+    for start in range(0, rows, batch_size):
+        _, elapsed = _timed(db.upsert_listing_articles, account_id, _listing_rows(start, min(batch_size, rows - start)))
+        insert_seconds += elapsed
+
+    # 正文与下载状态属于准备数据，不计入插入耗时
+    paragraphs = ["".join(random.choice(_WORDS) for _ in range(120)) for _ in range(200)]
+    conn = db.get_connection()
+    with conn:
+        conn.executemany(
+            "UPDATE articles SET content = ?, downloaded = ?, local_path = ? WHERE id = ?",
+            ((paragraphs[i % len(paragraphs)], i % 3 == 0, f"output/{i}.html" if i % 3 == 0 else None, i)
+             for i in range(1, rows + 1)))
+    conn.close()
+    return insert_seconds
+
+
+def bench_database(stub, args):
+    """不同数据量下的批量插入、全文搜索、偏移分页与键集分页"""
+    from wechat_scraper.database import Database
+
+    results = []
+    for rows in args.sizes:
+        db = Database(os.path.join(os.getcwd(), "data", f"bench_{rows}.db"))
+        insert_seconds = seed_database(db, rows)
+        results.append(_result("database.insert", {"rows": rows},
+                               seconds=insert_seconds, rows_per_sec=rows / insert_seconds))
+
+        for query in SEARCH_QUERIES:
+            matched, elapsed = _timed(db.search_articles, query)
+            results.append(_result("database.search", {"rows": rows, "query": query},
+                                   seconds=elapsed, matched=len(matched)))
+            _, elapsed = _timed(db.count_articles_advanced, query)
+            results.append(_result("database.count_advanced", {"rows": rows, "query": query}, seconds=elapsed))
+
+        page_size = 50
+        _, elapsed = _timed(db.search_articles_advanced, "", limit=page_size)
+        results.append(_result("database.page_first", {"rows": rows, "limit": page_size}, seconds=elapsed))
+        _, elapsed = _timed(db.search_articles_advanced, "", limit=page_size, offset=rows // 2)
+        results.append(_result("database.page_offset", {"rows": rows, "limit": page_size, "offset": rows // 2},
+                               seconds=elapsed))
+
+        # 键集分页：连续翻 20 页的平均耗时
+        pages = 20
+        after = None
+        started = time.perf_counter()
+        for _ in range(pages):
+            page = db.search_articles_advanced("", limit=page_size, after=after)
+            if not page:
+                break
+            after = (page[-1][10], page[-1][0])
+        elapsed = time.perf_counter() - started
+        results.append(_result("database.page_keyset", {"rows": rows, "limit": page_size, "pages": pages},
+                               seconds_per_page=elapsed / pages))
+    return results
+
+
+# ---------- /api/export ----------
+
+def bench_export(stub, args):
+    """通过 Flask 测试客户端流式导出，记录耗时和 Python 堆内存峰值（tracemalloc）"""
+    import app as web
+    from wechat_scraper.database import Database
+
+    client = web.app.test_client()
+    results = []
+    for rows in args.sizes:
+        # 接口通过模块级 db 访问数据库，替换为对应规模的数据库
+        web.db = Database(os.path.join(os.getcwd(), "data", f"export_{rows}.db"))
+        seed_database(web.db, rows)
+        for export_format in ("csv", "jsonl", "xlsx"):
+            for content in ("0", "1"):
+                tracemalloc.start()
+                started = time.perf_counter()
+                response = client.get(f"/api/export?format={export_format}&content={content}", buffered=False)
+                size = sum(len(chunk) for chunk in response.response)
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                response.close()
+                if response.status_code != 200:
+                    results.append(_result("export", {"rows": rows, "format": export_format, "content": content},
+                                           error=response.status_code))
+                    continue
+                results.append(_result(
+                    "export", {"rows": rows, "format": export_format, "content": content},
+                    seconds=elapsed, rows_per_sec=rows / elapsed,
+                    peak_memory_mb=peak / 1024 / 1024, output_mb=size / 1024 / 1024,
+                ))
+    return results
+
+
+# ---------- crawler ----------
+
+def bench_crawler(stub, args):
+    """列表接口分页抓取速度（关闭全局节流，只衡量请求与解析开销）"""
+    from wechat_scraper.crawler import WeChatCrawler
+    from wechat_scraper.rate_limiter import get_limiter
+
+    limiter = get_limiter("list")
+    limiter.interval, limiter.jitter = 0.0, 0.0
+
+    crawler = WeChatCrawler("benchmark-token", {})
+    crawler.base_url = stub.base_url
+    (fakeid, _, _), search_seconds = _timed(crawler.search_account, "基准测试公众号")
+
+    pages = stub.total_articles // 5
+    (articles, rate_limited), elapsed = _timed(crawler.fetch_all_articles, fakeid, pages)
+    return [
+        _result("crawler.search", {}, seconds=search_seconds),
+        _result("crawler.list", {"pages": pages},
+                seconds=elapsed, pages_per_sec=pages / elapsed, articles_per_sec=len(articles) / elapsed,
+                rate_limited=rate_limited),
+    ]
+
+
+# ---------- 日志 ----------
+
+def bench_logging(stub, args, images=64, threads=8):
+    """
+    模拟多图文章的图片线程逐张记录 debug 日志：调用方线程的单次耗时（日志经队列由后台线程写出）
+    以及写出剩余日志的耗时；debug 关闭时调用只做级别判断
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from wechat_scraper.logger import logger
+
+    level = logger.logger.level
+    calls = images * args.articles
+    results = []
+    try:
+        for enabled in (True, False):
+            logger.logger.setLevel(logging.DEBUG if enabled else logging.INFO)
+
+            def log_images(article):
+                for i in range(images):
+                    logger.debug("图片下载成功: %s", f"img_{article}_{i}.jpg")
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(log_images, range(args.articles)))
+            elapsed = time.perf_counter() - started
+            _, flush_seconds = _timed(logger.flush)
+            results.append(_result("logging", {"debug": enabled, "images": images, "threads": threads},
+                                   calls_per_sec=calls / elapsed, us_per_call=elapsed / calls * 1e6,
+                                   flush_seconds=flush_seconds))
+    finally:
+        logger.logger.setLevel(level)
+    return results
+
+
+# ---------- 启动耗时 ----------
+
+STARTUP_MODULES = ("app", "wechat_scraper.worker", "wechat_scraper.tasks", "wechat_scraper.downloader")
+HEAVY_MODULES = ("flask", "selenium", "webdriver_manager", "bs4", "lxml", "requests")
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+__import__(sys.argv[1])
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def bench_startup(stub, args, repeat=5):
+    """在全新子进程中导入各入口模块，取多次中的最小耗时，并记录导入后已加载的重量级依赖"""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    results = []
+    for module in STARTUP_MODULES:
+        runs = []
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, module, *HEAVY_MODULES],
+                                  capture_output=True, text=True, env=env)
+            if proc.returncode != 0:
+                break
+            runs.append(json.loads(proc.stdout))
+        if not runs:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode
+            results.append(_result("startup", {"module": module}, error=error))
+            continue
+        loaded = runs[0]["loaded"]
+        result = _result("startup", {"module": module}, import_seconds=min(run["seconds"] for run in runs),
+                         heavy_modules=len(loaded))
+        result["heavy_modules_loaded"] = loaded
+        results.append(result)
+    return results
+
+
+BENCHMARKS = {
+    "download": bench_download,
+    "database": bench_database,
+    "export": bench_export,
+    "crawler": bench_crawler,
+    "logging": bench_logging,
+    "startup": bench_startup,
+}
+
+
+# ---------- 输出与比较 ----------
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True, ensure_ascii=False)
+
+
+def compare(baseline, current, threshold):
+    """返回退化项列表 [(name, params, metric, old, new, change)]"""
+    old_results = {_key(r): r["metrics"] for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = old_results.get(_key(result))
+        if not old:
+            continue
+        for metric, new_value in result["metrics"].items():
+            old_value = old.get(metric)
+            if not isinstance(new_value, (int, float)) or not isinstance(old_value, (int, float)) or not old_value:
+                continue
+            if isinstance(new_value, bool) or metric in ("failed", "matched", "html_kb", "output_mb", "error"):
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if metric.endswith("_per_sec") else change
+            if worse > threshold:
+                regressions.append((result["name"], result["params"], metric, old_value, new_value, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument("--only", help="逗号分隔的基准名: " + ",".join(BENCHMARKS))
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="数据库/导出基准的文章数，如 10000,100000,1000000")
+    parser.add_argument("--articles", type=int, default=20, help="每种页面下载的文章数")
+    parser.add_argument("--image-bytes", type=int, default=40 * 1024, help="模拟图片大小")
+    parser.add_argument("--output", help="结果写入该文件（默认输出到标准输出）")
+    parser.add_argument("--baseline", help="与该结果文件比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="退化阈值（相对变化），默认 0.2")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": {"only": names, "sizes": args.sizes, "articles": args.articles, "image_bytes": args.image_bytes},
+        "results": [],
+        "errors": {},
+    }
+
+    sys.path.insert(0, REPO_ROOT)
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="wechat_bench_") as workdir:
+        # 数据库、日志、下载文件都写到临时目录
+        os.chdir(workdir)
+        try:
+            logging.getLogger("WeChatScraper").setLevel(logging.WARNING)
+            with StubWeChat(image_bytes=args.image_bytes) as stub:
+                for name in names:
+                    print(f"运行基准: {name}", file=sys.stderr)
+                    try:
+                        report["results"].extend(BENCHMARKS[name](stub, args))
+                    except ImportError as e:
+                        report["errors"][name] = f"缺少依赖: {e.name}"
+                    except Exception as e:
+                        report["errors"][name] = repr(e)
+        finally:
+            os.chdir(original_cwd)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for name, params, metric, old, new, change in regressions:
+            print(f"退化: {name} {params} {metric}: {old} -> {new} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if report["errors"] and not report["results"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
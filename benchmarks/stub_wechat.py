@@ -0,0 +1,174 @@
+"""
+本地模拟的微信公众平台，供基准测试和压测使用
+
+提供与线上相同路径的接口：
+- /cgi-bin/home        后台首页（会话检查，始终有效）
+- /cgi-bin/searchbiz   公众号搜索（fixtures/searchbiz.json，不同名称对应不同 fakeid）
+- /cgi-bin/appmsg      文章列表，按 fakeid/begin/count 分页生成（以 fixtures/appmsg_list.json 为模板）
+- /s?__biz=..&mid=..   文章页面，按 mid 轮流返回 fixtures/articles/ 下的页面
+- /mmbiz_*/...         图片，返回固定大小的内容
+
+fixtures 中的 {{BASE}} 会替换为模拟服务的地址，爬虫和下载器只需把 base_url / 文章链接指向它。
+"""
+import copy
+import json
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIRST_MID = 2650000001
+FAKEID = "MzA5NzY0NjY0MA=="
+
+
+def _read_fixture(*parts):
+    with open(os.path.join(FIXTURES_DIR, *parts), encoding="utf-8") as f:
+        return f.read()
+
+
+class StubWeChat:
+    """
+    total_articles: 列表接口返回的文章总数
+    image_bytes: 每张图片的字节数
+    latency: 每个请求额外等待的秒数（模拟网络延迟）
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, total_articles=500, image_bytes=40 * 1024, latency=0.0):
+        self.total_articles = total_articles
+        self.latency = latency
+        self.image_body = b"\xff\xd8\xff\xe0" + b"\x00" * max(0, image_bytes - 4)
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+        base = self.base_url
+        self._searchbiz = json.loads(_read_fixture("searchbiz.json").replace("{{BASE}}", base))
+        self._list_template = json.loads(_read_fixture("appmsg_list.json").replace("{{BASE}}", base))
+        names = sorted(os.listdir(os.path.join(FIXTURES_DIR, "articles")))
+        self.article_pages = [
+            (name, _read_fixture("articles", name).replace("{{BASE}}", base).encode("utf-8"))
+            for name in names if name.endswith(".html")
+        ]
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def article_link(self, n, fakeid=FAKEID):
+        """公众号 fakeid 的第 n 篇文章（从 0 开始）的链接，与列表接口返回的一致"""
+        return f"{self.base_url}/s?__biz={fakeid}&mid={FIRST_MID + n}&idx=1&sn={n:032x}&chksm=0#rd"
+
+    def search_response(self, query):
+        """搜索结果：fixture 中的公众号名称返回原 fakeid，其他名称生成独立的 fakeid，使各公众号的文章互不重复"""
+        data = copy.deepcopy(self._searchbiz)
+        account = data["list"][0]
+        if query and query != account["nickname"]:
+            account["fakeid"] = f"bench{zlib.crc32(query.encode('utf-8')):08x}"
+            account["nickname"] = query
+        return data
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-wechat", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def list_page(self, begin, count, fakeid=FAKEID):
+        """生成 appmsg 接口的一页响应"""
+        templates = self._list_template["app_msg_list"]
+        items = []
+        for n in range(begin, min(begin + count, self.total_articles)):
+            item = copy.deepcopy(templates[n % len(templates)])
+            item["aid"] = f"{FIRST_MID + n}_1"
+            item["appmsgid"] = FIRST_MID + n
+            item["link"] = self.article_link(n, fakeid)
+            item["title"] = f"基准文章 {n}"
+            item["create_time"] = item["update_time"] = 1704067200 - n * 3600
+            items.append(item)
+        return {"app_msg_cnt": self.total_articles, "app_msg_list": items, "base_resp": {"err_msg": "ok", "ret": 0}}
+
+    def _count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+
+                if url.path == "/cgi-bin/home":
+                    stub._count("home")
+                    body = json.dumps({"base_resp": {"err_msg": "ok", "ret": 0}}).encode("utf-8")
+                    self._send(200, body, "application/json; charset=utf-8")
+                elif url.path == "/cgi-bin/searchbiz":
+                    stub._count("searchbiz")
+                    data = stub.search_response(query.get("query", [""])[0])
+                    self._send(200, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+                elif url.path == "/cgi-bin/appmsg":
+                    stub._count("appmsg")
+                    begin = int(query.get("begin", ["0"])[0])
+                    count = int(query.get("count", ["5"])[0])
+                    fakeid = query.get("fakeid", [FAKEID])[0]
+                    body = json.dumps(stub.list_page(begin, count, fakeid), ensure_ascii=False).encode("utf-8")
+                    self._send(200, body, "application/json; charset=utf-8")
+                elif url.path == "/s":
+                    stub._count("article")
+                    n = int(query.get("mid", [str(FIRST_MID)])[0]) - FIRST_MID
+                    _, page = stub.article_pages[n % len(stub.article_pages)]
+                    self._send(200, page, "text/html; charset=utf-8")
+                elif url.path.startswith("/mmbiz_"):
+                    stub._count("image")
+                    self._send(200, stub.image_body, "image/jpeg")
+                else:
+                    stub._count("not_found")
+                    self._send(404, b"not found", "text/plain")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # 单独启动：python -m benchmarks.stub_wechat [端口]
+    import sys
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    with StubWeChat(port=port) as stub:
+        print(f"模拟公众平台已启动: {stub.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,208 @@
+/*
+ * 文章页搜索关键词高亮与导航面板
+ * 关键词取自页面地址的 ?highlight= 参数，没有参数时不做任何处理。
+ * 匹配片段优先使用服务端 /api/articles/<id>/matches 返回的结果（基于数据库中的正文），
+ * 请求失败时使用页面文本生成。
+ */
+(function () {
+    var script = document.currentScript;
+    var keyword = new URLSearchParams(window.location.search).get("highlight");
+    if (!keyword || !script) return;
+
+    var articleId = script.getAttribute("data-article-id");
+
+    // 样式与脚本同目录同版本
+    var link = document.createElement("link");
+    link.rel = "stylesheet";
+    link.href = script.src.replace(/\.js(\?|$)/, ".css$1");
+    document.head.appendChild(link);
+
+    function escapeRegExp(text) {
+        return text.replace(/[.*+?^${}()|[\]\\]/g, "\\$&");
+    }
+
+    // 高亮所有匹配项并收集信息
+    function highlightMatches() {
+        var matches = [];
+        var lowerKeyword = keyword.toLowerCase();
+        var regex = new RegExp("(" + escapeRegExp(keyword) + ")", "gi");
+        var walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
+        var nodes = [];
+        var node;
+        while ((node = walker.nextNode())) {
+            nodes.push(node);
+        }
+
+        nodes.forEach(function (node) {
+            var parentName = node.parentNode.nodeName;
+            if (parentName === "SCRIPT" || parentName === "STYLE") return;
+            if (node.nodeValue.toLowerCase().indexOf(lowerKeyword) === -1) return;
+
+            var text = node.nodeValue;
+            var parts = text.split(regex);
+            var fragment = document.createDocumentFragment();
+            var position = 0;
+            parts.forEach(function (part, i) {
+                if (i % 2 === 1) {
+                    var span = document.createElement("span");
+                    span.className = "search-highlight";
+                    span.textContent = part;
+                    span.setAttribute("data-match-index", matches.length);
+                    fragment.appendChild(span);
+                    matches.push({
+                        element: span,
+                        text: part,
+                        snippet: text.substring(Math.max(0, position - 30), Math.min(text.length, position + part.length + 30))
+                    });
+                } else {
+                    fragment.appendChild(document.createTextNode(part));
+                }
+                position += part.length;
+            });
+            node.parentNode.replaceChild(fragment, node);
+        });
+        return matches;
+    }
+
+    function buildPanel(matches, snippets) {
+        var panel = document.createElement("div");
+        panel.id = "searchNavPanel";
+        panel.innerHTML =
+            '<div id="searchNavHeader"><span id="searchNavTitle"></span><span id="searchNavClose">×</span></div>' +
+            '<div id="searchNavContent"></div>' +
+            '<div class="resize-handle"></div>';
+        document.body.appendChild(panel);
+        document.getElementById("searchNavTitle").textContent = "找到 " + matches.length + " 个匹配项";
+
+        // 填充搜索结果列表
+        var content = document.getElementById("searchNavContent");
+        var items = [];
+        matches.forEach(function (match, index) {
+            var item = document.createElement("div");
+            item.className = "search-result-item";
+
+            var header = document.createElement("div");
+            var badge = document.createElement("span");
+            badge.className = "search-result-index";
+            badge.textContent = index + 1;
+            var strong = document.createElement("strong");
+            strong.textContent = match.text;
+            header.appendChild(badge);
+            header.appendChild(strong);
+
+            var preview = document.createElement("div");
+            preview.className = "search-result-preview";
+            preview.textContent = (snippets && snippets[index]) || match.snippet;
+
+            item.appendChild(header);
+            item.appendChild(preview);
+            item.onclick = function () {
+                jumpToMatch(index);
+            };
+            content.appendChild(item);
+            items.push(item);
+        });
+
+        // 跳转到指定匹配项
+        function jumpToMatch(index) {
+            if (index < 0 || index >= matches.length) return;
+            matches.forEach(function (m) {
+                m.element.classList.remove("active");
+            });
+            items.forEach(function (item) {
+                item.classList.remove("active");
+            });
+            matches[index].element.classList.add("active");
+            items[index].classList.add("active");
+            matches[index].element.scrollIntoView({ behavior: "auto", block: "center" });
+        }
+
+        // 关闭按钮
+        document.getElementById("searchNavClose").onclick = function () {
+            panel.style.display = "none";
+        };
+
+        // 拖拽移动面板
+        var header = document.getElementById("searchNavHeader");
+        var isDragging = false;
+        var initialX, initialY;
+        header.addEventListener("mousedown", function (e) {
+            if (e.target.id === "searchNavClose") return;
+            isDragging = true;
+            initialX = e.clientX - panel.offsetLeft;
+            initialY = e.clientY - panel.offsetTop;
+        });
+
+        // 调整尺寸
+        var resizeHandle = panel.querySelector(".resize-handle");
+        var isResizing = false;
+        var startWidth, startHeight, startX, startY;
+        resizeHandle.addEventListener("mousedown", function (e) {
+            isResizing = true;
+            startWidth = panel.offsetWidth;
+            startHeight = panel.offsetHeight;
+            startX = e.clientX;
+            startY = e.clientY;
+            e.preventDefault();
+        });
+
+        document.addEventListener("mousemove", function (e) {
+            if (isDragging) {
+                e.preventDefault();
+                panel.style.left = e.clientX - initialX + "px";
+                panel.style.top = e.clientY - initialY + "px";
+                panel.style.right = "auto";
+            }
+            if (isResizing) {
+                var newWidth = startWidth + (e.clientX - startX);
+                var newHeight = startHeight + (e.clientY - startY);
+                if (newWidth >= 250 && newWidth <= 600) {
+                    panel.style.width = newWidth + "px";
+                }
+                if (newHeight >= 200 && newHeight <= 800) {
+                    panel.style.height = newHeight + "px";
+                    panel.style.maxHeight = newHeight + "px";
+                }
+            }
+        });
+
+        document.addEventListener("mouseup", function () {
+            isDragging = false;
+            isResizing = false;
+        });
+
+        // 自动跳转到第一个匹配项
+        jumpToMatch(0);
+    }
+
+    function fetchSnippets() {
+        if (!articleId || !window.fetch) return Promise.resolve(null);
+        var url = "/api/articles/" + encodeURIComponent(articleId) + "/matches?q=" + encodeURIComponent(keyword);
+        return fetch(url)
+            .then(function (res) {
+                return res.ok ? res.json() : null;
+            })
+            .then(function (data) {
+                return data ? data.matches.map(function (m) { return m.snippet; }) : null;
+            })
+            .catch(function () {
+                return null;
+            });
+    }
+
+    function run() {
+        var snippetsRequest = fetchSnippets();
+        var matches = highlightMatches();
+        if (matches.length === 0) return;
+        snippetsRequest.then(function (snippets) {
+            // 页面标题等正文以外的匹配会使顺序错位，数量一致时才使用服务端片段
+            buildPanel(matches, snippets && snippets.length === matches.length ? snippets : null);
+        });
+    }
+
+    if (document.readyState === "loading") {
+        document.addEventListener("DOMContentLoaded", run);
+    } else {
+        run();
+    }
+})();
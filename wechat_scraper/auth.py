@@ -1,20 +1,27 @@
 import time
 import json
 import os
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+import threading
+from .exceptions import RateLimitError
+from .logger import logger
 
 class WeChatAuth:
+    """
+    登录凭证与会话状态
+    凭证缓存在内存中，只有 cookie 文件的修改时间或大小变化时才重新读取（如其他进程重新登录）。
+    session_valid: None 未检查 / True 有效 / False 已失效；文件变化后重置为 None
+    """
     def __init__(self, cookie_file="wechat_cookies.json"):
         self.base_url = "https://mp.weixin.qq.com/"
         self.driver = None
         self.token = None
         self.cookies = None
         self.cookie_file = cookie_file
+        self.session_valid = None
+        self.checked_at = None
+        self.expired_reason = None
+        self._file_stamp = None
+        self._lock = threading.Lock()
 
     def save_cookies(self):
         """保存 cookies 到文件"""
@@ -26,27 +33,99 @@ class WeChatAuth:
             with open(self.cookie_file, "w") as f:
                 json.dump(data, f)
             print(f"Cookies已保存到 {self.cookie_file}")
+            with self._lock:
+                self._file_stamp = self._stat_cookie_file()
+
+    def _stat_cookie_file(self):
+        try:
+            stat = os.stat(self.cookie_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
     def load_cookies(self):
-        """从文件加载 cookies"""
-        if os.path.exists(self.cookie_file):
+        """从文件加载 cookies，文件未变化时直接使用内存中的凭证，返回是否有凭证"""
+        stamp = self._stat_cookie_file()
+        with self._lock:
+            if stamp == self._file_stamp:
+                return self.token is not None
+            
+            self._file_stamp = stamp
+            self.token = self.cookies = None
+            self.session_valid = self.checked_at = self.expired_reason = None
+            if stamp is None:
+                return False
             try:
                 with open(self.cookie_file, "r") as f:
                     data = json.load(f)
                 self.token = data.get("token")
                 self.cookies = data.get("cookies")
                 print("已从文件加载Cookies。")
-                return True
+                return self.token is not None
             except Exception as e:
                 print(f"加载cookies失败: {e}")
                 return False
-        return False
+
+    def is_logged_in(self):
+        """有凭证且未发现会话失效"""
+        return self.load_cookies() and self.session_valid is not False
+
+    def mark_valid(self):
+        with self._lock:
+            self.session_valid = True
+            self.checked_at = time.time()
+            self.expired_reason = None
+
+    def mark_expired(self, reason):
+        """记录会话失效，直到重新登录（cookie 文件变化）前不再使用该会话抓取列表"""
+        with self._lock:
+            was_valid = self.session_valid is not False
+            self.session_valid = False
+            self.checked_at = time.time()
+            self.expired_reason = reason
+        if was_valid:
+            logger.warning("登录会话已失效: %s", reason)
+
+    def probe(self, crawler):
+        """
+        用爬虫检查一次会话，更新并返回 session_valid
+        列表通道额度被占用或网络出错时本次不检查，状态保持不变
+        """
+        try:
+            valid = crawler.check_session()
+        except RateLimitError:
+            return self.session_valid
+        except Exception as e:
+            logger.warning("检查登录状态失败: %s", e)
+            return self.session_valid
+        if valid:
+            self.mark_valid()
+        else:
+            self.mark_expired("定时检查发现登录已失效")
+        return self.session_valid
+
+    def session_status(self):
+        """供 /api/status 使用的会话状态"""
+        logged_in = self.is_logged_in()
+        return {
+            "logged_in": logged_in,
+            "valid": self.session_valid if self.token is not None else None,
+            "checked_at": self.checked_at,
+            "expired_reason": self.expired_reason,
+        }
 
     def login(self):
         """
         Logs in to WeChat Public Platform using Selenium.
         Waits for manual QR code scan.
         """
+        # Selenium 只在扫码登录时需要，延迟导入以免拖慢启动
+        from selenium import webdriver
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
         print("正在启动浏览器进行登录...")
         options = webdriver.ChromeOptions()
         # options.add_argument('--headless') # Cannot use headless for QR code scan
@@ -75,6 +154,7 @@ class WeChatAuth:
             
             # Save cookies for future use
             self.save_cookies()
+            self.mark_valid()
             
             # Keep the browser open or close it? 
             # For now, we can close it as we have the cookies/token, 
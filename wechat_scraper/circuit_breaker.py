@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    遇到验证/访问受限页面时的熔断器（线程安全），按登录会话和域名划分
+    closed: 正常放行；window 秒内遇到 threshold 次验证或访问受限页面后转为 open
+    open: 拒绝该会话对该域名的所有请求，cooldown 秒后转为 half_open
+    half_open: 只放行一个探测请求，其他请求等待探测结果；成功则恢复 closed，
+               再次遇到验证页面则重新 open，冷却时间加倍（不超过 max_cooldown）
+    """
+
+    def __init__(self, name, threshold=3, window=120.0, cooldown=300.0, max_cooldown=3600.0, probe_timeout=120.0):
+        self.name = name
+        self.threshold = threshold
+        self.window = window
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        # 探测请求超过该时长仍未返回结果（如任务被中断）时允许重新探测
+        self.probe_timeout = probe_timeout
+        self._state = CLOSED
+        self._cooldown = cooldown
+        self._blocks = []
+        self._open_until = 0.0
+        self._probe_started = None
+        self._opened = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+        # 探测请求有结果时唤醒等待的请求
+        self._probe_done = threading.Condition(self._lock)
+
+    def allow(self, checkpoint=None):
+        """
+        是否放行一次请求；half_open 状态下第一个请求作为探测请求放行，
+        其他请求等待探测结果（恢复 closed 后放行，重新 open 时返回 False，此时 retry_after 为新的冷却时间）
+        checkpoint: 可选回调，等待探测结果时定期调用（任务被取消/暂停时抛出 TaskInterrupted）
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self._state == OPEN and now >= self._open_until:
+                    self._state = HALF_OPEN
+                    self._probe_started = None
+                if self._state == CLOSED:
+                    return True
+                if self._state == OPEN:
+                    self._rejected += 1
+                    return False
+                if self._probe_started is None or now - self._probe_started > self.probe_timeout:
+                    self._probe_started = now
+                    return True
+                self._probe_done.wait(1.0)
+            if checkpoint:
+                checkpoint()
+
+    def record_success(self):
+        """页面正常返回"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._cooldown = self.base_cooldown
+                self._blocks = []
+                self._probe_started = None
+                self._probe_done.notify_all()
+
+    def record_failure(self):
+        """请求失败但不是验证页面（网络错误等），不改变状态，只释放探测名额"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                # 等待中的请求之一成为新的探测请求
+                self._probe_started = None
+                self._probe_done.notify_all()
+
+    def record_block(self):
+        """遇到验证或访问受限页面，返回记录后是否处于 open 状态"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+                self._open(now)
+                return True
+            self._blocks = [t for t in self._blocks if now - t < self.window] + [now]
+            if self._state == CLOSED and len(self._blocks) >= self.threshold:
+                self._open(now)
+            return self._state == OPEN
+
+    def _open(self, now):
+        self._state = OPEN
+        self._open_until = now + self._cooldown
+        self._probe_started = None
+        self._blocks = []
+        self._opened += 1
+        self._probe_done.notify_all()
+
+    def retry_after(self):
+        """距离允许探测的剩余秒数（closed/half_open 时为 0）"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._open_until - time.monotonic())
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._open_until:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self):
+        """当前状态（供运维查看）"""
+        state = self.state
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": state,
+                "recent_blocks": len(self._blocks),
+                "retry_after": round(max(0.0, self._open_until - time.monotonic()), 1) if state == OPEN else 0.0,
+                "cooldown": self._cooldown,
+                "opened": self._opened,
+                "rejected": self._rejected,
+            }
+
+
+# 阈值与冷却时间可通过环境变量调整
+_breaker_config = {
+    'threshold': int(os.environ.get('SCRAPER_BREAKER_THRESHOLD', 3)),
+    'window': float(os.environ.get('SCRAPER_BREAKER_WINDOW', 120)),
+    'cooldown': float(os.environ.get('SCRAPER_BREAKER_COOLDOWN', 300)),
+    'max_cooldown': float(os.environ.get('SCRAPER_BREAKER_MAX_COOLDOWN', 3600)),
+}
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def session_key(cookies):
+    """登录会话的标识（cookies 摘要），未登录时为 anonymous"""
+    if not cookies:
+        return 'anonymous'
+    digest = hashlib.sha1(json.dumps(cookies, sort_keys=True).encode('utf-8')).hexdigest()
+    return digest[:8]
+
+
+def get_breaker(session, host):
+    """获取某会话访问某域名的熔断器（不存在时创建）"""
+    name = f"{session}@{host}"
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **_breaker_config)
+        return breaker
+
+
+def get_all_breakers():
+    with _breakers_lock:
+        return list(_breakers.values())
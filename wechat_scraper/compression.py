@@ -0,0 +1,146 @@
+import gzip
+import os
+import sys
+
+# Content-Encoding -> 文件后缀，按服务端优先级排列
+SUFFIXES = {
+    "br": ".br",
+    "zstd": ".zst",
+    "gzip": ".gz",
+}
+
+
+def _compress(encoding, data):
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=9)
+    if encoding == "br":
+        import brotli
+        return brotli.compress(data, quality=11)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=19).compress(data)
+    raise ValueError(f"不支持的压缩格式: {encoding}")
+
+
+def _decompress(encoding, data):
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        import brotli
+        return brotli.decompress(data)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"不支持的压缩格式: {encoding}")
+
+
+def is_available(encoding):
+    """压缩格式依赖的库是否已安装（gzip 为标准库）"""
+    try:
+        _compress(encoding, b"")
+        return True
+    except ImportError:
+        return False
+
+
+def configured_encodings():
+    """
+    读取环境变量 SCRAPER_COMPRESS（如 "gzip,br"）中配置的压缩格式，
+    未知格式和缺少依赖的格式会被忽略
+    """
+    value = os.environ.get("SCRAPER_COMPRESS", "")
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    return [name for name in names if name in SUFFIXES and is_available(name)]
+
+
+def compressed_only():
+    """SCRAPER_COMPRESS_ONLY=1 时只保留压缩文件，不保留原始 HTML"""
+    return os.environ.get("SCRAPER_COMPRESS_ONLY") == "1"
+
+
+def write_compressed(path, data, encodings, keep_original=True):
+    """
+    为 path 写入预压缩的同名文件（path.gz / path.br / path.zst）
+    keep_original 为 False 时删除原文件，至少成功写入一种压缩文件才会删除
+    返回成功写入的压缩格式列表
+    """
+    written = []
+    for encoding in encodings:
+        target = path + SUFFIXES[encoding]
+        tmp_path = target + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_compress(encoding, data))
+        os.replace(tmp_path, target)
+        written.append(encoding)
+    if written and not keep_original and os.path.exists(path):
+        os.remove(path)
+    return written
+
+
+def available_siblings(path):
+    """返回 path 已存在的预压缩文件 {encoding: 文件路径}（path 来自请求时须先用 safe_join 限定在输出目录内）"""
+    return {encoding: path + suffix for encoding, suffix in SUFFIXES.items() if os.path.isfile(path + suffix)}
+
+
+def negotiate(accept_encoding, encodings):
+    """
+    根据 Accept-Encoding 从可用格式中选择一种，客户端不接受时返回 None
+    q 值相同时按 SUFFIXES 的顺序优先
+    """
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+
+    best = None
+    best_q = 0.0
+    for encoding in SUFFIXES:
+        if encoding not in encodings:
+            continue
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def read_decompressed(path, encoding):
+    """读取预压缩文件并解压（只存储压缩文件时，供不支持该编码的客户端使用）"""
+    with open(path, "rb") as f:
+        return _decompress(encoding, f.read())
+
+
+def compress_directory(root, encodings, keep_original=True):
+    """为目录下已有的 HTML 文章补充预压缩文件，返回处理的文件数"""
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if not filename.endswith(".html"):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                data = f.read()
+            write_compressed(path, data, encodings, keep_original)
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    # 用法: python -m wechat_scraper.compression [目录] [格式,格式] [--only]
+    root = sys.argv[1] if len(sys.argv) > 1 else "output"
+    names = sys.argv[2].split(",") if len(sys.argv) > 2 else ["gzip"]
+    names = [name for name in names if name in SUFFIXES and is_available(name)]
+    if not names:
+        sys.exit("没有可用的压缩格式（br 需要 brotli，zstd 需要 zstandard）")
+    total = compress_directory(root, names, keep_original="--only" not in sys.argv)
+    print(f"已压缩 {total} 个文件: {', '.join(names)}")
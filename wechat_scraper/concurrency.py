@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from .egress import get_pool
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD 自适应并发控制
+    请求成功且延迟低于目标时缓慢增加并发（每轮约 +1），出错或延迟过高时减半，
+    遇到验证/访问受限页面时直接降到最小并发。所有任务共享同一个控制器。
+    """
+
+    def __init__(self, name, initial=2, min_limit=1, max_limit=8, target_latency=10.0,
+                 decrease_factor=0.5, cooldown=5.0):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        # 两次减小并发之间的最短间隔，避免同一批失败把并发连续砍到底
+        self.cooldown = cooldown
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._latency = None
+        self._successes = 0
+        self._errors = 0
+        self._throttled = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self):
+        """占用一个并发额度，超出当前并发上限时等待"""
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def record_success(self, latency):
+        """记录一次成功请求及其耗时（秒）"""
+        with self._cond:
+            self._successes += 1
+            self._latency = latency if self._latency is None else self._latency * 0.8 + latency * 0.2
+            if latency > self.target_latency:
+                self._decrease()
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def record_error(self):
+        """记录一次失败请求（网络错误、HTTP 错误等）"""
+        with self._cond:
+            self._errors += 1
+            self._decrease()
+
+    def record_throttled(self):
+        """记录遇到验证页面或访问受限，立即降到最小并发"""
+        with self._cond:
+            self._throttled += 1
+            self._limit = float(self.min_limit)
+            self._last_decrease = time.monotonic()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self._last_decrease = now
+
+    def snapshot(self):
+        """当前状态（供运维查看）"""
+        with self._cond:
+            return {
+                "name": self.name,
+                "limit": int(self._limit),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self._in_flight,
+                "target_latency": self.target_latency,
+                "latency_ewma": round(self._latency, 3) if self._latency is not None else None,
+                "successes": self._successes,
+                "errors": self._errors,
+                "throttled": self._throttled,
+            }
+
+
+def _create_controllers():
+    """上限可通过环境变量调整；配置了出口池时默认上限随出口总并发数提高"""
+    pool = get_pool()
+    egress_capacity = pool.capacity if pool else 0
+    return {
+        'article': AdaptiveConcurrency(
+            'article', initial=2, min_limit=1,
+            max_limit=int(os.environ.get('SCRAPER_ARTICLE_CONCURRENCY_MAX', max(6, egress_capacity // 2))),
+            target_latency=8.0,
+        ),
+        'image': AdaptiveConcurrency(
+            'image', initial=4, min_limit=1,
+            max_limit=int(os.environ.get('SCRAPER_IMAGE_CONCURRENCY_MAX', max(16, egress_capacity))),
+            target_latency=5.0,
+        ),
+    }
+
+
+_controllers = None
+_controllers_lock = threading.Lock()
+
+
+def _get_controllers():
+    """全局并发控制器（首次使用时按环境变量和出口池创建，导入本模块不读取代理配置）"""
+    global _controllers
+    if _controllers is None:
+        with _controllers_lock:
+            if _controllers is None:
+                _controllers = _create_controllers()
+    return _controllers
+
+
+def get_controller(name):
+    """获取指定类型请求的全局并发控制器"""
+    return _get_controllers()[name]
+
+
+def get_all_controllers():
+    return list(_get_controllers().values())
@@ -1,8 +1,12 @@
 import requests
-import time
 import random
 from .logger import logger
-from .exceptions import RateLimitError, AccountNotFoundError, NetworkError
+from .exceptions import RateLimitError, AccountNotFoundError, NetworkError, SessionExpiredError
+from .rate_limiter import get_limiter
+from .metrics import LIST_REQUEST_SECONDS, SEARCHBIZ_REQUEST_SECONDS, RATE_LIMIT_HITS
+
+# base_resp.ret 为这些值时表示登录会话失效（invalid session / invalid csrf token）
+INVALID_SESSION_CODES = (200003, 200040)
 
 class WeChatCrawler:
     def __init__(self, token, cookies):
@@ -14,7 +18,13 @@ class WeChatCrawler:
             "Host": "mp.weixin.qq.com",
         }
         self.base_url = "https://mp.weixin.qq.com"
-        logger.info(f"初始化爬虫，Token: {token[:10]}...")
+        # 列表和搜索接口共享全局请求额度，多个公众号并发抓取时总速率不变
+        self.limiter = get_limiter('list')
+        # 额度被占用超过该时长（秒）时直接按频率限制处理
+        self.max_wait = 300
+        # 触发频率限制后暂停所有列表请求的时长（秒）
+        self.rate_limit_cooldown = 30 * 60
+        logger.info("初始化爬虫，Token: %s...", token[:10])
 
     def _randomize_user_agent(self):
         """随机化User-Agent，增强反爬能力"""
@@ -26,11 +36,43 @@ class WeChatCrawler:
         ]
         self.headers["User-Agent"] = random.choice(user_agents)
 
+    def _check_session(self, data):
+        """接口返回会话失效状态码时抛出 SessionExpiredError"""
+        ret_code = data.get("base_resp", {}).get("ret")
+        if ret_code in INVALID_SESSION_CODES:
+            logger.warning("登录会话已失效: %s", data["base_resp"])
+            raise SessionExpiredError(f"登录已失效 (ret={ret_code})，请重新登录")
+
+    def check_session(self):
+        """
+        检查登录会话是否有效，返回 True/False
+        请求后台首页（不计入搜索/列表接口的频率限制），但仍占用一次列表通道额度；
+        额度正被抓取任务使用时不等待，直接抛出 RateLimitError（任务自身的请求同样会发现会话失效）
+        """
+        self.limiter.acquire(max_wait=0)
+        response = requests.get(
+            f"{self.base_url}/cgi-bin/home",
+            params={"t": "home/index", "token": self.token, "lang": "zh_CN", "f": "json", "ajax": "1"},
+            cookies=self.cookies, headers=self.headers, timeout=10,
+        )
+        response.raise_for_status()
+        try:
+            data = response.json()
+        except ValueError:
+            # 未返回 JSON 时以是否被重定向出后台页面判断
+            return "cgi-bin/home" in response.url
+        try:
+            self._check_session(data)
+        except SessionExpiredError:
+            return False
+        return True
+
     def search_account(self, query):
         """
         搜索公众号，返回 (fakeid, nickname, alias) 或抛出异常
         """
-        logger.info(f"搜索公众号: {query}")
+        logger.info("搜索公众号: %s", query)
+        self.limiter.acquire(max_wait=self.max_wait)
         self._randomize_user_agent()
         
         search_url = f"{self.base_url}/cgi-bin/searchbiz"
@@ -47,37 +89,43 @@ class WeChatCrawler:
         }
 
         try:
-            response = requests.get(search_url, cookies=self.cookies, headers=self.headers, params=params, timeout=10)
+            with SEARCHBIZ_REQUEST_SECONDS.time():
+                response = requests.get(search_url, cookies=self.cookies, headers=self.headers, params=params, timeout=10)
             response.raise_for_status()
             data = response.json()
             
+            self._check_session(data)
+            
             # 检查频率限制
             if "base_resp" in data and data["base_resp"].get("ret") == 200013:
-                logger.error(f"触发频率限制: {data}")
+                logger.error("触发频率限制: %s", data)
+                RATE_LIMIT_HITS.inc(stage='search')
+                self.limiter.block(self.rate_limit_cooldown)
                 raise RateLimitError("搜索时触发频率限制，请稍后再试")
             
             if "list" in data and len(data["list"]) > 0:
                 account = data["list"][0]
-                logger.info(f"找到公众号: {account['nickname']} ({account['alias']})")
+                logger.info("找到公众号: %s (%s)", account['nickname'], account['alias'])
                 return account["fakeid"], account["nickname"], account.get("alias", "")
             else:
-                logger.warning(f"未找到公众号: {query}")
+                logger.warning("未找到公众号: %s", query)
                 raise AccountNotFoundError(f"未找到公众号: {query}")
                 
         except requests.RequestException as e:
-            logger.error(f"搜索公众号时网络错误: {e}", exc_info=True)
+            logger.error("搜索公众号时网络错误: %s", e, exc_info=True)
             raise NetworkError(f"网络请求失败: {e}")
-        except RateLimitError:
+        except (RateLimitError, SessionExpiredError):
             raise
         except Exception as e:
-            logger.error(f"搜索公众号时发生未知错误: {e}", exc_info=True)
+            logger.error("搜索公众号时发生未知错误: %s", e, exc_info=True)
             raise
 
     def get_articles(self, fakeid, begin=0, count=5):
         """
         获取文章列表，返回 (articles, total_count) 或抛出异常
         """
-        logger.debug(f"获取文章列表: fakeid={fakeid}, begin={begin}, count={count}")
+        logger.debug("获取文章列表: fakeid=%s, begin=%s, count=%s", fakeid, begin, count)
+        self.limiter.acquire(max_wait=self.max_wait)
         self._randomize_user_agent()
         
         appmsg_url = f"{self.base_url}/cgi-bin/appmsg"
@@ -95,76 +143,91 @@ class WeChatCrawler:
         }
 
         try:
-            response = requests.get(appmsg_url, cookies=self.cookies, headers=self.headers, params=params, timeout=15)
+            with LIST_REQUEST_SECONDS.time():
+                response = requests.get(appmsg_url, cookies=self.cookies, headers=self.headers, params=params, timeout=15)
             response.raise_for_status()
             data = response.json()
+            self._check_session(data)
             
             # 检查频率限制
             if "base_resp" in data:
                 ret_code = data["base_resp"].get("ret")
                 if ret_code == 200013:
-                    logger.error(f"触发频率限制: {data}")
+                    logger.error("触发频率限制: %s", data)
+                    RATE_LIMIT_HITS.inc(stage='list')
+                    self.limiter.block(self.rate_limit_cooldown)
                     raise RateLimitError("获取文章列表时触发频率限制")
                 elif ret_code != 0:
-                    logger.warning(f"API返回非0状态码: {ret_code}, {data}")
+                    logger.warning("API返回非0状态码: %s, %s", ret_code, data)
             
             if "app_msg_list" in data:
                 articles = data["app_msg_list"]
                 total_cnt = data.get("app_msg_cnt", 0)
-                logger.info(f"成功获取 {len(articles)} 篇文章，总数: {total_cnt}")
+                logger.info("成功获取 %s 篇文章，总数: %s", len(articles), total_cnt)
                 return articles, total_cnt
             else:
-                logger.warning(f"响应中没有文章列表: {data}")
+                logger.warning("响应中没有文章列表: %s", data)
                 return [], 0
                 
         except requests.RequestException as e:
-            logger.error(f"获取文章列表时网络错误: {e}", exc_info=True)
+            logger.error("获取文章列表时网络错误: %s", e, exc_info=True)
             raise NetworkError(f"网络请求失败: {e}")
-        except RateLimitError:
+        except (RateLimitError, SessionExpiredError):
             raise
         except Exception as e:
-            logger.error(f"获取文章列表时发生未知错误: {e}", exc_info=True)
+            logger.error("获取文章列表时发生未知错误: %s", e, exc_info=True)
             raise
 
-    def fetch_all_articles(self, fakeid, max_pages=10):
+    def iter_article_pages(self, fakeid, max_pages=10):
         """
-        分页获取所有文章
+        逐页获取文章列表，每页产出 (page, articles, total_cnt)，page 从 1 开始
+        触发频率限制时，已产出的页保持有效，随后抛出 RateLimitError
         """
-        logger.info(f"开始分页获取文章，最多 {max_pages} 页")
-        all_articles = []
+        logger.info("开始分页获取文章，最多 %s 页", max_pages)
+        listed = 0
         count = 5
         begin = 0
         
         for page in range(max_pages):
-            logger.info(f"正在抓取第 {page + 1}/{max_pages} 页...")
+            logger.info("正在抓取第 %s/%s 页...", page + 1, max_pages)
             
             try:
                 articles, total_cnt = self.get_articles(fakeid, begin, count)
-                
-                if not articles:
-                    logger.info("没有更多文章，停止抓取")
-                    break
-                    
-                all_articles.extend(articles)
-                logger.debug(f"当前已获取 {len(all_articles)}/{total_cnt} 篇文章")
-                
-                if len(all_articles) >= total_cnt:
-                    logger.info("已获取所有文章")
-                    break
-                    
-                begin += count
-                
-                # 随机延迟，避免触发频率限制
-                delay = random.uniform(2, 5)
-                logger.debug(f"等待 {delay:.1f} 秒后继续...")
-                time.sleep(delay)
-                
             except RateLimitError:
-                logger.warning(f"在第 {page + 1} 页触发频率限制，停止抓取，返回已获取的 {len(all_articles)} 篇文章")
-                return all_articles, True
+                logger.warning("在第 %s 页触发频率限制，停止抓取，已获取 %s 篇文章", page + 1, listed)
+                raise
+            except SessionExpiredError:
+                logger.warning("在第 %s 页发现登录已失效，停止抓取，已获取 %s 篇文章", page + 1, listed)
+                raise
             except Exception as e:
-                logger.error(f"抓取第 {page + 1} 页时出错: {e}")
+                logger.error("抓取第 %s 页时出错: %s", page + 1, e)
+                break
+            
+            if not articles:
+                logger.info("没有更多文章，停止抓取")
                 break
+            
+            listed += len(articles)
+            logger.debug("当前已获取 %s/%s 篇文章", listed, total_cnt)
+            yield page + 1, articles, total_cnt
+            
+            if listed >= total_cnt:
+                logger.info("已获取所有文章")
+                break
+            
+            begin += count
         
-        logger.info(f"抓取完成，共获取 {len(all_articles)} 篇文章")
+        logger.info("抓取完成，共获取 %s 篇文章", listed)
+
+    def fetch_all_articles(self, fakeid, max_pages=10):
+        """
+        分页获取所有文章，返回 (articles, is_rate_limited)
+        抓取任务使用 iter_article_pages 逐页入库，这里供只需要完整列表的场景（如基准测试）
+        """
+        all_articles = []
+        try:
+            for _, articles, _ in self.iter_article_pages(fakeid, max_pages):
+                all_articles.extend(articles)
+        except RateLimitError:
+            return all_articles, True
         return all_articles, False
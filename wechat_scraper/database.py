@@ -1,20 +1,34 @@
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime
 import os
+from .utils import canonical_article_key
+from .metrics import SQLITE_WRITE_SECONDS
 
 class Database:
+    # 本进程中已完成建表/迁移的数据库文件，每个文件只初始化一次
+    _initialized_paths = set()
+    _init_lock = threading.Lock()
+    
     def __init__(self, db_path="data/wechat_scraper.db"):
+        """创建实例不访问数据库，首次获取连接时才建表和迁移"""
         self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.init_database()
     
     def get_connection(self):
+        path = os.path.abspath(self.db_path)
+        if path not in Database._initialized_paths:
+            with Database._init_lock:
+                if path not in Database._initialized_paths:
+                    self.init_database()
+                    Database._initialized_paths.add(path)
         return sqlite3.connect(self.db_path)
     
     def init_database(self):
         """初始化数据库表"""
-        conn = self.get_connection()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         # 公众号表
@@ -52,6 +66,12 @@ class Database:
                 is_favorite BOOLEAN DEFAULT 0,
                 is_read BOOLEAN DEFAULT 0,
                 tags TEXT,
+                digest TEXT,
+                aid TEXT,
+                itemidx INTEGER,
+                update_time INTEGER,
+                article_key TEXT,
+                updated_at REAL,
                 FOREIGN KEY (account_id) REFERENCES accounts (id)
             )
         ''')
@@ -69,7 +89,13 @@ class Database:
                 failed_count INTEGER DEFAULT 0,
                 create_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 end_time TIMESTAMP,
-                error_message TEXT
+                error_message TEXT,
+                priority INTEGER DEFAULT 0,
+                params TEXT,
+                started_at TIMESTAMP,
+                profile_path TEXT,
+                claimed_by TEXT,
+                heartbeat_at REAL
             )
         ''')
         
@@ -83,6 +109,105 @@ class Database:
             )
         ''')
         
+        # 标签表（规范化存储，替代 articles.tags 逗号字符串）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tags (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_tags (
+                article_id INTEGER NOT NULL,
+                tag_id INTEGER NOT NULL,
+                PRIMARY KEY (article_id, tag_id),
+                FOREIGN KEY (article_id) REFERENCES articles (id),
+                FOREIGN KEY (tag_id) REFERENCES tags (id)
+            )
+        ''')
+        
+        # 导出记录表（用于"仅导出上次导出后新增的文章"）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS exports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                format TEXT,
+                filters TEXT,
+                max_article_id INTEGER,
+                row_count INTEGER DEFAULT 0,
+                filter_key TEXT,
+                watermark REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # 变更计数器（由触发器维护，供 API 生成 ETag）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_counters (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # 单篇文章下载耗时与流量记录（每次下载一条，供慢文章/慢公众号报表使用）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article_id INTEGER NOT NULL,
+                account_id INTEGER,
+                success BOOLEAN,
+                extraction TEXT,
+                retries INTEGER DEFAULT 0,
+                total_seconds REAL,
+                fetch_seconds REAL DEFAULT 0,
+                render_seconds REAL DEFAULT 0,
+                parse_seconds REAL DEFAULT 0,
+                images_seconds REAL DEFAULT 0,
+                write_seconds REAL DEFAULT 0,
+                html_bytes INTEGER DEFAULT 0,
+                image_bytes INTEGER DEFAULT 0,
+                image_count INTEGER DEFAULT 0,
+                images_failed INTEGER DEFAULT 0,
+                error_message TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (article_id) REFERENCES articles (id),
+                FOREIGN KEY (account_id) REFERENCES accounts (id)
+            )
+        ''')
+        
+        # 旧数据库补齐新增字段
+        self._ensure_columns(cursor, 'articles', [
+            ('digest', 'TEXT'),
+            ('aid', 'TEXT'),
+            ('itemidx', 'INTEGER'),
+            ('update_time', 'INTEGER'),
+            ('article_key', 'TEXT'),
+            ('updated_at', 'REAL'),
+        ])
+        self._ensure_columns(cursor, 'tasks', [
+            ('priority', 'INTEGER DEFAULT 0'),
+            ('params', 'TEXT'),
+            ('started_at', 'TIMESTAMP'),
+            ('profile_path', 'TEXT'),
+            ('claimed_by', 'TEXT'),
+            ('heartbeat_at', 'REAL'),
+        ])
+        self._ensure_columns(cursor, 'exports', [
+            ('filter_key', 'TEXT'),
+            ('watermark', 'REAL'),
+        ])
+        
+        # 旧记录的修改时间取入库时间（增量导出以修改时间为基线）
+        cursor.execute('''
+            UPDATE articles SET updated_at = COALESCE(CAST(strftime('%s', create_time) AS REAL), 0)
+            WHERE updated_at IS NULL
+        ''')
+        
+        # 一次性迁移：为旧记录生成规范化标识并合并重复文章
+        self._migrate_article_keys(cursor)
+        
+        # 一次性迁移：把 articles.tags 中的逗号字符串拆分到标签表
+        self._migrate_tags(cursor)
+        
         # 创建索引以提升查询性能
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_title ON articles(title)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_content ON articles(content)')
@@ -91,13 +216,182 @@ class Database:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_downloaded ON articles(downloaded)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_is_favorite ON articles(is_favorite)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_is_read ON articles(is_read)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_updated_at ON articles(updated_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_exports_filter_key ON exports(filter_key, id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_accounts_name ON accounts(name)')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_article_key ON articles(article_key)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_article_tags_tag_id ON article_tags(tag_id, article_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks(status, priority, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_article_profiles_created ON article_profiles(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_article_profiles_account ON article_profiles(account_id)')
+        
+        self._create_change_triggers(cursor)
+        self._create_updated_at_triggers(cursor)
         
         conn.commit()
         conn.close()
     
+    def _create_change_triggers(self, cursor):
+        """
+        表数据变化时递增 change_counters 中对应的版本号
+        文章变化同时递增所属公众号的计数器 (account:<id>)
+        """
+        bump = (
+            "INSERT INTO change_counters (name, version) VALUES ({name}, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1;"
+        )
+        for table in ('accounts', 'articles', 'tags', 'article_tags', 'rate_limits'):
+            for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+                statements = [bump.format(name=f"'{table}'")]
+                if table == 'articles':
+                    statements.append(bump.format(name=f"'account:' || {row}.account_id"))
+                    if event == 'UPDATE':
+                        # 文章被移到其他公众号时两边都要失效
+                        statements.append(bump.format(name="'account:' || OLD.account_id"))
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                    AFTER {event} ON {table}
+                    BEGIN
+                        {' '.join(statements)}
+                    END
+                ''')
+    
+    def _create_updated_at_triggers(self, cursor):
+        """
+        新增文章或导出的字段（标题、状态、正文、本地路径等）变化时更新 articles.updated_at（Unix 时间，精确到毫秒）
+        收藏、已读等不影响导出内容的修改不更新
+        """
+        now = "(julianday('now') - 2440587.5) * 86400.0"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_articles_insert_updated_at
+            AFTER INSERT ON articles
+            WHEN NEW.updated_at IS NULL
+            BEGIN
+                UPDATE articles SET updated_at = {now} WHERE id = NEW.id;
+            END
+        ''')
+        changed = ' OR '.join(
+            f"NEW.{column} IS NOT OLD.{column}"
+            for column in ('account_id', 'title', 'link', 'publish_date', 'status', 'local_path', 'content')
+        )
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_articles_touch_updated_at
+            AFTER UPDATE ON articles
+            WHEN NEW.updated_at IS OLD.updated_at AND ({changed})
+            BEGIN
+                UPDATE articles SET updated_at = {now} WHERE id = NEW.id;
+            END
+        ''')
+    
+    def get_change_versions(self, names):
+        """批量获取变更计数器，按 names 顺序返回版本号列表（未出现过的为 0）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(names))
+        cursor.execute(f"SELECT name, version FROM change_counters WHERE name IN ({placeholders})", list(names))
+        versions = dict(cursor.fetchall())
+        conn.close()
+        return [versions.get(name, 0) for name in names]
+    
+    def _ensure_columns(self, cursor, table, columns):
+        """为已存在的表补充缺失字段（简单迁移）"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, column_type in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+    
+    def _migrate_article_keys(self, cursor):
+        """
+        为缺少 article_key 的文章补齐标识，并合并同一文章的重复记录
+        旧版本对没有 __biz/mid 和短链ID的链接只取域名+路径，这类标识（不含 ':' 和 '?'）按完整地址重新生成
+        """
+        cursor.execute("""
+            SELECT id, link, article_key FROM articles
+            WHERE article_key IS NULL OR (article_key NOT LIKE '%:%' AND article_key NOT LIKE '%?%')
+        """)
+        rows = []
+        for article_id, link, old_key in cursor.fetchall():
+            key = canonical_article_key(link)
+            if key != old_key:
+                rows.append((key, article_id))
+        if not rows:
+            return
+
+        # 更新期间重复记录暂时共用同一标识，合并完成后由 init_database 重建唯一索引
+        cursor.execute("DROP INDEX IF EXISTS idx_articles_article_key")
+        cursor.executemany("UPDATE articles SET article_key = ? WHERE id = ?", rows)
+        
+        cursor.execute('''
+            SELECT article_key FROM articles
+            WHERE article_key IS NOT NULL
+            GROUP BY article_key HAVING COUNT(*) > 1
+        ''')
+        duplicate_keys = [r[0] for r in cursor.fetchall()]
+        for key in duplicate_keys:
+            # 保留已下载的记录，其次保留最早的记录
+            cursor.execute('''
+                SELECT id, content, local_path, image_count, is_favorite, is_read, tags, cover_url, digest
+                FROM articles WHERE article_key = ?
+                ORDER BY downloaded DESC, id ASC
+            ''', (key,))
+            group = cursor.fetchall()
+            keep_id = group[0][0]
+            duplicates = group[1:]
+            
+            tags = []
+            for row in group:
+                for tag in (row[6] or '').split(','):
+                    if tag and tag not in tags:
+                        tags.append(tag)
+            
+            cursor.execute('''
+                UPDATE articles SET
+                    content = COALESCE(content, ?),
+                    local_path = COALESCE(local_path, ?),
+                    cover_url = COALESCE(cover_url, ?),
+                    digest = COALESCE(digest, ?),
+                    is_favorite = ?,
+                    is_read = ?,
+                    tags = ?
+                WHERE id = ?
+            ''', (
+                next((r[1] for r in duplicates if r[1]), None),
+                next((r[2] for r in duplicates if r[2]), None),
+                next((r[7] for r in duplicates if r[7]), None),
+                next((r[8] for r in duplicates if r[8]), None),
+                1 if any(r[4] for r in group) else 0,
+                1 if any(r[5] for r in group) else 0,
+                ','.join(tags) if tags else None,
+                keep_id,
+            ))
+            duplicate_ids = [(r[0],) for r in duplicates]
+            cursor.executemany(
+                "INSERT OR IGNORE INTO article_tags (article_id, tag_id) SELECT ?, tag_id FROM article_tags WHERE article_id = ?",
+                [(keep_id, r[0]) for r in duplicates]
+            )
+            cursor.executemany("DELETE FROM article_tags WHERE article_id = ?", duplicate_ids)
+            # 下载耗时记录归到保留的文章
+            cursor.executemany(
+                "UPDATE article_profiles SET article_id = ? WHERE article_id = ?",
+                [(keep_id, r[0]) for r in duplicates]
+            )
+            cursor.executemany("DELETE FROM articles WHERE id = ?", duplicate_ids)
+    
+    def _migrate_tags(self, cursor):
+        """把旧的 articles.tags 字符串迁移到 tags/article_tags，迁移后清空原字段"""
+        cursor.execute("SELECT id, tags FROM articles WHERE tags IS NOT NULL AND tags != ''")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        for article_id, tags_str in rows:
+            self._set_article_tags(cursor, article_id, tags_str.split(','))
+        cursor.executemany("UPDATE articles SET tags = NULL WHERE id = ?", [(r[0],) for r in rows])
+    
     # ========== 公众号相关 ==========
     
+    @SQLITE_WRITE_SECONDS.time(op='add_account')
     def add_account(self, name, fakeid=None, nickname=None, alias=None):
         """添加或更新公众号"""
         conn = self.get_connection()
@@ -144,6 +438,24 @@ class Database:
         conn.close()
         return results
     
+    def get_accounts_schedule_info(self, names):
+        """批量获取公众号的调度信息，返回 {name: (last_scraped_at, 已列出但未下载的文章数)}"""
+        if not names:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(names))
+        cursor.execute(f'''
+            SELECT acc.name, acc.last_scraped_at,
+                   (SELECT COUNT(*) FROM articles a WHERE a.account_id = acc.id AND a.downloaded = 0)
+            FROM accounts acc
+            WHERE acc.name IN ({placeholders})
+        ''', list(names))
+        results = {r[0]: (r[1], r[2]) for r in cursor.fetchall()}
+        conn.close()
+        return results
+    
+    @SQLITE_WRITE_SECONDS.time(op='update_account_stats')
     def update_account_stats(self, account_id, total_articles):
         """更新公众号统计信息"""
         conn = self.get_connection()
@@ -158,19 +470,21 @@ class Database:
     
     # ========== 文章相关 ==========
     
+    @SQLITE_WRITE_SECONDS.time(op='add_article')
     def add_article(self, account_id, title, link, publish_date, content=None):
-        """添加文章，如果存在则返回ID"""
+        """添加文章，如果存在（按规范化标识判断）则返回ID"""
+        article_key = canonical_article_key(link)
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
             cursor.execute(
-                "INSERT INTO articles (account_id, title, link, publish_date, content) VALUES (?, ?, ?, ?, ?)",
-                (account_id, title, link, publish_date, content)
+                "INSERT INTO articles (account_id, title, link, publish_date, content, article_key) VALUES (?, ?, ?, ?, ?, ?)",
+                (account_id, title, link, publish_date, content, article_key)
             )
             conn.commit()
             return cursor.lastrowid
         except sqlite3.IntegrityError:
-            cursor.execute("SELECT id FROM articles WHERE link = ?", (link,))
+            cursor.execute("SELECT id FROM articles WHERE article_key = ? OR link = ?", (article_key, link))
             result = cursor.fetchone()
             if result:
                 # 如果提供了content，更新它
@@ -179,7 +493,85 @@ class Database:
                     conn.commit()
                 return result[0]
             return None
+        finally:
+            conn.close()
 
+    @SQLITE_WRITE_SECONDS.time(op='prepare_article_download')
+    def prepare_article_download(self, account_id, title, link, publish_date):
+        """
+        开始下载前获取文章记录，返回 (article_id, 是否已下载)
+        列表入库时已有的记录按规范化标识查到后只把未下载的文章状态重置为 pending，没有记录时才插入
+        """
+        article_key = canonical_article_key(link)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, downloaded FROM articles WHERE article_key = ?", (article_key,))
+            row = cursor.fetchone()
+            if row:
+                if not row[1]:
+                    cursor.execute("UPDATE articles SET status = 'pending' WHERE id = ? AND status != 'pending'", (row[0],))
+                    conn.commit()
+                return row[0], bool(row[1])
+            cursor.execute(
+                "INSERT INTO articles (account_id, title, link, publish_date, article_key) VALUES (?, ?, ?, ?, ?)",
+                (account_id, title, link, publish_date, article_key)
+            )
+            conn.commit()
+            return cursor.lastrowid, False
+        finally:
+            conn.close()
+
+    @SQLITE_WRITE_SECONDS.time(op='upsert_listing_articles')
+    def upsert_listing_articles(self, account_id, articles):
+        """
+        批量写入文章列表接口 (app_msg_list) 返回的元数据，单个事务内完成。
+        已存在的文章只更新元数据，不影响下载状态。返回写入条数。
+        """
+        rows = []
+        for article in articles:
+            link = article.get('link')
+            if not link:
+                continue
+            update_time = article.get('update_time') or article.get('create_time')
+            publish_date = datetime.fromtimestamp(update_time).strftime('%Y-%m-%d') if update_time else None
+            rows.append((
+                account_id,
+                article.get('title') or 'Untitled',
+                link,
+                article.get('cover') or None,
+                article.get('digest') or None,
+                str(article['aid']) if article.get('aid') else None,
+                article.get('itemidx'),
+                update_time,
+                publish_date,
+                canonical_article_key(link),
+            ))
+        
+        if not rows:
+            return 0
+        
+        conn = self.get_connection()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO articles (account_id, title, link, cover_url, digest, aid, itemidx, update_time, publish_date, article_key)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(article_key) DO UPDATE SET
+                        account_id = COALESCE(excluded.account_id, account_id),
+                        title = excluded.title,
+                        cover_url = COALESCE(excluded.cover_url, cover_url),
+                        digest = COALESCE(excluded.digest, digest),
+                        aid = COALESCE(excluded.aid, aid),
+                        itemidx = COALESCE(excluded.itemidx, itemidx),
+                        update_time = COALESCE(excluded.update_time, update_time),
+                        publish_date = COALESCE(excluded.publish_date, publish_date)
+                ''', rows)
+        finally:
+            conn.close()
+        return len(rows)
+
+    @SQLITE_WRITE_SECONDS.time(op='update_article_content')
     def update_article_content(self, article_id, content):
         """更新文章内容"""
         conn = self.get_connection()
@@ -194,7 +586,7 @@ class Database:
         cursor = conn.cursor()
         search_query = f"%{query}%"
         cursor.execute('''
-            SELECT a.id, a.title, a.link, a.publish_date, a.downloaded, a.local_path, acc.name 
+            SELECT a.id, a.title, a.link, a.publish_date, a.downloaded, a.local_path, acc.name, a.is_favorite, a.is_read
             FROM articles a 
             JOIN accounts acc ON a.account_id = acc.id 
             WHERE a.title LIKE ? OR a.content LIKE ? 
@@ -204,20 +596,161 @@ class Database:
         conn.close()
         return results
 
-    def get_all_articles_with_account(self):
-        """获取所有文章及其公众号信息（用于导出）"""
+    def iter_export_articles(self, account_id=None, date_from=None, date_to=None, updated_after=None,
+                             updated_up_to=None, include_content=False, batch_size=500):
+        """
+        按批次流式读取待导出的文章，避免一次性加载全部正文
+        updated_after / updated_up_to: 按修改时间（articles.updated_at）筛选，用于增量导出
+        逐行产出 (id, account_name, title, publish_date, status, link, local_path, content)，
+        include_content 为 False 时 content 为 None
+        """
+        conditions = []
+        params = []
+        if account_id:
+            conditions.append("a.account_id = ?")
+            params.append(account_id)
+        if date_from:
+            conditions.append("a.publish_date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("a.publish_date <= ?")
+            params.append(date_to)
+        if updated_after:
+            conditions.append("a.updated_at > ?")
+            params.append(updated_after)
+        if updated_up_to:
+            conditions.append("a.updated_at <= ?")
+            params.append(updated_up_to)
+        content_column = "a.content" if include_content else "NULL"
+        
+        # 键集分页：每批单独执行一次短查询并立即关闭连接，产出期间不持有读游标，
+        # 不会在导出响应较慢时阻塞下载、入库等写操作
+        after = None
+        while True:
+            batch_conditions = list(conditions)
+            batch_params = list(params)
+            if after:
+                batch_conditions.append("(COALESCE(a.publish_date, ''), a.id) < (?, ?)")
+                batch_params.extend(after)
+            where_clause = f"WHERE {' AND '.join(batch_conditions)}" if batch_conditions else ""
+            conn = self.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT a.id, acc.name, a.title, a.publish_date, a.status, a.link, a.local_path, {content_column}
+                    FROM articles a 
+                    JOIN accounts acc ON a.account_id = acc.id 
+                    {where_clause}
+                    ORDER BY COALESCE(a.publish_date, '') DESC, a.id DESC
+                    LIMIT ?
+                ''', batch_params + [batch_size])
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                break
+            yield from rows
+            if len(rows) < batch_size:
+                break
+            last = rows[-1]
+            after = (last[3] or '', last[0])
+    
+    def get_export_watermark(self, filter_key):
+        """相同格式和筛选条件的上一次完成的导出的基线（导出开始时间），没有导出记录时返回 None"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT watermark FROM exports WHERE filter_key = ? ORDER BY id DESC LIMIT 1",
+            (filter_key,)
+        )
+        result = cursor.fetchone()
+        conn.close()
+        return result[0] if result else None
+    
+    def add_export_record(self, export_format, filters, filter_key, watermark, row_count):
+        """记录一次完成的导出，watermark 为导出开始时间（之后修改的文章留给下一次增量导出）"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT a.id, acc.name, a.title, a.publish_date, a.status, a.link, a.local_path, a.content
-            FROM articles a 
-            JOIN accounts acc ON a.account_id = acc.id 
-            ORDER BY a.publish_date DESC
-        ''')
+            INSERT INTO exports (format, filters, filter_key, watermark, row_count)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (export_format, json.dumps(filters, ensure_ascii=False), filter_key, watermark, row_count))
+        conn.commit()
+        conn.close()
+    
+    @SQLITE_WRITE_SECONDS.time(op='add_article_profile')
+    def add_article_profile(self, article_id, account_id, success, extraction, retries, total_seconds,
+                            fetch_seconds=0.0, render_seconds=0.0, parse_seconds=0.0, images_seconds=0.0,
+                            write_seconds=0.0, html_bytes=0, image_bytes=0, image_count=0, images_failed=0,
+                            error_message=None):
+        """记录一次文章下载的各阶段耗时、字节数和提取方式"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO article_profiles (
+                article_id, account_id, success, extraction, retries, total_seconds,
+                fetch_seconds, render_seconds, parse_seconds, images_seconds, write_seconds,
+                html_bytes, image_bytes, image_count, images_failed, error_message
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (article_id, account_id, bool(success), extraction, retries, total_seconds,
+              fetch_seconds, render_seconds, parse_seconds, images_seconds, write_seconds,
+              html_bytes, image_bytes, image_count, images_failed, error_message))
+        conn.commit()
+        conn.close()
+    
+    def _profile_since_filter(self, days):
+        if days:
+            return "WHERE p.created_at >= datetime('now', ?)", [f'-{int(days)} days']
+        return "", []
+    
+    def get_slowest_articles(self, limit=20, days=None):
+        """按总耗时倒序返回最慢的下载记录"""
+        where, params = self._profile_since_filter(days)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT p.article_id, a.title, acc.name, p.extraction, p.success, p.retries,
+                   p.total_seconds, p.fetch_seconds, p.render_seconds, p.parse_seconds,
+                   p.images_seconds, p.write_seconds, p.html_bytes, p.image_bytes,
+                   p.image_count, p.images_failed, p.error_message, p.created_at
+            FROM article_profiles p
+            LEFT JOIN articles a ON p.article_id = a.id
+            LEFT JOIN accounts acc ON p.account_id = acc.id
+            {where}
+            ORDER BY p.total_seconds DESC
+            LIMIT ?
+        ''', params + [limit])
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    
+    def get_slowest_accounts(self, limit=20, days=None, min_articles=1):
+        """按平均耗时倒序返回公众号汇总（下载次数、各阶段平均耗时、Selenium 次数、总字节数）"""
+        where, params = self._profile_since_filter(days)
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT p.account_id, acc.name, COUNT(*),
+                   AVG(p.total_seconds), MAX(p.total_seconds),
+                   AVG(p.fetch_seconds), AVG(p.render_seconds), AVG(p.parse_seconds),
+                   AVG(p.images_seconds), AVG(p.write_seconds),
+                   SUM(CASE WHEN p.extraction = 'selenium' THEN 1 ELSE 0 END),
+                   SUM(p.retries),
+                   SUM(CASE WHEN p.success THEN 0 ELSE 1 END),
+                   SUM(p.html_bytes + p.image_bytes)
+            FROM article_profiles p
+            LEFT JOIN accounts acc ON p.account_id = acc.id
+            {where}
+            GROUP BY p.account_id
+            HAVING COUNT(*) >= ?
+            ORDER BY AVG(p.total_seconds) DESC
+            LIMIT ?
+        ''', params + [min_articles, limit])
         results = cursor.fetchall()
         conn.close()
         return results
     
+    @SQLITE_WRITE_SECONDS.time(op='mark_article_downloaded')
     def mark_article_downloaded(self, article_id, filepath, image_count=0):
         """标记文章为已下载"""
         conn = self.get_connection()
@@ -230,6 +763,7 @@ class Database:
         conn.commit()
         conn.close()
     
+    @SQLITE_WRITE_SECONDS.time(op='mark_article_failed')
     def mark_article_failed(self, article_id, error_message):
         """标记文章下载失败"""
         conn = self.get_connection()
@@ -246,7 +780,7 @@ class Database:
         """检查文章是否已下载"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT downloaded FROM articles WHERE link = ?", (link,))
+        cursor.execute("SELECT downloaded FROM articles WHERE article_key = ?", (canonical_article_key(link),))
         result = cursor.fetchone()
         conn.close()
         return result and result[0]
@@ -255,11 +789,29 @@ class Database:
         """通过链接获取文章"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM articles WHERE link = ?", (link,))
+        cursor.execute("SELECT * FROM articles WHERE article_key = ?", (canonical_article_key(link),))
         result = cursor.fetchone()
         conn.close()
         return result
     
+    def get_article_text(self, article_id):
+        """获取文章标题和正文纯文本，返回 (title, content)，不存在时返回 None"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT title, content FROM articles WHERE id = ?", (article_id,))
+        result = cursor.fetchone()
+        conn.close()
+        return result
+    
+    def get_article_id_by_path(self, local_path):
+        """通过本地文件路径查找文章ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM articles WHERE local_path = ?", (local_path,))
+        result = cursor.fetchone()
+        conn.close()
+        return result[0] if result else None
+    
     def get_articles_by_account(self, account_id):
         """获取公众号的所有文章"""
         conn = self.get_connection()
@@ -269,10 +821,52 @@ class Database:
         conn.close()
         return results
     
-    # ========== 频率限制相关 ==========
+    def get_articles_by_ids(self, article_ids):
+        """按ID批量获取文章及其公众号名称（用于按需下载）"""
+        if not article_ids:
+            return []
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(article_ids))
+        cursor.execute(f'''
+            SELECT a.id, a.account_id, acc.name, a.title, a.link, a.publish_date, a.update_time, a.downloaded
+            FROM articles a
+            JOIN accounts acc ON a.account_id = acc.id
+            WHERE a.id IN ({placeholders})
+            ORDER BY a.publish_date DESC
+        ''', list(article_ids))
+        results = cursor.fetchall()
+        conn.close()
+        return [{
+            "id": r[0],
+            "account_id": r[1],
+            "account_name": r[2],
+            "title": r[3],
+            "link": r[4],
+            "publish_date": r[5],
+            "update_time": r[6],
+            "downloaded": bool(r[7]),
+        } for r in results]
+    
+    def get_pending_article_ids(self, links):
+        """根据链接（按规范化标识）获取尚未下载的文章ID"""
+        keys = list({canonical_article_key(link) for link in links if link})
+        if not keys:
+            return []
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(keys))
+        cursor.execute(
+            f"SELECT id FROM articles WHERE downloaded = 0 AND article_key IN ({placeholders})",
+            keys
+        )
+        results = [r[0] for r in cursor.fetchall()]
+        conn.close()
+        return results
     
     # ========== 频率限制相关 ==========
     
+    @SQLITE_WRITE_SECONDS.time(op='record_rate_limit')
     def record_rate_limit(self, account_name=None, error_code='200013'):
         """记录频率限制"""
         conn = self.get_connection()
@@ -314,19 +908,195 @@ class Database:
     
     # ========== 任务相关 ==========
     
-    def create_task(self, account_name, task_type='single', pages=1):
-        """创建任务"""
+    def create_task(self, account_name, task_type='single', pages=1, claimed_by=None):
+        """创建任务（claimed_by 为执行该任务的进程标识，见 requeue_interrupted_tasks）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO tasks (account_name, type, pages, status, create_time, claimed_by, heartbeat_at)
+            VALUES (?, ?, ?, 'running', CURRENT_TIMESTAMP, ?, ?)
+        ''', (account_name, task_type, pages, claimed_by, time.time() if claimed_by else None))
+        conn.commit()
+        task_id = cursor.lastrowid
+        conn.close()
+        return task_id
+    
+    @SQLITE_WRITE_SECONDS.time(op='enqueue_task')
+    def enqueue_task(self, account_name, task_type='single', pages=1, params=None, priority=0):
+        """把任务加入持久化队列（状态为 queued），返回任务ID"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO tasks (account_name, type, pages, status, create_time)
-            VALUES (?, ?, ?, 'running', CURRENT_TIMESTAMP)
-        ''', (account_name, task_type, pages))
+            INSERT INTO tasks (account_name, type, pages, status, priority, params, create_time)
+            VALUES (?, ?, ?, 'queued', ?, ?, CURRENT_TIMESTAMP)
+        ''', (account_name, task_type, pages, priority, json.dumps(params or {}, ensure_ascii=False)))
         conn.commit()
         task_id = cursor.lastrowid
         conn.close()
         return task_id
     
+    @SQLITE_WRITE_SECONDS.time(op='claim_next_task')
+    def claim_next_task(self, claimed_by=None):
+        """原子地取出优先级最高的排队任务并标记为 running（记录领取的进程），没有任务时返回 None"""
+        conn = self.get_connection()
+        conn.isolation_level = None
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''
+                SELECT id, account_name, type, pages, params, priority
+                FROM tasks WHERE status = 'queued'
+                ORDER BY priority DESC, id ASC
+                LIMIT 1
+            ''').fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE tasks SET status = 'running', started_at = CURRENT_TIMESTAMP, "
+                    "claimed_by = ?, heartbeat_at = ? WHERE id = ?",
+                    (claimed_by, time.time(), row[0])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "account_name": row[1],
+            "type": row[2],
+            "pages": row[3],
+            "params": json.loads(row[4]) if row[4] else {},
+            "priority": row[5],
+        }
+    
+    def heartbeat_tasks(self, claimed_by):
+        """更新某进程正在执行的任务的心跳时间"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE tasks SET heartbeat_at = ? WHERE status = 'running' AND claimed_by = ?",
+            (time.time(), claimed_by)
+        )
+        conn.commit()
+        conn.close()
+    
+    def requeue_interrupted_tasks(self, stale_after=60):
+        """
+        处理执行进程已退出（心跳超过 stale_after 秒未更新）的 running 任务，返回 (重新排队数, 暂停数)
+        由任务队列领取的任务（claimed_by 以 queue: 开头，旧记录为空）重新放回队列；
+        命令行进程直接执行的任务（inline:）改为 paused，可用 resume 继续，不会被其他进程的队列领取
+        心跳仍在更新的任务（其他进程正在执行）保持不变
+        """
+        stale = time.time() - stale_after
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE tasks SET status = 'queued', claimed_by = NULL
+            WHERE status = 'running' AND params IS NOT NULL
+              AND (claimed_by IS NULL OR (claimed_by LIKE 'queue:%' AND heartbeat_at < ?))
+        ''', (stale,))
+        requeued = cursor.rowcount
+        cursor.execute('''
+            UPDATE tasks SET status = 'paused', claimed_by = NULL
+            WHERE status = 'running' AND claimed_by LIKE 'inline:%' AND heartbeat_at < ?
+        ''', (stale,))
+        paused = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return requeued, paused
+    
+    def get_tasks(self, status=None, limit=50):
+        """获取最近的任务列表"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if status:
+            cursor.execute('SELECT * FROM tasks WHERE status = ? ORDER BY id DESC LIMIT ?', (status, limit))
+        else:
+            cursor.execute('SELECT * FROM tasks ORDER BY id DESC LIMIT ?', (limit,))
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    
+    def count_tasks_by_status(self):
+        """统计各状态的任务数，返回 {status: count}"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+        results = dict(cursor.fetchall())
+        conn.close()
+        return results
+    
+    @SQLITE_WRITE_SECONDS.time(op='update_task_status')
+    def update_task_status(self, task_id, status, from_statuses, claimed_by=None):
+        """
+        仅当任务处于 from_statuses 之一时更新状态，返回是否更新成功
+        claimed_by: 不为空时同时记录执行该任务的进程（命令行进程直接继续执行任务时使用）
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(from_statuses))
+        if claimed_by:
+            cursor.execute(
+                f"UPDATE tasks SET status = ?, claimed_by = ?, heartbeat_at = ? WHERE id = ? AND status IN ({placeholders})",
+                [status, claimed_by, time.time(), task_id] + list(from_statuses)
+            )
+        else:
+            cursor.execute(
+                f"UPDATE tasks SET status = ? WHERE id = ? AND status IN ({placeholders})",
+                [status, task_id] + list(from_statuses)
+            )
+        conn.commit()
+        updated = cursor.rowcount > 0
+        conn.close()
+        return updated
+    
+    @SQLITE_WRITE_SECONDS.time(op='update_task_params')
+    def update_task_params(self, task_id, updates):
+        """合并更新任务参数（如暂停时保存的待下载文章）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT params FROM tasks WHERE id = ?", (task_id,))
+        row = cursor.fetchone()
+        params = json.loads(row[0]) if row and row[0] else {}
+        params.update(updates)
+        cursor.execute("UPDATE tasks SET params = ? WHERE id = ?", (json.dumps(params, ensure_ascii=False), task_id))
+        conn.commit()
+        conn.close()
+    
+    def get_tasks_waiting_login(self):
+        """因登录会话失效而暂停、等待重新登录的任务ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id FROM tasks WHERE status = 'paused' AND json_extract(params, '$.wait_login') = 1 ORDER BY id"
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return ids
+
+    def get_tasks_due_resume(self, now):
+        """因熔断而暂停、冷却时间（resume_at，Unix 时间戳）已到的任务ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id FROM tasks WHERE status = 'paused' AND json_extract(params, '$.resume_at') <= ? ORDER BY id",
+            (now,)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return ids
+
+    def set_task_profile(self, task_id, profile_path):
+        """记录任务最近一次性能剖析结果的文件路径"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE tasks SET profile_path = ? WHERE id = ?", (profile_path, task_id))
+        conn.commit()
+        conn.close()
+    
     def update_task_progress(self, task_id, total_articles, downloaded_articles, failed_articles):
         """更新任务进度"""
         conn = self.get_connection()
@@ -351,6 +1121,29 @@ class Database:
         conn.commit()
         conn.close()
     
+    @SQLITE_WRITE_SECONDS.time(op='apply_task_updates')
+    def apply_task_updates(self, progress, completions):
+        """
+        在单个事务中批量写入任务进度和完成状态
+        progress: {task_id: (total_articles, downloaded_count, failed_count)}
+        completions: {task_id: (status, error_message)}
+        """
+        conn = self.get_connection()
+        try:
+            with conn:
+                conn.executemany('''
+                    UPDATE tasks 
+                    SET total_articles = ?, downloaded_count = ?, failed_count = ?
+                    WHERE id = ?
+                ''', [(*counts, task_id) for task_id, counts in progress.items()])
+                conn.executemany('''
+                    UPDATE tasks 
+                    SET status = ?, end_time = CURRENT_TIMESTAMP, error_message = ?
+                    WHERE id = ?
+                ''', [(status, error, task_id) for task_id, (status, error) in completions.items()])
+        finally:
+            conn.close()
+    
     def get_task_stats(self, task_id):
         """获取任务统计"""
         conn = self.get_connection()
@@ -362,11 +1155,8 @@ class Database:
     
     # ========== 高级搜索和数据管理 ==========
     
-    def search_articles_advanced(self, query='', account_id=None, date_from=None, date_to=None, sort_by='date', order='desc', is_favorite=None, is_read=None, limit=None, offset=0):
-        """高级搜索文章"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+    def _build_article_filters(self, query='', account_id=None, date_from=None, date_to=None, is_favorite=None, is_read=None, tags=None, tag_match='any'):
+        """构造文章筛选条件，返回 (where_clause, params)"""
         conditions = []
         params = []
         
@@ -399,20 +1189,70 @@ class Database:
             conditions.append("a.is_read = ?")
             params.append(1 if is_read else 0)
         
+        # 标签过滤（走 article_tags 索引）：any 为包含任一标签，all 为包含全部标签
+        tag_names = self._normalize_tags(tags)
+        if tag_names:
+            placeholders = ','.join(['?'] * len(tag_names))
+            tag_sql = f'''
+                SELECT at.article_id FROM article_tags at
+                JOIN tags t ON t.id = at.tag_id
+                WHERE t.name IN ({placeholders})
+            '''
+            params.extend(tag_names)
+            if tag_match == 'all':
+                tag_sql += " GROUP BY at.article_id HAVING COUNT(*) = ?"
+                params.append(len(tag_names))
+            conditions.append(f"a.id IN ({tag_sql})")
+        
         where_clause = " AND ".join(conditions) if conditions else "1=1"
+        return where_clause, params
+    
+    # 高级搜索、结果总数和标签统计共用的 FROM/JOIN，保证三者基于同一结果集
+    ADVANCED_FROM = "FROM articles a JOIN accounts acc ON a.account_id = acc.id"
+    
+    # 高级搜索排序字段 -> 排序表达式（游标分页用同一表达式比较，NULL 统一按空字符串处理）
+    ADVANCED_SORT_COLUMNS = {
+        'date': "COALESCE(a.publish_date, '')",
+        'title': "COALESCE(a.title, '')",
+        'account': "COALESCE(acc.name, '')",
+        'created': "a.id",
+    }
+    
+    def search_articles_advanced(self, query='', account_id=None, date_from=None, date_to=None, sort_by='date', order='desc', is_favorite=None, is_read=None, limit=None, offset=0, tags=None, tag_match='any', after=None, snippet_length=120):
+        """
+        高级搜索文章（标签通过 get_tags_for_articles 批量获取）
+        返回列: id, title, link, publish_date, downloaded, local_path, account_name, is_favorite, is_read, snippet, sort_value
+        after: 游标 (sort_value, id)，只返回排在该记录之后的文章（键集分页，不受 offset 深度影响）
+        snippet: 有关键字时为正文中首个匹配位置附近的片段，否则为摘要或正文开头
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        sort_expr = self.ADVANCED_SORT_COLUMNS.get(sort_by, self.ADVANCED_SORT_COLUMNS['date'])
+        direction = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+        
+        where_clause, where_params = self._build_article_filters(
+            query, account_id, date_from, date_to, is_favorite, is_read, tags, tag_match
+        )
         
-        # 排序
-        if sort_by == 'date':
-            order_clause = f"a.publish_date {order.upper()}"
+        if query:
+            snippet_sql = "substr(a.content, max(1, instr(lower(a.content), lower(?)) - 40), ?)"
+            params = [query, snippet_length]
         else:
-            order_clause = "a.publish_date DESC"
+            snippet_sql = "COALESCE(NULLIF(a.digest, ''), substr(a.content, 1, ?))"
+            params = [snippet_length]
+        params.extend(where_params)
+        
+        if after:
+            where_clause += f" AND ({sort_expr}, a.id) {'>' if direction == 'ASC' else '<'} (?, ?)"
+            params.extend(after)
         
         sql = f'''
-            SELECT a.id, a.title, a.link, a.publish_date, a.downloaded, a.local_path, acc.name, a.is_favorite, a.is_read, a.tags
-            FROM articles a 
-            JOIN accounts acc ON a.account_id = acc.id 
+            SELECT a.id, a.title, a.link, a.publish_date, a.downloaded, a.local_path, acc.name, a.is_favorite, a.is_read,
+                   {snippet_sql}, {sort_expr}
+            {self.ADVANCED_FROM}
             WHERE {where_clause}
-            ORDER BY {order_clause}
+            ORDER BY {sort_expr} {direction}, a.id {direction}
         '''
         
         if limit:
@@ -424,6 +1264,45 @@ class Database:
         conn.close()
         return results
     
+    def count_articles_advanced(self, query='', account_id=None, date_from=None, date_to=None, is_favorite=None, is_read=None, tags=None, tag_match='any'):
+        """统计符合高级搜索条件的文章总数"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        where_clause, params = self._build_article_filters(
+            query, account_id, date_from, date_to, is_favorite, is_read, tags, tag_match
+        )
+        cursor.execute(f'''
+            SELECT COUNT(*)
+            {self.ADVANCED_FROM}
+            WHERE {where_clause}
+        ''', params)
+        result = cursor.fetchone()[0]
+        conn.close()
+        return result
+    
+    def get_tag_counts(self, query='', account_id=None, date_from=None, date_to=None, is_favorite=None, is_read=None, tags=None, tag_match='any'):
+        """按与高级搜索相同的筛选条件统计各标签的文章数，返回 [(tag, count), ...]"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        where_clause, params = self._build_article_filters(
+            query, account_id, date_from, date_to, is_favorite, is_read, tags, tag_match
+        )
+        
+        cursor.execute(f'''
+            SELECT t.name, COUNT(*) AS cnt
+            {self.ADVANCED_FROM}
+            JOIN article_tags at ON at.article_id = a.id
+            JOIN tags t ON t.id = at.tag_id
+            WHERE {where_clause}
+            GROUP BY t.id
+            ORDER BY cnt DESC, t.name
+        ''', params)
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    
     def toggle_favorite(self, article_id):
         """切换收藏状态"""
         conn = self.get_connection()
@@ -440,20 +1319,101 @@ class Database:
         conn.commit()
         conn.close()
     
+    # ========== 标签相关 ==========
+    
+    def _normalize_tags(self, tags):
+        """清理标签列表：支持逗号字符串，去空白、去重并保持顺序"""
+        if isinstance(tags, str):
+            tags = tags.split(',')
+        names = []
+        for tag in tags or []:
+            tag = str(tag).strip()
+            if tag and tag not in names:
+                names.append(tag)
+        return names
+    
+    def _get_tag_ids(self, cursor, names):
+        """获取标签ID，不存在的标签自动创建"""
+        if not names:
+            return []
+        cursor.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(n,) for n in names])
+        placeholders = ','.join(['?'] * len(names))
+        cursor.execute(f"SELECT id FROM tags WHERE name IN ({placeholders})", names)
+        return [r[0] for r in cursor.fetchall()]
+    
+    def _set_article_tags(self, cursor, article_id, tags):
+        """替换单篇文章的标签集合"""
+        tag_ids = self._get_tag_ids(cursor, self._normalize_tags(tags))
+        cursor.execute("DELETE FROM article_tags WHERE article_id = ?", (article_id,))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO article_tags (article_id, tag_id) VALUES (?, ?)",
+            [(article_id, tag_id) for tag_id in tag_ids]
+        )
+    
     def update_tags(self, article_id, tags):
-        """更新文章标签"""
+        """更新文章标签（替换原有标签）"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        tags_str = ','.join(tags) if isinstance(tags, list) else tags
-        cursor.execute("UPDATE articles SET tags = ? WHERE id = ?", (tags_str, article_id))
+        self._set_article_tags(cursor, article_id, tags)
         conn.commit()
         conn.close()
     
+    def batch_add_tags(self, article_ids, tags):
+        """批量为文章添加标签"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        tag_ids = self._get_tag_ids(cursor, self._normalize_tags(tags))
+        cursor.executemany(
+            "INSERT OR IGNORE INTO article_tags (article_id, tag_id) VALUES (?, ?)",
+            [(article_id, tag_id) for article_id in article_ids for tag_id in tag_ids]
+        )
+        conn.commit()
+        conn.close()
+    
+    def batch_remove_tags(self, article_ids, tags):
+        """批量移除文章标签"""
+        names = self._normalize_tags(tags)
+        if not article_ids or not names:
+            return
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        id_placeholders = ','.join(['?'] * len(article_ids))
+        name_placeholders = ','.join(['?'] * len(names))
+        cursor.execute(f'''
+            DELETE FROM article_tags
+            WHERE article_id IN ({id_placeholders})
+              AND tag_id IN (SELECT id FROM tags WHERE name IN ({name_placeholders}))
+        ''', list(article_ids) + names)
+        conn.commit()
+        conn.close()
+    
+    def get_tags_for_articles(self, article_ids):
+        """批量获取文章标签，返回 {article_id: [tag, ...]}"""
+        if not article_ids:
+            return {}
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholders = ','.join(['?'] * len(article_ids))
+        cursor.execute(f'''
+            SELECT at.article_id, t.name
+            FROM article_tags at
+            JOIN tags t ON t.id = at.tag_id
+            WHERE at.article_id IN ({placeholders})
+            ORDER BY t.name
+        ''', list(article_ids))
+        tags = {}
+        for article_id, name in cursor.fetchall():
+            tags.setdefault(article_id, []).append(name)
+        conn.close()
+        return tags
+    
     def batch_delete_articles(self, article_ids):
         """批量删除文章"""
         conn = self.get_connection()
         cursor = conn.cursor()
         placeholders = ','.join(['?'] * len(article_ids))
+        cursor.execute(f"DELETE FROM article_tags WHERE article_id IN ({placeholders})", article_ids)
+        cursor.execute(f"DELETE FROM article_profiles WHERE article_id IN ({placeholders})", article_ids)
         cursor.execute(f"DELETE FROM articles WHERE id IN ({placeholders})", article_ids)
         conn.commit()
         conn.close()
@@ -1,17 +1,42 @@
 import requests
 import os
 import time
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
-from urllib.parse import urljoin
-from .utils import sanitize_filename, create_dir
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urljoin, urlparse
+from .utils import sanitize_filename, create_dir, static_url
 from .css_template import WECHAT_CSS
 from .logger import logger
-from .exceptions import DownloadError, ContentParseError, NetworkError
+from .exceptions import (
+    DownloadError, ContentParseError, NetworkError, TaskInterrupted, AccessRestrictedError, CircuitOpenError
+)
 from .database import Database
+from .concurrency import get_controller
+from .circuit_breaker import OPEN, get_breaker, session_key
+from .egress import get_pool
+from .metrics import ARTICLE_FETCH_SECONDS, SELENIUM_RENDER_SECONDS, IMAGE_FETCH_SECONDS, IMAGE_BYTES, RATE_LIMIT_HITS
+from .compression import configured_encodings, compressed_only, write_compressed
+
+# 微信文章页面使用PC版User-Agent，并带上Referer
+ARTICLE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Referer": "https://mp.weixin.qq.com/",
+}
+
+# 所有下载器共享的图片下载线程池，实际并发数由 image 控制器调节
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+
+def _get_image_pool():
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = ThreadPoolExecutor(max_workers=get_controller('image').max_limit,
+                                             thread_name_prefix="ImageDownload")
+        return _image_pool
+
 
 class WeChatDownloader:
     def __init__(self, output_dir="output", max_retries=3, cookies=None, account_id=None):
@@ -26,87 +51,256 @@ class WeChatDownloader:
             "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
         }
         self.db = Database()
-        logger.info(f"初始化下载器，输出目录: {output_dir}, account_id: {account_id}")
+        # 验证/访问受限页面按会话和域名熔断
+        self.session_key = session_key(cookies)
+        # 可选的出口代理池（SCRAPER_PROXIES），未配置时所有请求直连
+        self.pool = get_pool()
+        # 可选的预压缩存储（SCRAPER_COMPRESS / SCRAPER_COMPRESS_ONLY）
+        self.compress_encodings = configured_encodings()
+        self.compress_only = bool(self.compress_encodings) and compressed_only()
+        logger.info("初始化下载器，输出目录: %s, account_id: %s", output_dir, account_id)
     
     def is_downloaded(self, article_url):
         """检查文章是否已下载（通过数据库）"""
         article = self.db.get_article_by_link(article_url)
         if article and article[7]:  # downloaded字段
-            logger.debug(f"文章已下载: {article_url}")
+            logger.debug("文章已下载: %s", article_url)
             return True
         return False
     
-    def download_image(self, url, filename, retry_count=0):
-        """下载图片"""
+    @contextmanager
+    def _egress(self, checkpoint=None):
+        """占用出口池中的一个出口（未配置出口池时为 None，即直连）"""
+        if self.pool is None:
+            yield None
+        else:
+            with self.pool.use(checkpoint) as egress:
+                yield egress
+    
+    def _get(self, url, egress, headers=None, cookies=None, **kwargs):
+        """
+        发送 GET 请求，每次请求单独构造请求头
+        经由代理出口时使用该出口固定的 User-Agent，且不携带 Cookie（登录会话只从本机 IP 使用），
+        并记录该出口的成功/失败与延迟
+        """
+        request_headers = {**self.headers, **(headers or {})}
+        if egress is None:
+            return requests.get(url, headers=request_headers, cookies=cookies, **kwargs)
+        request_headers.update(egress.headers)
+        if egress.url is not None:
+            cookies = None
+        started = time.monotonic()
+        try:
+            response = requests.get(url, headers=request_headers, cookies=cookies, proxies=egress.proxies, **kwargs)
+            response.raise_for_status()
+        except requests.RequestException:
+            self.pool.record_error(egress)
+            raise
+        self.pool.record_success(egress, time.monotonic() - started)
+        return response
+    
+    def download_image(self, url, filename, retry_count=0, stats=None, checkpoint=None):
+        """下载图片，stats 不为空时累计下载字节数"""
+        controller = get_controller('image')
+        started = time.monotonic()
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            with self._egress(checkpoint) as egress:
+                # 等待出口的时间不计入请求耗时
+                started = time.monotonic()
+                response = self._get(url, egress, headers=ARTICLE_HEADERS, timeout=10)
             response.raise_for_status()
+            elapsed = time.monotonic() - started
+            controller.record_success(elapsed)
+            IMAGE_FETCH_SECONDS.observe(elapsed, result='ok')
+            IMAGE_BYTES.inc(len(response.content))
             
             filepath = os.path.join(self.images_dir, filename)
             with open(filepath, "wb") as f:
                 f.write(response.content)
-            logger.debug(f"图片下载成功: {filename}")
+            if stats is not None:
+                stats['image_bytes'] = stats.get('image_bytes', 0) + len(response.content)
+            logger.debug("图片下载成功: %s", filename)
             return filepath
+        except TaskInterrupted:
+            raise
         except Exception as e:
+            controller.record_error()
+            IMAGE_FETCH_SECONDS.observe(time.monotonic() - started, result='error')
             if retry_count < self.max_retries:
-                logger.warning(f"下载图片失败，正在重试 ({retry_count + 1}/{self.max_retries}): {url}")
+                logger.warning("下载图片失败，正在重试 (%s/%s): %s", retry_count + 1, self.max_retries, url)
                 time.sleep(2)
-                return self.download_image(url, filename, retry_count + 1)
+                return self.download_image(url, filename, retry_count + 1, stats, checkpoint)
             else:
-                logger.error(f"下载图片失败(已达最大重试次数): {url}, 错误: {e}")
+                logger.error("下载图片失败(已达最大重试次数): %s, 错误: %s", url, e)
                 return None
 
-    def download_article(self, article_url, title, date, retry_count=0):
+    def _download_image_job(self, url, filename, stats, checkpoint=None):
+        """图片线程池任务：占用一个图片并发额度后下载"""
+        if checkpoint:
+            checkpoint()
+        with get_controller('image').slot():
+            return self.download_image(url, filename, stats=stats, checkpoint=checkpoint)
+
+    def download_article(self, article_url, title, date, retry_count=0, stats=None, checkpoint=None):
         """
         下载文章，返回 (success, article_id, image_count, error_message)
+        stats: 可选字典，记录图片下载情况 (images_ok, images_failed, image_bytes)、
+               页面字节数 html_bytes、各阶段耗时 phases、提取方式 extraction 和重试次数 retries
+        checkpoint: 可选回调，在请求页面和每张图片前调用，任务被取消/暂停时抛出 TaskInterrupted
+        下载结束（成功或失败）后写入一条 article_profiles 记录，被中断的下载不记录
+        """
+        if stats is None:
+            stats = {}
+        started = time.monotonic()
+        result = self._download_article(article_url, title, date, retry_count, stats, checkpoint)
+        success, article_id, img_count, error = result
+        if article_id:
+            self._save_profile(article_id, stats, time.monotonic() - started, success, img_count, error)
+        return result
+
+    def _check_blocked(self, soup, title, breaker, controller, egress=None):
         """
-        # 检查是否已下载
-        if self.is_downloaded(article_url):
-            logger.info(f"跳过重复文章: {title}")
+        页面为验证页面或访问受限时记录到熔断器并抛出 AccessRestrictedError
+        经由出口池请求时只让该出口冷却，不降低全局文章并发（其他出口不受影响）
+        """
+        if soup.find("div", {"id": "js_content"}) is not None:
+            # 正常文章页面（正文中可能恰好出现这些字样）
+            return
+        if soup.title and "验证" in soup.title.text:
+            kind, error_msg = 'verify', f"遇到验证页面: {title}"
+        elif "访问受限" in soup.text:
+            kind, error_msg = 'restricted', f"访问受限: {title}"
+        else:
+            return
+        if egress is not None:
+            self.pool.record_throttled(egress)
+            logger.warning("出口 %s 遇到验证/访问受限页面，暂停使用", egress.name)
+        else:
+            controller.record_throttled()
+        RATE_LIMIT_HITS.inc(stage=f'article_{kind}')
+        if breaker.record_block():
+            logger.warning("熔断器 %s 已打开，暂停文章请求", breaker.name)
+        logger.warning(error_msg)
+        raise AccessRestrictedError(kind, error_msg)
+
+    @staticmethod
+    def _add_phase(stats, phase, seconds):
+        phases = stats.setdefault('phases', {})
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+    def _save_profile(self, article_id, stats, total_seconds, success, img_count, error):
+        """保存单篇文章的耗时与流量记录，失败不影响下载结果"""
+        phases = stats.get('phases', {})
+        try:
+            self.db.add_article_profile(
+                article_id=article_id,
+                account_id=self.account_id,
+                success=success,
+                extraction=stats.get('extraction'),
+                retries=stats.get('retries', 0),
+                total_seconds=total_seconds,
+                fetch_seconds=phases.get('fetch', 0.0),
+                render_seconds=phases.get('render', 0.0),
+                parse_seconds=phases.get('parse', 0.0),
+                images_seconds=phases.get('images', 0.0),
+                write_seconds=phases.get('write', 0.0),
+                html_bytes=stats.get('html_bytes', 0),
+                image_bytes=stats.get('image_bytes', 0),
+                image_count=img_count,
+                images_failed=stats.get('images_failed', 0),
+                error_message=error,
+            )
+        except Exception as e:
+            logger.warning("保存文章耗时记录失败: %s", e)
+
+    def _download_article(self, article_url, title, date, retry_count, stats, checkpoint):
+        """单次下载尝试，出错时递归重试"""
+        stats['retries'] = retry_count
+        # 列表入库时已有的文章直接使用该记录，已下载的跳过
+        article_id, downloaded = self.db.prepare_article_download(self.account_id, title, article_url, date)
+        if downloaded:
+            logger.info("跳过重复文章: %s", title)
             return True, None, 0, None
         
-        # 添加文章记录到数据库
-        article_id = self.db.add_article(
-            account_id=self.account_id,
-            title=title,
-            link=article_url,
-            publish_date=date
-        )
-        
         try:
-            logger.info(f"开始下载文章: {title}")
-            
-            # 确保使用PC版User-Agent请求微信公众号文章
-            self.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            # 对于微信文章，需要在请求中添加Referer
-            self.headers["Referer"] = "https://mp.weixin.qq.com/"
+            if checkpoint:
+                checkpoint()
+            host = urlparse(article_url).hostname
+            breaker = get_breaker(self.session_key, host)
+            if not breaker.allow(checkpoint):
+                raise CircuitOpenError(host, breaker.retry_after())
+            logger.info("开始下载文章: %s", title)
 
             # 首先尝试使用常规requests请求
-            response = requests.get(article_url, headers=self.headers, cookies=self.cookies, timeout=30)
-            response.raise_for_status()
+            controller = get_controller('article')
+            with self._egress(checkpoint) as egress:
+                if egress is not None:
+                    # 使用出口池时文章请求按出口分别节流（任务中不再使用全局文章节流器）
+                    egress.limiter.acquire()
+                started = time.monotonic()
+                try:
+                    response = self._get(article_url, egress, headers=ARTICLE_HEADERS, cookies=self.cookies, timeout=30)
+                    response.raise_for_status()
+                except requests.RequestException:
+                    controller.record_error()
+                    breaker.record_failure()
+                    ARTICLE_FETCH_SECONDS.observe(time.monotonic() - started, result='error')
+                    self._add_phase(stats, 'fetch', time.monotonic() - started)
+                    raise
+            elapsed = time.monotonic() - started
+            controller.record_success(elapsed)
+            ARTICLE_FETCH_SECONDS.observe(elapsed, result='ok')
+            self._add_phase(stats, 'fetch', elapsed)
+            stats['html_bytes'] = stats.get('html_bytes', 0) + len(response.content)
+            stats['extraction'] = 'http'
 
+            # 解析库在首次下载时才导入，只读取数据的进程（Web 界面、导出）不需要加载
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(response.text, "lxml")
 
             # 检查内容是否足够长，如果太短或找不到js_content，使用Selenium加载完整内容
             content_div = soup.find("div", {"id": "js_content"})
             if not content_div or len(str(content_div)) < 1000:
+                # 验证/访问受限页面没有正文，先排除，避免再用浏览器请求一次
+                self._check_blocked(soup, title, breaker, controller, egress)
                 logger.info("检测到动态页面，正在使用Selenium重新加载...")
-                # 使用Selenium获取完整页面内容
+                # 使用Selenium获取完整页面内容（只有动态页面才需要，按需导入）
+                from selenium import webdriver
+                from selenium.webdriver.chrome.options import Options
+                from selenium.webdriver.chrome.service import Service
+                from webdriver_manager.chrome import ChromeDriverManager
+
                 chrome_options = Options()
                 chrome_options.add_argument("--headless")  # 无头模式，不显示浏览器窗口
-                chrome_options.add_argument("--user-agent={}".format(self.headers["User-Agent"]))
-
-                service = Service(ChromeDriverManager().install())
-                driver = webdriver.Chrome(service=service, options=chrome_options)
+                user_agent = egress.headers["User-Agent"] if egress is not None else ARTICLE_HEADERS["User-Agent"]
+                chrome_options.add_argument("--user-agent={}".format(user_agent))
+                if egress is not None and egress.url is not None and not egress.has_credentials:
+                    # 与请求页面时使用同一出口（Chrome 命令行不支持带账号密码的代理，这类出口改为直连渲染）
+                    chrome_options.add_argument("--proxy-server={}".format(egress.url))
 
+                # 渲染耗时包含浏览器启动
+                stats['extraction'] = 'selenium'
+                render_started = time.monotonic()
                 try:
-                    driver.get(article_url)
-                    time.sleep(3)  # 等待3秒让页面完全加载
-                    html = driver.page_source
-                    soup = BeautifulSoup(html, "lxml")
-                    logger.info("Selenium加载页面成功")
+                    with SELENIUM_RENDER_SECONDS.time():
+                        service = Service(ChromeDriverManager().install())
+                        driver = webdriver.Chrome(service=service, options=chrome_options)
+
+                        try:
+                            driver.get(article_url)
+                            time.sleep(3)  # 等待3秒让页面完全加载
+                            html = driver.page_source
+                            soup = BeautifulSoup(html, "lxml")
+                            logger.info("Selenium加载页面成功")
+                        finally:
+                            driver.quit()
                 finally:
-                    driver.quit()
+                    self._add_phase(stats, 'render', time.monotonic() - render_started)
+                stats['html_bytes'] = stats.get('html_bytes', 0) + len(html.encode("utf-8"))
+                self._check_blocked(soup, title, breaker, controller, egress)
+            breaker.record_success()
+            
+            phase_started = time.monotonic()
             
             # Extract content div
             content_div = soup.find("div", {"id": "js_content"})
@@ -135,21 +329,14 @@ class WeChatDownloader:
                     content_div = body
 
             if not content_div:
-                # 检查是否是验证页面或错误页面
-                if "验证" in soup.title.text if soup.title else "":
-                    error_msg = f"遇到验证页面: {title}"
-                elif "访问受限" in soup.text:
-                    error_msg = f"访问受限: {title}"
-                else:
-                    # Save debug HTML
-                    debug_filename = f"debug_failed_{sanitize_filename(title)}_{int(time.time())}.html"
-                    debug_path = os.path.join(self.output_dir, "debug", debug_filename)
-                    create_dir(os.path.dirname(debug_path))
-                    with open(debug_path, "w", encoding="utf-8") as f:
-                        f.write(response.text)
-                        
-                    error_msg = f"无法找到内容: {title}. 已保存调试文件: {debug_path}"
-                
+                # Save debug HTML（验证/访问受限页面已在前面排除）
+                debug_filename = f"debug_failed_{sanitize_filename(title)}_{int(time.time())}.html"
+                debug_path = os.path.join(self.output_dir, "debug", debug_filename)
+                create_dir(os.path.dirname(debug_path))
+                with open(debug_path, "w", encoding="utf-8") as f:
+                    f.write(response.text)
+                    
+                error_msg = f"无法找到内容: {title}. 已保存调试文件: {debug_path}"
                 logger.error(error_msg)
                 self.db.mark_article_failed(article_id, error_msg)
                 raise ContentParseError(error_msg)
@@ -184,14 +371,14 @@ class WeChatDownloader:
             if image_swiper_content:
                 swiper_imgs = image_swiper_content.find_all("img")
                 imgs += swiper_imgs
-                logger.debug(f"从轮播图区域额外找到 {len(swiper_imgs)} 张图片")
+                logger.debug("从轮播图区域额外找到 %s 张图片", len(swiper_imgs))
 
             # 检查图片内容结构
             js_image_content = content_div.find("div", {"id": "js_image_content"})
             if js_image_content:
                 js_imgs = js_image_content.find_all("img")
                 imgs += js_imgs
-                logger.debug(f"从js_image_content区域额外找到 {len(js_imgs)} 张图片")
+                logger.debug("从js_image_content区域额外找到 %s 张图片", len(js_imgs))
 
             # 去重处理，防止重复图片
             seen = set()
@@ -203,10 +390,17 @@ class WeChatDownloader:
                     unique_imgs.append(img)
 
             img_count = len(unique_imgs)
-            logger.debug(f"总共找到 {img_count} 张图片 (已去重)")
+            logger.debug("总共找到 %s 张图片 (已去重)", img_count)
             imgs = unique_imgs
             
+            self._add_phase(stats, 'parse', time.monotonic() - phase_started)
+            phase_started = time.monotonic()
+            
+            # 图片提交到共享线程池并发下载，完成后按原顺序替换链接
+            image_jobs = []
             for i, img in enumerate(imgs):
+                if checkpoint:
+                    checkpoint()
                 src = img.get("data-src")
                 if not src:
                     src = img.get("src")
@@ -215,16 +409,27 @@ class WeChatDownloader:
                 
                 fmt = img.get("data-type", "jpg")
                 img_filename = f"{sanitize_filename(title)}_{i}.{fmt}"
+                image_stats = {}
+                future = _get_image_pool().submit(self._download_image_job, src, img_filename, image_stats, checkpoint)
+                image_jobs.append((img, img_filename, future, image_stats))
+
+            for img, img_filename, future, image_stats in image_jobs:
+                local_path = future.result()
+                stats['image_bytes'] = stats.get('image_bytes', 0) + image_stats.get('image_bytes', 0)
                 
-                local_path = self.download_image(src, img_filename)
-                
-                if local_path:
+                if not local_path:
+                    stats['images_failed'] = stats.get('images_failed', 0) + 1
+                else:
+                    stats['images_ok'] = stats.get('images_ok', 0) + 1
                     relative_path = os.path.join("images", img_filename)
                     img["src"] = relative_path
                     if img.has_attr("data-src"):
                         del img["data-src"]
                     img["style"] = "width: 100% !important; height: auto !important; visibility: visible !important;"
 
+            self._add_phase(stats, 'images', time.monotonic() - phase_started)
+            phase_started = time.monotonic()
+            
             # Create HTML
             html_content = f"""
             <!DOCTYPE html>
@@ -245,6 +450,7 @@ class WeChatDownloader:
                     <hr>
                     {str(content_div)}
                 </div>
+                <script src="{static_url('highlight.js')}" data-article-id="{article_id}" defer></script>
             </body>
             </html>
             """
@@ -252,15 +458,29 @@ class WeChatDownloader:
             filename = f"{date}_{sanitize_filename(title)}.html"
             filepath = os.path.join(self.output_dir, filename)
             
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(html_content)
+            if not self.compress_only:
+                with open(filepath, "w", encoding="utf-8") as f:
+                    f.write(html_content)
+            if self.compress_encodings:
+                # 预压缩文件与原文件同名加后缀，由 serve_output 按 Accept-Encoding 直接返回
+                write_compressed(filepath, html_content.encode("utf-8"), self.compress_encodings)
             
             # 标记为已下载
             self.db.mark_article_downloaded(article_id, filepath, img_count)
+            self._add_phase(stats, 'write', time.monotonic() - phase_started)
             
-            logger.info(f"文章下载成功: {title}, 图片数: {img_count}")
+            logger.info("文章下载成功: %s, 图片数: %s", title, img_count)
             return True, article_id, img_count, None
 
+        except (TaskInterrupted, CircuitOpenError):
+            # 中断或被熔断的文章保持待下载状态，恢复任务时重新下载
+            raise
+        except AccessRestrictedError as e:
+            # 不重试，避免加重限制；熔断器因此打开时由任务统一暂停并重新调度
+            self.db.mark_article_failed(article_id, str(e))
+            if breaker.state == OPEN:
+                raise CircuitOpenError(host, breaker.retry_after())
+            return False, article_id, 0, str(e)
         except ContentParseError as e:
             return False, article_id, 0, str(e)
         except Exception as e:
@@ -269,10 +489,13 @@ class WeChatDownloader:
             
             # 重试逻辑
             if retry_count < self.max_retries:
-                logger.info(f"正在重试 ({retry_count + 1}/{self.max_retries})...")
+                logger.info("正在重试 (%s/%s)...", retry_count + 1, self.max_retries)
                 time.sleep(3)
-                return self.download_article(article_url, title, date, retry_count + 1)
+                # 图片计数按最后一次尝试统计，下载字节数保留累计值
+                stats.pop('images_ok', None)
+                stats.pop('images_failed', None)
+                return self._download_article(article_url, title, date, retry_count + 1, stats, checkpoint)
             else:
                 self.db.mark_article_failed(article_id, error_msg)
-                logger.error(f"下载失败(已达最大重试次数): {title}")
+                logger.error("下载失败(已达最大重试次数): %s", title)
                 return False, article_id, 0, error_msg
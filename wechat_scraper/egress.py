@@ -0,0 +1,204 @@
+import os
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .rate_limiter import RateLimiter
+
+# 每个出口使用固定的 User-Agent（同一 IP 的请求特征保持一致）
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:120.0) Gecko/20100101 Firefox/120.0",
+)
+
+
+class Egress:
+    """
+    一个出口（代理或本机直连，url 为 None）
+    记录健康分（0~1）、延迟 EWMA 和进行中的请求数；连续出错或遇到验证/访问受限页面后进入冷却期，
+    冷却期内不分配请求。文章请求按出口各自节流，互不占用额度。
+    """
+
+    def __init__(self, url=None, max_concurrency=4, cooldown=30.0, throttle_cooldown=300.0, max_cooldown=3600.0,
+                 article_interval=0.5, article_jitter=1.0):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        # 网络错误的冷却时间（连续 3 次出错后开始）与遇到验证页面的冷却时间，连续发生时加倍
+        self.base_cooldown = cooldown
+        self.throttle_cooldown = throttle_cooldown
+        self.max_cooldown = max_cooldown
+        self.limiter = RateLimiter(article_interval, article_jitter)
+        if url:
+            parts = urlsplit(url)
+            # 名称不含账号密码，用于日志和指标
+            self.name = f"{parts.scheme}://{parts.hostname}:{parts.port}" if parts.port else f"{parts.scheme}://{parts.hostname}"
+            self.has_credentials = bool(parts.username)
+            self.proxies = {"http": url, "https": url}
+        else:
+            self.name = "direct"
+            self.has_credentials = False
+            self.proxies = None
+        self.headers = {"User-Agent": USER_AGENTS[zlib.crc32(self.name.encode("utf-8")) % len(USER_AGENTS)]}
+        self.score = 1.0
+        self.in_flight = 0
+        self._latency = None
+        self._consecutive_errors = 0
+        self._consecutive_throttled = 0
+        self._cooldown_until = 0.0
+        self._successes = 0
+        self._errors = 0
+        self._throttled = 0
+
+    def available(self, now):
+        return now >= self._cooldown_until and self.in_flight < self.max_concurrency
+
+    def weight(self):
+        """选择权重：健康分高、延迟低、空闲的出口优先"""
+        latency = self._latency if self._latency is not None else 1.0
+        return max(self.score, 0.05) / (1 + self.in_flight) / max(latency, 0.05)
+
+    # 以下方法由 EgressPool 持锁调用
+    def _record_success(self, latency):
+        self._successes += 1
+        self._consecutive_errors = 0
+        self._consecutive_throttled = 0
+        self.score += (1.0 - self.score) * 0.2
+        self._latency = latency if self._latency is None else self._latency * 0.8 + latency * 0.2
+
+    def _record_error(self):
+        self._errors += 1
+        self._consecutive_errors += 1
+        self.score *= 0.6
+        if self._consecutive_errors >= 3:
+            cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self._consecutive_errors - 3))
+            self._cooldown_until = time.monotonic() + cooldown
+
+    def _record_throttled(self):
+        self._throttled += 1
+        self._consecutive_throttled += 1
+        self.score *= 0.3
+        cooldown = min(self.max_cooldown, self.throttle_cooldown * 2 ** (self._consecutive_throttled - 1))
+        self._cooldown_until = time.monotonic() + cooldown
+
+    def _snapshot(self):
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "score": round(self.score, 3),
+            "proxy": self.url is not None,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "latency_ewma": round(self._latency, 3) if self._latency is not None else None,
+            "cooldown_remaining": round(max(0.0, self._cooldown_until - now), 1),
+            "successes": self._successes,
+            "errors": self._errors,
+            "throttled": self._throttled,
+        }
+
+
+class EgressPool:
+    """
+    文章页面和图片请求的出口池（线程安全）
+    每次请求按权重随机选择一个可用出口；所有出口都满载或在冷却中时等待。
+    公众平台列表/搜索接口与登录会话的 IP 绑定，不经过出口池。
+    """
+
+    def __init__(self, egresses):
+        self.egresses = list(egresses)
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self):
+        return sum(egress.max_concurrency for egress in self.egresses)
+
+    @contextmanager
+    def use(self, checkpoint=None):
+        """
+        占用一个出口直到 with 块结束
+        checkpoint: 可选回调，等待出口时定期调用（任务被取消/暂停时抛出 TaskInterrupted）
+        """
+        egress = self._acquire(checkpoint)
+        try:
+            yield egress
+        finally:
+            with self._cond:
+                egress.in_flight -= 1
+                self._cond.notify_all()
+
+    def _acquire(self, checkpoint):
+        while True:
+            if checkpoint:
+                checkpoint()
+            with self._cond:
+                now = time.monotonic()
+                candidates = [egress for egress in self.egresses if egress.available(now)]
+                if candidates:
+                    egress = random.choices(candidates, [egress.weight() for egress in candidates])[0]
+                    egress.in_flight += 1
+                    return egress
+                # 等待有请求结束或冷却结束
+                self._cond.wait(1.0)
+
+    def record_success(self, egress, latency):
+        with self._cond:
+            egress._record_success(latency)
+
+    def record_error(self, egress):
+        with self._cond:
+            egress._record_error()
+
+    def record_throttled(self, egress):
+        """该出口遇到验证/访问受限页面，进入较长冷却期"""
+        with self._cond:
+            egress._record_throttled()
+
+    def snapshot(self):
+        with self._cond:
+            return [egress._snapshot() for egress in self.egresses]
+
+
+def _configured_proxy_urls():
+    urls = [url.strip() for url in os.environ.get('SCRAPER_PROXIES', '').split(',') if url.strip()]
+    path = os.environ.get('SCRAPER_PROXY_FILE')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return urls
+
+
+def load_pool():
+    """
+    按环境变量创建出口池，未配置代理时返回 None（所有请求直连）
+    SCRAPER_PROXIES: 逗号分隔的代理地址（http://、https://、socks5://，socks 需安装 requests[socks]）
+    SCRAPER_PROXY_FILE: 代理列表文件，每行一个
+    SCRAPER_PROXY_CONCURRENCY: 每个出口的并发上限（默认 4）
+    SCRAPER_PROXY_DIRECT: 为 0 时本机直连不作为出口
+    """
+    urls = _configured_proxy_urls()
+    if not urls:
+        return None
+    concurrency = int(os.environ.get('SCRAPER_PROXY_CONCURRENCY', 4))
+    egresses = [Egress(url, max_concurrency=concurrency) for url in urls]
+    if os.environ.get('SCRAPER_PROXY_DIRECT', '1') != '0':
+        egresses.insert(0, Egress(None, max_concurrency=concurrency))
+    return EgressPool(egresses)
+
+
+_pool = None
+_pool_loaded = False
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """全局出口池（首次调用时按环境变量创建），未配置代理时为 None"""
+    global _pool, _pool_loaded
+    with _pool_lock:
+        if not _pool_loaded:
+            _pool = load_pool()
+            _pool_loaded = True
+        return _pool
@@ -10,12 +10,32 @@ class AuthenticationError(WeChatScraperException):
     """认证失败异常"""
     pass
 
+class SessionExpiredError(AuthenticationError):
+    """登录会话已失效（token 或 Cookies 过期），需要重新扫码登录"""
+    pass
+
 class RateLimitError(WeChatScraperException):
     """频率限制异常"""
     def __init__(self, message="触发频率限制", reset_time=None):
         self.reset_time = reset_time
         super().__init__(message)
 
+class AccessRestrictedError(WeChatScraperException):
+    """
+    文章页面返回验证页面或访问受限（kind 为 verify 或 restricted）
+    该文章记为下载失败且不重试；熔断器因此打开时，它与其余未下载的文章一起保存到任务中，任务恢复后重新下载
+    """
+    def __init__(self, kind, message):
+        self.kind = kind
+        super().__init__(message)
+
+class CircuitOpenError(WeChatScraperException):
+    """熔断器处于打开状态，暂停向该域名发送请求（retry_after 秒后可探测）"""
+    def __init__(self, host, retry_after=0.0):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"{host} 频繁返回验证/访问受限页面，已暂停请求，约 {int(retry_after)} 秒后重试")
+
 class AccountNotFoundError(WeChatScraperException):
     """公众号未找到异常"""
     pass
@@ -35,3 +55,9 @@ class NetworkError(WeChatScraperException):
 class ContentParseError(WeChatScraperException):
     """内容解析错误异常"""
     pass
+
+class TaskInterrupted(WeChatScraperException):
+    """任务被取消或暂停（action 为 cancel 或 pause）"""
+    def __init__(self, action='cancel', message=None):
+        self.action = action
+        super().__init__(message or ("任务已暂停" if action == 'pause' else "任务已取消"))
@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+import os
+import tempfile
+
+# (字段名, 表头)，CSV/XLSX 使用中文表头，JSONL/Parquet 使用字段名
+EXPORT_COLUMNS = [
+    ("id", "ID"),
+    ("account", "公众号"),
+    ("title", "标题"),
+    ("publish_date", "发布日期"),
+    ("status", "状态"),
+    ("link", "原文链接"),
+    ("local_path", "本地路径"),
+]
+CONTENT_COLUMN = ("content", "正文内容")
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson; charset=utf-8", "jsonl"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def export_columns(include_content):
+    return EXPORT_COLUMNS + [CONTENT_COLUMN] if include_content else list(EXPORT_COLUMNS)
+
+
+def status_label(status):
+    if status in ('completed', 'success'):
+        return "✅ 已下载"
+    if status == 'failed':
+        return "❌ 失败"
+    return "⏳ 等待中"
+
+
+def row_values(row, include_content):
+    """数据库行 -> 导出字段值列表"""
+    values = [row[0], row[1], row[2], row[3], status_label(row[4]), row[5], row[6] or ""]
+    if include_content:
+        values.append(row[7] or "")
+    return values
+
+
+class ExportCounter:
+    """包装行迭代器，统计已导出的行数"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def iter_csv(rows, include_content, chunk_rows=200):
+    """逐块产出 CSV 文本（带 BOM，便于 Excel 直接打开）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow([label for _, label in export_columns(include_content)])
+    pending = 0
+    for row in rows:
+        writer.writerow(row_values(row, include_content))
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def iter_jsonl(rows, include_content):
+    """每行一个 JSON 对象"""
+    keys = [key for key, _ in export_columns(include_content)]
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row_values(row, include_content))), ensure_ascii=False) + "\n"
+
+
+def write_xlsx(rows, include_content):
+    """使用 openpyxl 只写模式逐行写入临时文件，返回文件路径"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('文章列表')
+    sheet.append([label for _, label in export_columns(include_content)])
+    for row in rows:
+        sheet.append(row_values(row, include_content))
+    return _save_temp(workbook.save, ".xlsx")
+
+
+def write_parquet(rows, include_content, row_group_size=5000):
+    """使用 pyarrow 按行组写入临时文件，返回文件路径（需要安装 pyarrow）"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    columns = export_columns(include_content)
+    schema = pa.schema([(key, pa.int64() if key == "id" else pa.string()) for key, _ in columns])
+
+    def write(path):
+        with pq.ParquetWriter(path, schema) as writer:
+            batch = []
+            for row in rows:
+                batch.append(row_values(row, include_content))
+                if len(batch) >= row_group_size:
+                    writer.write_table(_parquet_table(pa, schema, batch))
+                    batch = []
+            if batch:
+                writer.write_table(_parquet_table(pa, schema, batch))
+
+    return _save_temp(write, ".parquet")
+
+
+def _parquet_table(pa, schema, batch):
+    arrays = [pa.array([values[i] for values in batch], type=field.type) for i, field in enumerate(schema)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _save_temp(save, suffix):
+    fd, path = tempfile.mkstemp(prefix="wechat_export_", suffix=suffix)
+    os.close(fd)
+    try:
+        save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_file_and_remove(path, chunk_size=64 * 1024):
+    """分块读取临时文件，读完后删除"""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
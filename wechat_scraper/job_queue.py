@@ -0,0 +1,216 @@
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from .logger import logger
+from .exceptions import TaskInterrupted
+
+# 本进程的标识，写入 tasks.claimed_by（queue:<标识> 为任务队列领取，inline:<标识> 为命令行直接执行）
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+# 执行中的任务定期更新心跳，超过 HEARTBEAT_STALE 秒未更新视为执行进程已退出
+HEARTBEAT_INTERVAL = 15
+HEARTBEAT_STALE = 60
+# 事件ID = 本进程的编号基数 + 序号；基数取启动时间（秒）乘以该值，重启后的事件ID总是大于重启前的
+EVENT_ID_SPAN = 1_000_000
+
+
+class TaskControl:
+    """
+    运行中任务的协作式控制标志
+    列表翻页、下载线程池和图片下载在各自的检查点调用 checkpoint()，
+    收到取消或暂停请求时抛出 TaskInterrupted。
+    """
+
+    def __init__(self):
+        self._action = None
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._request('cancel')
+
+    def pause(self):
+        self._request('pause')
+
+    def _request(self, action):
+        with self._lock:
+            # 取消优先于暂停
+            if self._action != 'cancel':
+                self._action = action
+
+    @property
+    def action(self):
+        return self._action
+
+    def should_stop(self):
+        return self._action is not None
+
+    def checkpoint(self):
+        if self._action:
+            raise TaskInterrupted(self._action)
+
+
+class JobQueue:
+    """
+    基于 tasks 表的持久化任务队列
+    固定数量的后台线程按优先级领取排队任务并执行，任务执行与 HTTP 请求解耦。
+    服务重启后，未完成的任务会重新排队：只处理心跳已停止的任务，其他进程正在执行的任务不受影响。
+    handler(task) 为生成器，产出的进度事件（dict，含 type 字段）按任务保存并编号，
+    供前端通过 SSE 订阅或断线后从指定事件ID续读。task['control'] 为该任务的 TaskControl。
+    """
+
+    def __init__(self, db, handler, workers=2, poll_interval=2.0, max_logs=100):
+        self.db = db
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_logs = max_logs
+        self._events = OrderedDict()
+        self._finished = set()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._controls = {}
+        self.owner = f"queue:{PROCESS_ID}"
+        self._event_id_base = int(time.time()) * EVENT_ID_SPAN
+
+    def start(self):
+        """启动工作线程（重复调用无副作用）"""
+        with self._lock:
+            if self._threads:
+                return
+            self._requeue_interrupted()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"JobWorker-{i + 1}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="JobHeartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def started(self):
+        """本进程的工作线程是否已启动"""
+        return bool(self._threads)
+
+    def enqueue(self, account_name, task_type, pages=0, params=None, priority=0):
+        """加入队列并唤醒空闲线程，返回任务ID"""
+        task_id = self.db.enqueue_task(account_name, task_type, pages, params, priority)
+        self._wakeup.set()
+        return task_id
+
+    def resume(self, task_id):
+        """把已暂停的任务重新放回队列，返回是否成功"""
+        if not self.db.update_task_status(task_id, 'queued', ('paused',)):
+            return False
+        with self._lock:
+            self._finished.discard(task_id)
+        self._wakeup.set()
+        return True
+
+    def get_control(self, task_id):
+        """获取运行中任务的控制对象，任务未在本进程运行时返回 None"""
+        with self._lock:
+            return self._controls.get(task_id)
+
+    def get_events(self, task_id, after=0):
+        """
+        返回 (事件ID大于 after 的事件列表, 是否已执行结束)
+        任务不在本进程内存中（未开始或重启前执行）时，是否结束返回 None
+        """
+        with self._lock:
+            return self._get_events_locked(task_id, after)
+
+    def wait_events(self, task_id, after=0, timeout=15):
+        """阻塞等待新事件或任务结束，超时返回空列表"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                events, finished = self._get_events_locked(task_id, after)
+                remaining = deadline - time.monotonic()
+                if events or finished or remaining <= 0:
+                    return events, finished
+                self._changed.wait(remaining)
+
+    def _get_events_locked(self, task_id, after):
+        events = self._events.get(task_id, [])
+        if task_id in self._finished:
+            finished = True
+        elif task_id in self._events:
+            finished = False
+        else:
+            finished = None
+        # 本进程的事件ID从基数 + 1 开始连续编号，可直接按下标切片；
+        # 小于基数（0、负数或重启前的事件ID）或超出已有事件数时从头返回，避免跳过事件
+        index = (after or 0) - self._event_id_base
+        if index < 0 or index > len(events):
+            index = 0
+        return events[index:], finished
+
+    def _append_event(self, task_id, event):
+        if isinstance(event, str):
+            event = {"type": "log", "message": event}
+        with self._changed:
+            if task_id not in self._events:
+                self._events[task_id] = []
+                # 只保留最近的任务事件
+                while len(self._events) > self.max_logs:
+                    old_id, _ = self._events.popitem(last=False)
+                    self._finished.discard(old_id)
+            events = self._events[task_id]
+            events.append({**event, "id": self._event_id_base + len(events) + 1, "task_id": task_id, "time": time.time()})
+            self._changed.notify_all()
+
+    def _requeue_interrupted(self):
+        """重新排队执行进程已退出的任务（启动时及之后每次心跳时检查）"""
+        requeued, paused = self.db.requeue_interrupted_tasks(HEARTBEAT_STALE)
+        if requeued:
+            logger.info("重新排队 %s 个未完成的任务", requeued)
+        if paused:
+            logger.info("%s 个命令行任务的执行进程已退出，任务已暂停", paused)
+        if requeued:
+            self._wakeup.set()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                self.db.heartbeat_tasks(self.owner)
+                self._requeue_interrupted()
+            except Exception as e:
+                logger.error("更新任务心跳失败: %s", e, exc_info=True)
+
+    def _worker(self):
+        while True:
+            try:
+                task = self.db.claim_next_task(self.owner)
+            except Exception as e:
+                logger.error("领取任务失败: %s", e, exc_info=True)
+                task = None
+
+            if not task:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            task_id = task['id']
+            control = TaskControl()
+            task['control'] = control
+            with self._lock:
+                self._controls[task_id] = control
+                # 暂停后恢复的任务沿用原事件序列
+                self._finished.discard(task_id)
+            logger.info("开始执行任务 #%s: %s %s", task_id, task['type'], task['account_name'] or '')
+            try:
+                for event in self.handler(task):
+                    self._append_event(task_id, event)
+            except Exception as e:
+                logger.error("任务 #%s 执行出错: %s", task_id, e, exc_info=True)
+                self._append_event(task_id, {"type": "task_failed", "message": f"发生严重错误: {e}", "error": str(e)})
+            finally:
+                self._append_event(task_id, {"type": "end"})
+                with self._changed:
+                    self._controls.pop(task_id, None)
+                    self._finished.add(task_id)
+                    self._changed.notify_all()
@@ -1,7 +1,49 @@
+import atexit
+import json
 import logging
 import os
+import queue
+import threading
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": record.filename,
+            "line": record.lineno,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    调用方线程只合并消息参数、渲染异常堆栈后入队，写文件和控制台由监听线程完成
+    异常堆栈单独保存在 exc_text 中，文本格式附在消息后，JSON 格式作为 exc 字段
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
 
 class Logger:
     _instance = None
@@ -18,15 +60,44 @@ class Logger:
         
         self._initialized = True
         self.log_dir = "logs"
+        self._logger = None
+        self._queue = None
+        self._listener = None
+        self._queue_handler = None
+        self._setup_lock = threading.Lock()
+    
+    @property
+    def logger(self):
+        """首次记录日志时才创建日志目录和文件 handler，导入模块本身没有文件操作"""
+        if self._logger is None:
+            with self._setup_lock:
+                if self._logger is None:
+                    self._logger = self._setup()
+        return self._logger
+    
+    def _setup(self):
         os.makedirs(self.log_dir, exist_ok=True)
         
-        # 创建logger
-        self.logger = logging.getLogger('WeChatScraper')
-        self.logger.setLevel(logging.DEBUG)
+        # 创建logger（调用方已设置级别时保留，例如基准测试中调高级别）
+        # SCRAPER_LOG_LEVEL 为记录的最低级别（默认 DEBUG），低于该级别的调用不会格式化消息
+        logger = logging.getLogger('WeChatScraper')
+        invalid_level = None
+        if logger.level == logging.NOTSET:
+            level_name = os.environ.get('SCRAPER_LOG_LEVEL', 'DEBUG').strip().upper()
+            level = int(level_name) if level_name.isdigit() else logging.getLevelName(level_name)
+            if not isinstance(level, int):
+                # 无效的级别名不能让日志系统初始化失败，退回 INFO
+                invalid_level = level_name
+                level = logging.INFO
+            logger.setLevel(level)
         
         # 避免重复添加handler
-        if self.logger.handlers:
-            return
+        if logger.handlers:
+            return logger
+        
+        # SCRAPER_LOG_FORMAT=json 时所有 handler 输出 JSON Lines，便于日志采集
+        log_format = os.environ.get('SCRAPER_LOG_FORMAT', 'text')
+        json_formatter = JsonFormatter() if log_format == 'json' else None
         
         # 文件handler - 详细日志
         log_file = os.path.join(self.log_dir, f"scraper_{datetime.now().strftime('%Y%m%d')}.log")
@@ -37,7 +108,7 @@ class Logger:
             encoding='utf-8'
         )
         file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter(
+        file_formatter = json_formatter or logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
         )
         file_handler.setFormatter(file_formatter)
@@ -45,7 +116,7 @@ class Logger:
         # 控制台handler - 简洁日志
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
-        console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        console_formatter = json_formatter or logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         console_handler.setFormatter(console_formatter)
         
         # 错误日志单独文件
@@ -59,27 +130,62 @@ class Logger:
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(file_formatter)
         
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
-        self.logger.addHandler(error_handler)
+        # 下载/抓取线程只把日志放入队列，由监听线程统一写出，不因磁盘或控制台 I/O 阻塞
+        self._queue = queue.Queue(-1)
+        self._listener = QueueListener(
+            self._queue, file_handler, console_handler, error_handler, respect_handler_level=True
+        )
+        self._listener.start()
+        atexit.register(self.stop)
+        self._queue_handler = _QueueHandler(self._queue)
+        logger.addHandler(self._queue_handler)
+        if invalid_level is not None:
+            logger.warning("无效的 SCRAPER_LOG_LEVEL: %s，已使用 INFO", invalid_level)
+        return logger
     
     def get_logger(self):
         return self.logger
     
-    def debug(self, message):
-        self.logger.debug(message)
+    def is_enabled_for(self, level):
+        """该级别的日志是否会被记录，用于跳过构造代价较高的日志参数"""
+        return self.logger.isEnabledFor(level)
+    
+    def flush(self):
+        """等待队列中已有的日志全部写出"""
+        if self._queue_handler is not None:
+            self._queue.join()
+    
+    def stop(self):
+        """
+        写出剩余日志并停止监听线程（进程退出时自动调用）
+        之后的日志（如其他退出钩子中的日志）直接由各 handler 同步写出
+        """
+        with self._setup_lock:
+            if self._queue_handler is None:
+                return
+            logger = logging.getLogger('WeChatScraper')
+            logger.removeHandler(self._queue_handler)
+            self._queue_handler = None
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                logger.addHandler(handler)
+    
+    # 消息支持 % 风格的延迟参数：logger.debug("图片下载成功: %s", filename)
+    # 级别被过滤时不做任何格式化；stacklevel 使文件名和行号指向调用方
+    def debug(self, message, *args, **kwargs):
+        self.logger.debug(message, *args, stacklevel=2, **kwargs)
     
-    def info(self, message):
-        self.logger.info(message)
+    def info(self, message, *args, **kwargs):
+        self.logger.info(message, *args, stacklevel=2, **kwargs)
     
-    def warning(self, message):
-        self.logger.warning(message)
+    def warning(self, message, *args, **kwargs):
+        self.logger.warning(message, *args, stacklevel=2, **kwargs)
     
-    def error(self, message, exc_info=False):
-        self.logger.error(message, exc_info=exc_info)
+    def error(self, message, *args, exc_info=False, **kwargs):
+        self.logger.error(message, *args, exc_info=exc_info, stacklevel=2, **kwargs)
     
-    def critical(self, message, exc_info=False):
-        self.logger.critical(message, exc_info=exc_info)
+    def critical(self, message, *args, exc_info=False, **kwargs):
+        self.logger.critical(message, *args, exc_info=exc_info, stacklevel=2, **kwargs)
 
 # 全局logger实例
 logger = Logger()
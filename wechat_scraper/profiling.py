@@ -0,0 +1,122 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from .logger import logger
+
+# cprofile: 确定性剖析，只覆盖执行任务的工作线程（下载线程池中的代码不在其中）
+# sampler: 墙钟采样，定时抓取进程内所有线程的调用栈，输出 folded stacks（可用 speedscope / flamegraph.pl 查看）
+PROFILE_MODES = ("cprofile", "sampler")
+PROFILE_SUFFIXES = {"cprofile": ".prof", "sampler": ".folded"}
+
+# 同一时间只允许一个 cProfile 剖析器启用
+_cprofile_lock = threading.Lock()
+
+
+class WallClockSampler:
+    """按固定间隔采样所有线程的调用栈，统计每个栈出现的次数"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class TaskProfiler:
+    """
+    在 with 块内对任务进行性能剖析，退出时把结果写入 output_dir/task_<id>_<时间>.<后缀>
+    path 为保存的文件路径，剖析器未能启动（如已有其他 cProfile 在运行）时为 None
+    """
+
+    def __init__(self, mode, output_dir, task_id, interval=0.01):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未知的剖析模式: {mode}")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.task_id = task_id
+        self.interval = interval
+        self.path = None
+        self._profiler = None
+
+    def __enter__(self):
+        if self.mode == "cprofile":
+            if not _cprofile_lock.acquire(blocking=False):
+                logger.warning("任务 #%s 未启用剖析：已有其他任务在使用 cProfile", self.task_id)
+                return self
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = WallClockSampler(self.interval)
+            self._profiler.start()
+        self._started = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        if self._profiler is None:
+            return False
+        try:
+            if self.mode == "cprofile":
+                self._profiler.disable()
+            else:
+                self._profiler.stop()
+        finally:
+            if self.mode == "cprofile":
+                _cprofile_lock.release()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started))
+        path = os.path.join(self.output_dir, f"task_{self.task_id}_{stamp}{PROFILE_SUFFIXES[self.mode]}")
+        try:
+            if self.mode == "cprofile":
+                self._profiler.dump_stats(path)
+            else:
+                self._profiler.write(path)
+            self.path = path
+        except OSError as e:
+            logger.warning("保存任务 #%s 的剖析结果失败: %s", self.task_id, e)
+        return False
+
+
+def cprofile_summary(path, sort="cumulative", limit=40):
+    """把 cProfile 结果渲染成文本（pstats 格式）"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
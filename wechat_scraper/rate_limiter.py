@@ -0,0 +1,57 @@
+import random
+import threading
+import time
+from .exceptions import RateLimitError
+
+
+class RateLimiter:
+    """
+    全局请求节流器（线程安全）
+    所有线程共享同一个请求时间表，两次请求之间至少间隔 interval 秒，另加随机抖动。
+    多个公众号并发抓取时，总请求速率仍受同一预算约束。
+    """
+
+    def __init__(self, interval, jitter=0.0):
+        self.interval = interval
+        self.jitter = jitter
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait=None):
+        """
+        预约下一个请求时间并等待到该时刻
+        max_wait: 需要等待的时间超过该值时不预约，直接抛出 RateLimitError
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            wait = start - now
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitError(f"请求频率受限，需等待 {int(wait)} 秒")
+            self._next_time = start + self.interval + random.uniform(0, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def block(self, seconds):
+        """触发频率限制后暂停发放请求额度"""
+        with self._lock:
+            self._next_time = max(self._next_time, time.monotonic() + seconds)
+
+    def blocked_for(self):
+        """距离下一次可用额度的剩余秒数"""
+        with self._lock:
+            return max(0.0, self._next_time - time.monotonic())
+
+
+# 公众平台列表/搜索接口与 Cookie 会话绑定，限制最严格
+# 文章页面单独计数，图片走 CDN 不做全局节流
+_limiters = {
+    'list': RateLimiter(interval=2.0, jitter=3.0),
+    'article': RateLimiter(interval=0.5, jitter=1.0),
+}
+
+
+def get_limiter(name):
+    """获取指定通道的全局节流器"""
+    return _limiters[name]
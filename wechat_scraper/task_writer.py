@@ -0,0 +1,110 @@
+import atexit
+import queue
+import threading
+import time
+from .logger import logger
+
+
+class TaskProgressWriter:
+    """
+    任务进度异步写入器
+    下载线程只需把事件放入队列，由单个后台线程合并同一任务的多次进度更新，
+    按数量或时间阈值批量写入数据库，任务完成时立即写入。
+    """
+
+    def __init__(self, db, flush_interval=1.0, batch_size=50):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def start(self):
+        """启动后台写入线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="TaskProgressWriter", daemon=True)
+            self._thread.start()
+
+    def update_progress(self, task_id, total_articles, downloaded_articles, failed_articles):
+        """提交任务进度（同一任务只保留最新一次）"""
+        self._put(('progress', task_id, total_articles, downloaded_articles, failed_articles))
+
+    def complete_task(self, task_id, status='completed', error_message=None):
+        """提交任务完成状态，会触发立即写入"""
+        self._put(('complete', task_id, status, error_message))
+
+    def flush(self, timeout=5):
+        """等待当前队列中的事件全部写入数据库"""
+        if not self._thread or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(('flush', done))
+        done.wait(timeout)
+
+    def stop(self, timeout=5):
+        """写入剩余事件并停止后台线程"""
+        if not self._thread or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(('stop', done))
+        done.wait(timeout)
+
+    def _put(self, event):
+        self.start()
+        self.queue.put(event)
+
+    def _run(self):
+        progress = {}
+        completions = {}
+        pending = 0
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                event = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+
+            waiters = []
+            stop = False
+            force = event is None
+            if event:
+                kind = event[0]
+                if kind == 'progress':
+                    progress[event[1]] = event[2:]
+                    pending += 1
+                elif kind == 'complete':
+                    completions[event[1]] = event[2:]
+                    pending += 1
+                    force = True
+                elif kind == 'flush':
+                    waiters.append(event[1])
+                    force = True
+                elif kind == 'stop':
+                    waiters.append(event[1])
+                    force = stop = True
+
+                if pending and deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (force or pending >= self.batch_size):
+                try:
+                    self.db.apply_task_updates(progress, completions)
+                    progress = {}
+                    completions = {}
+                    pending = 0
+                    deadline = None
+                except Exception as e:
+                    # 保留未写入的事件，下个周期重试
+                    logger.error("写入任务进度失败: %s", e, exc_info=True)
+                    deadline = time.monotonic() + self.flush_interval
+
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
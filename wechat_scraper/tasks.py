@@ -0,0 +1,512 @@
+"""
+抓取任务的执行逻辑（搜索公众号、获取列表、并发下载、暂停/恢复）与任务队列
+
+不依赖 Flask，Web 服务 (app.py) 和命令行工作进程 (wechat_scraper.worker) 共用。
+爬虫和下载器在执行任务时才导入，导入本模块不会加载 requests / BeautifulSoup / Selenium。
+"""
+import concurrent.futures
+import os
+import threading
+import time
+from .auth import WeChatAuth
+from .database import Database
+from .logger import logger
+from .task_writer import TaskProgressWriter
+from .job_queue import JobQueue
+from .rate_limiter import get_limiter
+from .concurrency import get_controller
+from .profiling import PROFILE_MODES, TaskProfiler
+from .utils import canonical_article_key
+from .exceptions import RateLimitError, AccountNotFoundError, TaskInterrupted, SessionExpiredError, CircuitOpenError
+
+# 全局实例（构造时不访问数据库和网络）
+auth = WeChatAuth()
+crawler = None
+db = Database()
+# 任务进度由后台线程批量写入，下载线程不等待数据库
+task_writer = TaskProgressWriter(db)
+
+def get_crawler():
+    """当前爬虫；cookie 文件变化（如在其他进程重新登录）后按新凭证重建"""
+    if auth.load_cookies() and (crawler is None or crawler.token != auth.token):
+        return set_crawler(auth.token, auth.cookies)
+    return crawler
+
+def set_crawler(token, cookies):
+    """登录后用新的 token/cookies 创建爬虫"""
+    global crawler
+    from .crawler import WeChatCrawler
+    crawler = WeChatCrawler(token, cookies)
+    return crawler
+
+def progress_event(event_type, message=None, **fields):
+    """构造结构化进度事件（由任务队列补充 id/时间并推送给前端）"""
+    event = {"type": event_type, **fields}
+    if message:
+        event["message"] = message
+    return event
+
+def download_article_wrapper(downloader, article, index, total, control=None):
+    """下载单篇文章的包装函数，返回 article_done / article_failed 事件"""
+    title = article.get('title', 'Untitled')
+    link = article.get('link')
+    date = article.get('publish_date') or time.strftime("%Y-%m-%d", time.localtime(article.get('update_time')))
+    
+    # 所有任务共享文章并发额度（自适应调节）和请求额度；配置了出口池时由下载器按出口节流
+    with get_controller('article').slot():
+        if downloader.pool is None:
+            get_limiter('article').acquire()
+        if control:
+            control.checkpoint()
+        
+        started = time.monotonic()
+        stats = {}
+        success, article_id, img_count, error = downloader.download_article(
+            link, title, date, stats=stats, checkpoint=control.checkpoint if control else None
+        )
+    fields = {
+        "index": index,
+        "total": total,
+        "title": title,
+        "article_id": article_id,
+        "elapsed": round(time.monotonic() - started, 3),
+        "image_count": img_count,
+        "images_ok": stats.get('images_ok', 0),
+        "images_failed": stats.get('images_failed', 0),
+        "image_bytes": stats.get('image_bytes', 0),
+    }
+    
+    if success:
+        return progress_event('article_done', f"[{index}/{total}] ✓ 完成: {title}", **fields)
+    else:
+        return progress_event('article_failed', f"[{index}/{total}] ✗ 失败: {title} ({error})", error=error, **fields)
+
+def run_downloads(task_id, jobs, control=None, total=None, done=0):
+    """
+    并发下载文章并产出进度事件
+    jobs: [(downloader, article), ...]，返回 (downloaded_count, failed_count, image_stats)
+    total / done: 任务的文章总数和此前已下载的篇数（暂停后恢复时沿用，进度不回退），
+    默认 total 为 len(jobs)、done 为 0；返回的 downloaded_count 包含 done
+    收到取消/暂停请求时丢弃未开始的下载，等待进行中的下载退出后抛出 TaskInterrupted
+    熔断器打开（频繁遇到验证/访问受限页面）时同样停止提交，随后抛出 CircuitOpenError
+    """
+    if total is None:
+        total = len(jobs)
+    downloaded_count = done
+    failed_count = 0
+    image_stats = {"images_ok": 0, "images_failed": 0, "image_bytes": 0}
+    
+    # 线程数取并发上限，实际同时下载的数量由 article 控制器决定
+    max_workers = get_controller('article').max_limit
+    stopping = False
+    blocked = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for i, (downloader, article) in enumerate(jobs):
+            future = executor.submit(download_article_wrapper, downloader, article, done + i + 1, total, control)
+            futures.append(future)
+        
+        for future in concurrent.futures.as_completed(futures):
+            if not stopping and (blocked or (control and control.should_stop())):
+                stopping = True
+                for pending in futures:
+                    pending.cancel()
+            if future.cancelled():
+                continue
+            
+            try:
+                event = future.result()
+                if event['type'] == 'article_done':
+                    downloaded_count += 1
+                else:
+                    failed_count += 1
+                for key in image_stats:
+                    image_stats[key] += event.get(key, 0)
+                yield event
+            except TaskInterrupted:
+                # 中断的文章保持待下载状态
+                continue
+            except CircuitOpenError as e:
+                # 被熔断的文章保持待下载状态；不再提交新的下载，进行中的下载各自结束
+                if blocked is None:
+                    blocked = e
+                    for pending in futures:
+                        pending.cancel()
+                continue
+            except Exception as e:
+                logger.error("下载任务出错: %s", e, exc_info=True)
+                failed_count += 1
+                yield progress_event('article_failed', f"下载出错: {e}", error=str(e))
+            
+            # 更新任务进度
+            task_writer.update_progress(task_id, total, downloaded_count, failed_count)
+    
+    if control:
+        control.checkpoint()
+    if blocked is not None:
+        raise blocked
+    return downloaded_count, failed_count, image_stats
+
+def interrupt_task(task_id, interrupted, pending_ids=None, total=None):
+    """
+    记录任务被取消或暂停，产出对应事件
+    暂停时保存待下载的文章ID和任务的文章总数，恢复后直接继续下载而无需重新获取列表，进度沿用暂停前的数字
+    """
+    if interrupted.action == 'pause':
+        if pending_ids is not None:
+            db.update_task_params(task_id, {"resume_ids": pending_ids, "resume_total": total})
+        task_writer.complete_task(task_id, 'paused')
+        message = f"任务已暂停，剩余 {len(pending_ids)} 篇待下载" if pending_ids is not None else "任务已暂停"
+        yield progress_event('task_paused', message, pending=len(pending_ids) if pending_ids is not None else None)
+    else:
+        task_writer.complete_task(task_id, 'cancelled', str(interrupted))
+        yield progress_event('task_cancelled', "任务已取消")
+
+def wait_for_login(task_id, reason, pending_ids=None):
+    """
+    会话失效：暂停任务并标记为等待登录，重新登录后由 resume_waiting_tasks 放回队列
+    不再继续请求列表接口，避免在失效的会话上反复重试
+    """
+    auth.mark_expired(reason)
+    db.update_task_params(task_id, {"wait_login": True})
+    yield progress_event('session_expired', "⚠️ 登录已失效，任务已暂停，重新登录后将自动继续", error=reason)
+    yield from interrupt_task(task_id, TaskInterrupted('pause'), pending_ids)
+
+def reschedule_blocked(task_id, error, pending_ids, total=None):
+    """
+    熔断器打开：暂停任务并保存剩余文章，冷却结束后自动放回队列
+    恢复后的第一篇文章作为熔断器的探测请求，其余文章在熔断器恢复后继续下载
+    """
+    delay = max(error.retry_after, 1.0)
+    db.update_task_params(task_id, {"resume_at": time.time() + delay})
+    yield progress_event('circuit_open', f"⚠️ {error}，剩余文章将自动重新排队",
+                         host=error.host, retry_after=round(delay, 1), error=str(error))
+    yield from interrupt_task(task_id, TaskInterrupted('pause'), pending_ids, total)
+    schedule_due_resume(delay)
+
+def schedule_due_resume(delay):
+    """delay 秒后检查并恢复到期的任务（只在本进程的任务队列已启动时生效）"""
+    timer = threading.Timer(delay + 0.5, resume_due_tasks)
+    timer.daemon = True
+    timer.start()
+
+def resume_due_tasks():
+    """把熔断冷却已结束的暂停任务放回队列，返回任务ID列表"""
+    if not job_queue.started:
+        return []
+    resumed = []
+    for task_id in db.get_tasks_due_resume(time.time()):
+        db.update_task_params(task_id, {"resume_at": None})
+        if job_queue.resume(task_id):
+            resumed.append(task_id)
+    if resumed:
+        logger.info("熔断冷却结束，重新排队 %s 个任务", len(resumed))
+    return resumed
+
+def resume_waiting_tasks():
+    """把因会话失效而暂停的任务重新放回队列，返回任务ID列表"""
+    resumed = []
+    for task_id in db.get_tasks_waiting_login():
+        db.update_task_params(task_id, {"wait_login": False})
+        if job_queue.resume(task_id):
+            resumed.append(task_id)
+    if resumed:
+        logger.info("登录已恢复，重新排队 %s 个任务", len(resumed))
+    return resumed
+
+def process_account(account_name, pages, metadata_only=False, task_id=None, control=None):
+    """
+    处理单个公众号的抓取任务，产出结构化进度事件
+    metadata_only: 只抓取并保存文章目录（标题、链接、日期、封面、摘要），不下载正文
+    task_id: 队列中已有的任务记录，未提供时新建
+    control: 任务控制对象，用于响应取消/暂停
+    """
+    # 创建任务记录
+    if task_id is None:
+        task_id = db.create_task(account_name, 'metadata' if metadata_only else 'single', pages)
+    
+    task_started = time.monotonic()
+    yield progress_event('task_started', f"正在搜索: {account_name}...",
+                         task_id=task_id, account_name=account_name, pages=pages, metadata_only=metadata_only)
+    
+    crawler_instance = get_crawler()
+    if not crawler_instance:
+        task_writer.complete_task(task_id, 'failed', '未登录或 Cookies 已过期')
+        yield progress_event('task_failed', "错误: 未登录或 Cookies 已过期", error='未登录或 Cookies 已过期')
+        return
+    if not auth.is_logged_in():
+        yield from wait_for_login(task_id, auth.expired_reason or "登录已失效")
+        return
+    
+    articles = None
+    try:
+        # 搜索公众号
+        try:
+            fakeid, nickname, alias = crawler_instance.search_account(account_name)
+        except SessionExpiredError as e:
+            yield from wait_for_login(task_id, str(e))
+            return
+        except RateLimitError as e:
+            # 记录频率限制
+            db.record_rate_limit(account_name)
+            task_writer.complete_task(task_id, 'failed', str(e))
+            yield progress_event('rate_limited', "⚠️ 触发频率限制！请等待30分钟后再试。", stage='search', error=str(e))
+            yield progress_event('task_failed', error=str(e))
+            return
+        except AccountNotFoundError as e:
+            task_writer.complete_task(task_id, 'failed', str(e))
+            yield progress_event('task_failed', f"错误: {e}", error=str(e))
+            return
+        
+        # 添加/更新公众号记录
+        account_id = db.add_account(account_name, fakeid, nickname, alias)
+        yield progress_event('account_found', f"正在抓取文章列表 (前 {pages} 页)...",
+                             account_id=account_id, fakeid=fakeid, nickname=nickname, alias=alias)
+        
+        # 获取文章列表，每获取一页即批量写入文章元数据，下载阶段只需更新状态
+        articles = []
+        try:
+            page_started = time.monotonic()
+            for page, page_articles, total_cnt in crawler_instance.iter_article_pages(fakeid, max_pages=int(pages)):
+                if control:
+                    control.checkpoint()
+                db.upsert_listing_articles(account_id, page_articles)
+                articles.extend(page_articles)
+                yield progress_event('page_listed', f"第 {page} 页: {len(page_articles)} 篇 (累计 {len(articles)}/{total_cnt})",
+                                     page=page, count=len(page_articles), listed=len(articles), available=total_cnt,
+                                     elapsed=round(time.monotonic() - page_started, 3))
+                page_started = time.monotonic()
+        except TaskInterrupted:
+            # 列表尚未获取完整，恢复时重新获取
+            articles = None
+            raise
+        except SessionExpiredError as e:
+            # 已入库的列表保留，恢复时重新获取完整列表
+            yield from wait_for_login(task_id, str(e))
+            return
+        except RateLimitError as e:
+            db.record_rate_limit(account_name)
+            yield progress_event('rate_limited',
+                                 f"⚠️ 触发频率限制！已暂停抓取，将处理已获取的 {len(articles)} 篇文章。\n注意：请等待30分钟后再尝试抓取剩余文章。",
+                                 stage='list', listed=len(articles), error=str(e))
+        except Exception as e:
+            task_writer.complete_task(task_id, 'failed', str(e))
+            yield progress_event('task_failed', f"错误: {e}", error=str(e))
+            return
+        
+        # 同一文章可能以不同链接形式出现，按规范化标识去重
+        unique_articles = {}
+        for article in articles:
+            unique_articles.setdefault(canonical_article_key(article.get('link')), article)
+        articles = list(unique_articles.values())
+        
+        yield progress_event('listing_done', f"找到 {len(articles)} 篇文章", total=len(articles))
+        
+        if not articles:
+            task_writer.complete_task(task_id, 'completed')
+            yield progress_event('task_completed', downloaded=0, failed=0,
+                                 elapsed=round(time.monotonic() - task_started, 3))
+            return
+
+        # 更新公众号统计
+        db.update_account_stats(account_id, len(articles))
+        
+        if metadata_only:
+            task_writer.update_progress(task_id, len(articles), 0, 0)
+            task_writer.complete_task(task_id, 'completed')
+            yield progress_event('task_completed', f"公众号 {account_name} 目录已保存 ({len(articles)} 篇)，未下载正文",
+                                 downloaded=0, failed=0, elapsed=round(time.monotonic() - task_started, 3))
+            return
+        
+        # 下载文章
+        yield progress_event('log', "开始下载文章...")
+        from .downloader import WeChatDownloader
+        downloader = WeChatDownloader(
+            output_dir=f"output/{account_name}",
+            cookies=auth.cookies,
+            account_id=account_id
+        )
+        
+        downloaded_count, failed_count, image_stats = yield from run_downloads(
+            task_id, [(downloader, article) for article in articles], control
+        )
+
+        # 完成任务
+        task_writer.complete_task(task_id, 'completed')
+        
+        yield progress_event('task_completed',
+                             f"公众号 {account_name} 处理完成!\n成功: {downloaded_count} 篇, 失败: {failed_count} 篇",
+                             downloaded=downloaded_count, failed=failed_count,
+                             elapsed=round(time.monotonic() - task_started, 3), **image_stats)
+        
+    except TaskInterrupted as e:
+        pending_ids = db.get_pending_article_ids([a.get('link') for a in articles]) if articles is not None else None
+        yield from interrupt_task(task_id, e, pending_ids, len(articles) if articles is not None else None)
+    except CircuitOpenError as e:
+        pending_ids = db.get_pending_article_ids([a.get('link') for a in articles])
+        yield from reschedule_blocked(task_id, e, pending_ids, len(articles))
+    except Exception as e:
+        logger.error("处理公众号时发生错误: %s", e, exc_info=True)
+        task_writer.complete_task(task_id, 'failed', str(e))
+        yield progress_event('task_failed', f"发生错误: {e}", error=str(e))
+
+def download_selected_articles(article_ids, task_id=None, control=None, resume_total=None):
+    """
+    下载指定的文章（通常来自仅抓取目录的任务），产出结构化进度事件
+    resume_total: 暂停后恢复时任务原来的文章总数，已完成的部分计入进度
+    """
+    if task_id is None:
+        task_id = db.create_task(None, 'download', 0)
+    
+    task_started = time.monotonic()
+    yield progress_event('task_started', task_id=task_id, article_count=len(article_ids))
+    
+    if not get_crawler():
+        task_writer.complete_task(task_id, 'failed', '未登录或 Cookies 已过期')
+        yield progress_event('task_failed', "错误: 未登录或 Cookies 已过期", error='未登录或 Cookies 已过期')
+        return
+    
+    total = None
+    try:
+        articles = db.get_articles_by_ids(article_ids)
+        pending = [a for a in articles if not a['downloaded']]
+        total = max(resume_total or 0, len(pending))
+        yield progress_event('listing_done', f"选中 {len(articles)} 篇文章，其中 {len(pending)} 篇待下载", total=total)
+        
+        # 按公众号分组，保持与整号抓取相同的输出目录结构
+        from .downloader import WeChatDownloader
+        downloaders = {}
+        jobs = []
+        for article in pending:
+            account_id, account_name = article['account_id'], article['account_name']
+            if account_id not in downloaders:
+                downloaders[account_id] = WeChatDownloader(
+                    output_dir=f"output/{account_name}",
+                    cookies=auth.cookies,
+                    account_id=account_id
+                )
+            jobs.append((downloaders[account_id], article))
+        
+        downloaded_count, failed_count, image_stats = yield from run_downloads(
+            task_id, jobs, control, total=total, done=total - len(pending)
+        )
+        
+        task_writer.complete_task(task_id, 'completed')
+        yield progress_event('task_completed', f"成功: {downloaded_count} 篇, 失败: {failed_count} 篇",
+                             downloaded=downloaded_count, failed=failed_count,
+                             elapsed=round(time.monotonic() - task_started, 3), **image_stats)
+    except TaskInterrupted as e:
+        pending_ids = [a['id'] for a in db.get_articles_by_ids(article_ids) if not a['downloaded']]
+        yield from interrupt_task(task_id, e, pending_ids, total)
+    except CircuitOpenError as e:
+        pending_ids = [a['id'] for a in db.get_articles_by_ids(article_ids) if not a['downloaded']]
+        yield from reschedule_blocked(task_id, e, pending_ids, total)
+    except Exception as e:
+        logger.error("下载选中文章时发生错误: %s", e, exc_info=True)
+        task_writer.complete_task(task_id, 'failed', str(e))
+        yield progress_event('task_failed', f"发生错误: {e}", error=str(e))
+
+# 性能剖析结果与数据库放在同一目录下
+PROFILE_DIR = os.path.join(os.path.dirname(db.db_path), 'profiles')
+
+def profile_mode(data):
+    """请求中的 profile 参数，未指定时使用环境变量 SCRAPER_PROFILE，无效值视为不剖析"""
+    mode = data.get('profile') or os.environ.get('SCRAPER_PROFILE')
+    return mode if mode in PROFILE_MODES else None
+
+def run_job(task):
+    """队列工作线程执行单个任务，任务参数带 profile 时在剖析器下运行"""
+    mode = task['params'].get('profile')
+    if mode not in PROFILE_MODES:
+        yield from execute_job(task)
+        return
+    
+    profiler = TaskProfiler(mode, PROFILE_DIR, task['id'])
+    try:
+        with profiler:
+            yield from execute_job(task)
+    finally:
+        if profiler.path:
+            db.set_task_profile(task['id'], profiler.path)
+    if profiler.path:
+        yield progress_event('log', f"性能剖析结果已保存: {profiler.path}")
+
+def execute_job(task):
+    params = task['params']
+    control = task.get('control')
+    if params.get('wait_login') or params.get('resume_at'):
+        # 手动恢复或自动恢复后清除等待标记
+        db.update_task_params(task['id'], {"wait_login": False, "resume_at": None})
+    if task['type'] == 'download':
+        yield from download_selected_articles(params.get('ids', []), task_id=task['id'], control=control)
+    elif params.get('resume_ids') is not None:
+        # 暂停后恢复：列表已保存，只下载剩余文章
+        yield progress_event('log', f"恢复任务: {task['account_name']}，剩余 {len(params['resume_ids'])} 篇")
+        yield from download_selected_articles(params['resume_ids'], task_id=task['id'], control=control,
+                                              resume_total=params.get('resume_total'))
+    else:
+        batch_index = params.get('batch_index')
+        batch_size = params.get('batch_size')
+        if batch_size:
+            yield progress_event('log', f"=== 开始处理第 {batch_index + 1}/{batch_size} 个公众号: {task['account_name']} ===")
+        
+        # 请求间隔由全局节流器控制，多个公众号可同时处理
+        yield from process_account(task['account_name'], task['pages'], task['type'] == 'metadata',
+                                   task_id=task['id'], control=control)
+
+# 任务不再继续执行的状态
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled', 'paused')
+
+job_queue = JobQueue(db, run_job, workers=int(os.environ.get('SCRAPER_WORKERS', 3)))
+
+# 定时检查登录会话的间隔（秒），0 表示不检查
+SESSION_PROBE_INTERVAL = float(os.environ.get('SCRAPER_SESSION_PROBE_INTERVAL', 600))
+_session_probe_thread = None
+_session_probe_lock = threading.Lock()
+
+def probe_session():
+    """检查一次登录会话；会话有效且有等待登录的任务时将其放回队列，返回 session_valid"""
+    crawler_instance = get_crawler()
+    if not crawler_instance:
+        return None
+    if auth.probe(crawler_instance):
+        resume_waiting_tasks()
+    return auth.session_valid
+
+def start_session_probe():
+    """启动后台会话检查线程（重复调用无副作用）"""
+    global _session_probe_thread
+    if SESSION_PROBE_INTERVAL <= 0:
+        return
+    
+    def loop():
+        while True:
+            try:
+                probe_session()
+                # 服务重启后，冷却已结束的熔断任务在此恢复
+                resume_due_tasks()
+            except Exception as e:
+                logger.error("会话检查出错: %s", e, exc_info=True)
+            time.sleep(SESSION_PROBE_INTERVAL)
+    
+    with _session_probe_lock:
+        if _session_probe_thread is None:
+            _session_probe_thread = threading.Thread(target=loop, name="SessionProbe", daemon=True)
+            _session_probe_thread.start()
+
+def schedule_batch_accounts(accounts, pages):
+    """
+    批量任务排序：最久未抓取的公众号优先，同等情况下预计工作量大的优先（尽早开始，与其他公众号的下载重叠）
+    预计工作量 = 本次列出的文章数（按页数估算）+ 已列出但尚未下载的文章数
+    """
+    accounts = list(dict.fromkeys(name for name in accounts if name))
+    info = db.get_accounts_schedule_info(accounts)
+    listed = int(pages) * 5
+    
+    def sort_key(name):
+        last_scraped_at, pending = info.get(name, (None, 0))
+        expected_cost = listed + pending
+        # 从未抓取过的排在最前
+        return (last_scraped_at is not None, last_scraped_at or '', -expected_cost)
+    
+    return sorted(accounts, key=sort_key)
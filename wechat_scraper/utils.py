@@ -1,5 +1,14 @@
 import re
 import os
+import hashlib
+from urllib.parse import urlparse, parse_qs, parse_qsl, urlencode
+
+# 分享/来源等跟踪参数，不影响链接指向的文章
+TRACKING_PARAMS = {
+    'chksm', 'scene', 'subscene', 'sessionid', 'clicktime', 'enterid', 'ascene', 'from', 'isappinstalled',
+    'devicetype', 'version', 'lang', 'nettype', 'pass_ticket', 'wx_header', 'key', 'exportkey', 'srcid',
+    'sharer_sharetime', 'sharer_shareid', 'poc_token', 'fontScale', 'countrycode', 'abtest_cookie',
+}
 
 def sanitize_filename(filename):
     """
@@ -13,3 +22,70 @@ def create_dir(path):
     """
     if not os.path.exists(path):
         os.makedirs(path)
+
+# 项目根目录下的静态资源目录（Web 服务和下载器生成的文章页共用）
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+_static_versions = {}
+
+def static_version(filename):
+    """静态资源当前内容的版本号（内容哈希，按修改时间缓存）"""
+    path = os.path.join(STATIC_DIR, filename)
+    mtime = os.path.getmtime(path)
+    cached = _static_versions.get(filename)
+    if not cached or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = (mtime, hashlib.md5(f.read()).hexdigest()[:10])
+        _static_versions[filename] = cached
+    return cached[1]
+
+def static_url(filename):
+    """带内容版本号的静态资源地址，内容变化后地址随之变化"""
+    return f"/static/{filename}?v={static_version(filename)}"
+
+def canonical_article_key(url):
+    """
+    生成文章的规范化标识，用于跨链接变体去重。
+    长链接使用 __biz/mid/idx（忽略 chksm、scene、sn 等参数），
+    短链接 (/s/xxxx) 使用短链ID，其它链接（如搜狗跳转链接 /s?src=...&signature=...）
+    使用去掉跟踪参数、参数排序后的完整地址，不同文章不会得到相同的标识。
+    """
+    if not url:
+        return None
+    parsed = urlparse(url.strip().replace('&amp;', '&'))
+    path = parsed.path.rstrip('/')
+    query = parse_qs(parsed.query)
+    
+    biz = query.get('__biz', [None])[0]
+    mid = (query.get('mid') or query.get('appmsgid') or [None])[0]
+    idx = (query.get('idx') or query.get('itemidx') or ['1'])[0]
+    if biz and mid:
+        return f"{biz}:{mid}:{idx}"
+    
+    if path.startswith('/s/'):
+        return f"s:{path[3:]}"
+    
+    params = sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k not in TRACKING_PARAMS)
+    if params:
+        return f"{parsed.netloc}{path}?{urlencode(params)}"
+    return f"{parsed.netloc}{path}"
+
+def find_match_snippets(text, keyword, context=30, limit=200):
+    """
+    查找关键词在文本中的所有位置（不区分大小写），
+    返回 [{"offset", "length", "snippet"}, ...]，最多 limit 条
+    """
+    if not text or not keyword:
+        return []
+    lower_text = text.lower()
+    lower_keyword = keyword.lower()
+    matches = []
+    start = lower_text.find(lower_keyword)
+    while start != -1 and len(matches) < limit:
+        end = start + len(keyword)
+        matches.append({
+            "offset": start,
+            "length": len(keyword),
+            "snippet": text[max(0, start - context):min(len(text), end + context)],
+        })
+        start = lower_text.find(lower_keyword, end)
+    return matches
@@ -0,0 +1,201 @@
+"""
+命令行工作进程，不加载 Flask 和 Web 界面
+
+    python -m wechat_scraper.worker scrape 公众号A 公众号B --pages 3 [--metadata-only] [--profile sampler]
+    python -m wechat_scraper.worker download 12 13 14
+    python -m wechat_scraper.worker resume 42
+    python -m wechat_scraper.worker run [--workers 3]
+
+scrape / download / resume 在当前进程中直接执行任务并输出进度，按 Ctrl+C 暂停任务（之后可用 resume 继续）；
+因熔断暂停的任务在冷却结束后于本进程自动继续。
+run 持续处理任务队列中的排队任务，可与 Web 服务同时运行（各进程只重新排队心跳已停止的任务）。
+scrape / download / resume 执行的任务不会被其他进程的任务队列领取，本进程异常退出后任务改为暂停。
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from .job_queue import TaskControl, PROCESS_ID, HEARTBEAT_INTERVAL
+from .tasks import db, task_writer, job_queue, run_job, schedule_batch_accounts, start_session_probe, PROFILE_MODES
+
+
+# 本进程直接执行的任务，其他进程的任务队列不会领取（进程退出后由任务队列改为 paused）
+INLINE_OWNER = f"inline:{PROCESS_ID}"
+
+
+def print_event(event, as_json=False):
+    if as_json:
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+    elif event.get("message") or event.get("error"):
+        print(event.get("message") or f"错误: {event['error']}", flush=True)
+
+
+def run_inline(task, as_json=False):
+    """
+    在后台线程中执行任务，主线程输出进度事件
+    Ctrl+C 第一次请求暂停，第二次请求取消
+    返回任务结束事件的类型
+    """
+    control = TaskControl()
+    task["control"] = control
+    events = queue.Queue()
+
+    def target():
+        try:
+            for event in run_job(task):
+                events.put(event)
+        except Exception as e:
+            events.put({"type": "task_failed", "message": f"发生严重错误: {e}", "error": str(e)})
+        finally:
+            events.put(None)
+
+    threading.Thread(target=target, name=f"Task-{task['id']}", daemon=True).start()
+    final_type = None
+    last_heartbeat = time.monotonic()
+    while True:
+        if time.monotonic() - last_heartbeat >= HEARTBEAT_INTERVAL:
+            db.heartbeat_tasks(INLINE_OWNER)
+            last_heartbeat = time.monotonic()
+        try:
+            event = events.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        except KeyboardInterrupt:
+            if control.action is None:
+                print("正在暂停任务（再按一次 Ctrl+C 取消）...", file=sys.stderr)
+                control.pause()
+            else:
+                print("正在取消任务...", file=sys.stderr)
+                control.cancel()
+            continue
+        if event is None:
+            break
+        if event["type"].startswith("task_") and event["type"] != "task_started":
+            final_type = event["type"]
+        print_event(event, as_json)
+
+    # 确保任务状态写入数据库后再退出
+    task_writer.flush()
+    return final_type
+
+
+def run_until_done(task, as_json=False):
+    """执行任务；任务因熔断而暂停时等待冷却结束后继续执行剩余文章"""
+    while True:
+        result = run_inline(task, as_json)
+        if result != "task_paused" or task["control"].action is not None:
+            return result
+        row = db.get_task_stats(task["id"])
+        params = json.loads(row[12]) if row[12] else {}
+        resume_at = params.get("resume_at")
+        if not resume_at:
+            return result
+        delay = max(0.0, resume_at - time.time())
+        print(f"{int(delay)} 秒后继续任务 #{task['id']}（Ctrl+C 退出，之后可用 resume 继续）", file=sys.stderr)
+        try:
+            time.sleep(delay)
+        except KeyboardInterrupt:
+            return result
+        if not db.update_task_status(task["id"], "running", ("paused",), claimed_by=INLINE_OWNER):
+            return result
+        task = {"id": task["id"], "account_name": task["account_name"], "type": task["type"],
+                "pages": task["pages"], "params": params}
+
+
+def create_task(account_name, task_type, pages=0, params=None):
+    """
+    新建一条 running 状态的任务记录（不经过队列）
+    记录为本进程直接执行并定期更新心跳，其他进程的任务队列不会重新排队该任务
+    """
+    task_id = db.create_task(account_name, task_type, pages, claimed_by=INLINE_OWNER)
+    if params:
+        db.update_task_params(task_id, params)
+    return {"id": task_id, "account_name": account_name, "type": task_type, "pages": pages, "params": params or {}}
+
+
+def cmd_scrape(args):
+    params = {"profile": args.profile} if args.profile else {}
+    task_type = "metadata" if args.metadata_only else "single"
+    accounts = schedule_batch_accounts(args.accounts, args.pages)
+    failed = 0
+    for i, name in enumerate(accounts):
+        task_params = dict(params)
+        if len(accounts) > 1:
+            task_params.update({"batch_index": i, "batch_size": len(accounts)})
+        result = run_until_done(create_task(name, task_type, args.pages, task_params), args.json)
+        if result == "task_paused":
+            print("剩余公众号未处理", file=sys.stderr)
+            return 1
+        failed += result != "task_completed"
+    return 1 if failed else 0
+
+
+def cmd_download(args):
+    params = {"ids": args.ids}
+    if args.profile:
+        params["profile"] = args.profile
+    result = run_until_done(create_task(None, "download", 0, params), args.json)
+    return 0 if result == "task_completed" else 1
+
+
+def cmd_resume(args):
+    task = db.get_task_stats(args.task_id)
+    if not task:
+        print(f"任务不存在: {args.task_id}", file=sys.stderr)
+        return 1
+    if not db.update_task_status(args.task_id, "running", ("paused",), claimed_by=INLINE_OWNER):
+        print(f"任务 #{args.task_id} 不在暂停状态", file=sys.stderr)
+        return 1
+    params = json.loads(task[12]) if task[12] else {}
+    result = run_until_done({"id": task[0], "account_name": task[1], "type": task[2], "pages": task[3], "params": params},
+                            args.json)
+    return 0 if result == "task_completed" else 1
+
+
+def cmd_run(args):
+    job_queue.workers = args.workers
+    job_queue.start()
+    # 会话失效后暂停的任务在检查到重新登录后自动恢复
+    start_session_probe()
+    print(f"任务队列已启动（{args.workers} 个工作线程），按 Ctrl+C 退出", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        task_writer.flush()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m wechat_scraper.worker", description="命令行抓取工作进程")
+    parser.add_argument("--json", action="store_true", help="以 JSON Lines 输出全部进度事件")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    scrape = sub.add_parser("scrape", help="抓取公众号")
+    scrape.add_argument("accounts", nargs="+")
+    scrape.add_argument("--pages", type=int, default=1)
+    scrape.add_argument("--metadata-only", action="store_true", help="只保存文章目录，不下载正文")
+    scrape.add_argument("--profile", choices=PROFILE_MODES)
+    scrape.set_defaults(func=cmd_scrape)
+
+    download = sub.add_parser("download", help="下载指定文章")
+    download.add_argument("ids", nargs="+", type=int)
+    download.add_argument("--profile", choices=PROFILE_MODES)
+    download.set_defaults(func=cmd_download)
+
+    resume = sub.add_parser("resume", help="继续已暂停的任务")
+    resume.add_argument("task_id", type=int)
+    resume.set_defaults(func=cmd_resume)
+
+    run = sub.add_parser("run", help="持续处理任务队列")
+    run.add_argument("--workers", type=int, default=job_queue.workers)
+    run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())